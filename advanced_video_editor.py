@@ -68,6 +68,15 @@ if __name__ == "__main__":
     sys.excepthook = exception_hook
     base_dir = os.path.dirname(os.path.abspath(__file__))
     sys.path.insert(0, base_dir)
+    if len(sys.argv) > 1 and sys.argv[1] == "render":
+        # Headless export: no QApplication, no window, progress on stdout
+        from headless_render import main as headless_main
+        setup_system(base_dir)
+        sys.exit(headless_main(sys.argv[2:], base_dir=base_dir))
+    if len(sys.argv) > 1 and sys.argv[1] == "calibrate":
+        from headless_render import calibrate_main
+        setup_system(base_dir)
+        sys.exit(calibrate_main(sys.argv[2:], base_dir=base_dir))
     os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
     logger = setup_system(base_dir)
     sys.stdout = StreamToLogger(logger, logging.INFO)
@@ -153,6 +153,14 @@ class AssetLoader(QObject):
             'track': track,
             'path': info['path'],
             'width': info.get('width', 0),
+            'height': info.get('height', 0),
+            'fps': info.get('fps', 0.0),
+            'pix_fmt': info.get('pix_fmt', ''),
+            'video_codec': info.get('video_codec', ''),
+            'video_profile': info.get('video_profile', ''),
+            'video_level': info.get('video_level', 0),
+            'sar': info.get('sar', ''),
+            'time_base': info.get('time_base', ''),
             'has_audio': info.get('has_audio', True),
             'media_type': 'video' if info.get('has_video') else 'audio',
             'linked_uid': a_uid
@@ -0,0 +1,89 @@
+"""
+Microbenchmark: build and serialize a 5,000-node filter graph.
+Compares FilterGraph's sequential pin labels and one-pass serialization with the
+previous scheme (uuid4 pin ids, a debug log call per node, join over str(node)).
+Also times a full FilterGraphGenerator build of a long timeline, which exposes
+piece planning that grows faster than linearly with the clip count.
+
+    python bench_filter_graph.py [nodes] [repeats] [clips]
+"""
+import logging
+import sys
+import timeit
+import uuid
+from filter_graph import FilterGraph, FilterNode
+from ffmpeg_generator import FilterGraphGenerator
+
+class LegacyNode:
+    """The old FilterNode behaviour, kept here only as the baseline."""
+    def __init__(self, name, params=None, num_inputs=1, num_outputs=1):
+        self.name = name
+        self.params = params
+        self.input_pins = [None] * num_inputs
+        self.output_pins = [f"[stream_{uuid.uuid4().hex[:8]}]" for _ in range(num_outputs)]
+
+    def __str__(self):
+        logger = logging.getLogger("Advanced_Video_Editor")
+        inputs = "".join(str(pin) for pin in self.input_pins if pin)
+        outputs = "".join(self.output_pins)
+        param_str = "=" + ":".join([f"{k}={v}" for k, v in self.params.items()]) if self.params else ""
+        result = f"{inputs}{self.name}{param_str}{outputs}"
+        logger.debug(f"[FILTER_NODE] Generated string: {result}")
+        return result
+
+def _params(i):
+    return {'start': f'{i * 0.5:.3f}', 'duration': '0.500'}
+
+def build_legacy(count):
+    nodes = []
+    last_pin = "[0:v]"
+    for i in range(count):
+        node = LegacyNode("trim", _params(i))
+        node.input_pins[0] = last_pin
+        nodes.append(node)
+        last_pin = node.output_pins[0]
+    return ";".join(str(node) for node in nodes)
+
+def build_current(count):
+    graph = FilterGraph()
+    last_pin = graph.get_input_stream("bench.mp4", 'v')
+    for i in range(count):
+        node = FilterNode("trim", _params(i))
+        node.input_pins[0] = last_pin
+        graph.add_node(node)
+        last_pin = node.output_pins[0]
+    return graph.to_string()
+
+def timeline_clips(count):
+    """Back-to-back cuts on one track, with a title over every tenth clip."""
+    clips = []
+    for i in range(count):
+        clips.append({'uid': f'c{i}', 'path': f'/bench/{i % 50}.mp4', 'start': i * 2.0, 'dur': 2.0, 'track': 1,
+                      'width': 1920, 'height': 1080, 'has_audio': True})
+        if i % 10 == 0:
+            clips.append({'uid': f't{i}', 'path': '/bench/title.png', 'start': i * 2.0 + 0.5, 'dur': 1.0, 'track': 0,
+                          'width': 1920, 'height': 1080, 'scale_x': 0.5, 'scale_y': 0.5, 'has_audio': False})
+    return clips
+
+def build_timeline(clips):
+    return FilterGraphGenerator(clips, 1280, 720).build(is_export=True)[1]
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    clip_count = int(sys.argv[3]) if len(sys.argv) > 3 else 4000
+    logging.getLogger("Advanced_Video_Editor").setLevel(logging.INFO)
+    legacy = min(timeit.repeat(lambda: build_legacy(count), number=1, repeat=repeats))
+    current = min(timeit.repeat(lambda: build_current(count), number=1, repeat=repeats))
+    print(f"{count} nodes, best of {repeats}")
+    print(f"  uuid pins + per-node logging : {legacy * 1000:8.2f} ms")
+    print(f"  sequential pins, one pass    : {current * 1000:8.2f} ms")
+    print(f"  speedup                      : {legacy / current:8.2f}x")
+    print(f"  deterministic output         : {build_current(count) == build_current(count)}")
+    for n in (clip_count // 2, clip_count):
+        clips = timeline_clips(n)
+        timeline = min(timeit.repeat(lambda: build_timeline(clips), number=1, repeat=max(1, repeats // 10)))
+        print(f"  timeline build, {n:5d} clips   : {timeline * 1000:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,72 @@
 import os
+import re
+import json
+import time
 import shutil
 import logging
+import tempfile
 import subprocess
 
+# Presets tried per encoder by calibrate(), fastest first
+CALIBRATION_PRESETS = {
+    'libx264': ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow'),
+    'h264_nvenc': ('p1', 'p4', 'p7'),
+    'hevc_nvenc': ('p1', 'p4', 'p7'),
+    'av1_nvenc': ('p1', 'p4', 'p7'),
+    'h264_qsv': ('veryfast', 'medium', 'veryslow'),
+    'h264_amf': ('speed', 'balanced', 'quality'),
+}
+# Encoders whose speed/quality knob is not called -preset
+PRESET_OPTIONS = {'h264_amf': '-quality'}
+# Constant-quality settings the calibration encodes at, matching what exports use
+CALIBRATION_RATE_ARGS = {
+    'libx264': ['-crf', '18'],
+    'h264_nvenc': ['-rc', 'vbr', '-cq', '21', '-b:v', '0'],
+    'hevc_nvenc': ['-rc', 'vbr', '-cq', '18', '-b:v', '0'],
+    'av1_nvenc': ['-rc', 'vbr', '-cq', '18', '-b:v', '0'],
+    'h264_qsv': ['-global_quality', '21'],
+    'h264_amf': ['-rc', 'cqp', '-qp_i', '21', '-qp_p', '21'],
+}
+# What each use needs from a calibrated setting; the config key "encoder_targets" overrides these per use.
+# min_ssim: quality floor, min_fps: speed floor, max_size_ratio: output size relative to the smallest result.
+ENCODER_TARGETS = {
+    'export': {'min_ssim': 0.98, 'max_size_ratio': 1.5, 'encoders': ('libx264', 'h264_nvenc', 'hevc_nvenc', 'av1_nvenc')},
+    'proxy': {'min_ssim': 0.90, 'encoders': ('libx264', 'h264_nvenc', 'hevc_nvenc', 'h264_qsv', 'h264_amf')},
+}
+CALIBRATION_FILE = "encoder_calibration.json"
+
+def _no_window():
+    """subprocess kwargs that keep Windows from flashing a console; empty elsewhere."""
+    if os.name != 'nt':
+        return {}
+    si = subprocess.STARTUPINFO()
+    si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return {'startupinfo': si}
+
+def select_setting(results, min_ssim=None, min_fps=None, max_size_ratio=None, encoders=None):
+    """Picks a calibration result. With a quality target (min_ssim) the fastest result that meets it wins;
+    with only a speed target (min_fps) the best-looking result that is fast enough. None if nothing qualifies."""
+    candidates = [r for r in results if not encoders or r['encoder'] in encoders]
+    if max_size_ratio and candidates:
+        smallest = min(r['bytes'] for r in candidates)
+        candidates = [r for r in candidates if r['bytes'] <= smallest * max_size_ratio]
+    if min_ssim is not None:
+        candidates = [r for r in candidates if r['ssim'] >= min_ssim]
+    if min_fps is not None:
+        candidates = [r for r in candidates if r['fps'] >= min_fps]
+    if not candidates:
+        return None
+    if min_ssim is None and min_fps is not None:
+        return max(candidates, key=lambda r: (r['ssim'], r['fps']))
+    return max(candidates, key=lambda r: (r['fps'], r['ssim']))
+
 class BinaryManager:
     _cached_encoder = None
+    _cached_ffmpeg_version = None
     _config = None
+    _calibration = None
+    # Set by callers that must not touch the GPU (headless --cpu); restricts calibrated settings to libx264
+    _cpu_only = False
 
     def __init__(self, config):
         self.config = config
@@ -41,23 +102,9 @@ class BinaryManager:
             ('h264_amf', "AMD AMF"),
         ]
         try:
-            ffmpeg_bin = BinaryManager.get_executable('ffmpeg')
-            si = subprocess.STARTUPINFO()
-            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            output = subprocess.check_output(
-                [ffmpeg_bin, '-encoders'], 
-                startupinfo=si, 
-                stderr=subprocess.STDOUT
-            ).decode('utf-8', errors='ignore')
-            available_encoders = set()
-            for line in output.splitlines():
-                line = line.strip()
-                if line and not line.startswith("="):
-                    parts = line.split()
-                    if len(parts) > 1 and parts[0] == 'V.....':
-                        available_encoders.add(parts[1])
+            available_encoders = BinaryManager.available_encoders()
             for encoder_name, friendly_name in preferred_encoders:
-                if encoder_name in available_encoders:
+                if encoder_name in available_encoders and BinaryManager.encoder_works(encoder_name, logger):
                     logger.info(f"[RENDER] GPU encoder selected: {friendly_name} ({encoder_name})")
                     BinaryManager._cached_encoder = encoder_name
                     return BinaryManager._cached_encoder
@@ -68,6 +115,172 @@ class BinaryManager:
             BinaryManager._cached_encoder = 'libx264'
         return BinaryManager._cached_encoder
     @staticmethod
+    def encoder_works(encoder, logger=None):
+        """True when encoder has calibration results or a one-frame trial encode succeeds.
+        ffmpeg -encoders lists every encoder the build was compiled with, including hardware
+        encoders on machines without the GPU or driver for them."""
+        data = BinaryManager.load_calibration(logger)
+        if data and any(r.get('encoder') == encoder for r in data.get('results', [])):
+            return True
+        cmd = [BinaryManager.get_executable('ffmpeg'), '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+               '-i', 'nullsrc=s=256x256:d=1', '-frames:v', '1', '-pix_fmt', 'yuv420p', '-c:v', encoder, '-f', 'null', '-']
+        try:
+            res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=15, **_no_window())
+        except (OSError, subprocess.SubprocessError) as e:
+            (logger or logging.getLogger("Advanced_Video_Editor")).warning(f"[BINARY] Trial encode with {encoder} failed: {e}")
+            return False
+        if res.returncode != 0:
+            (logger or logging.getLogger("Advanced_Video_Editor")).info(
+                f"[BINARY] {encoder} is listed but unusable: {res.stderr.decode(errors='ignore').strip()[-200:]}")
+        return res.returncode == 0
+
+    @staticmethod
+    def available_encoders():
+        """Names of the video encoders this ffmpeg build offers."""
+        output = subprocess.check_output([BinaryManager.get_executable('ffmpeg'), '-hide_banner', '-encoders'],
+                                         stderr=subprocess.STDOUT, **_no_window()).decode('utf-8', errors='ignore')
+        available = set()
+        for line in output.splitlines():
+            parts = line.split()
+            # Capability column is six flags, the first one V for video (e.g. "V....D libx264")
+            if len(parts) > 1 and len(parts[0]) == 6 and parts[0].startswith('V'):
+                available.add(parts[1])
+        return available
+
+    @staticmethod
+    def calibration_path():
+        config_path = getattr(BinaryManager._config, 'path', None)
+        base = os.path.dirname(config_path) if config_path else os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+        return os.path.join(base, CALIBRATION_FILE)
+
+    @staticmethod
+    def calibrate(logger=None, duration=3.0, size="1280x720", rate=30, on_result=None):
+        """Encodes a short testsrc2 clip with every available encoder and preset, measures encode fps,
+        output size and SSIM against the source, and stores the results next to the config file.
+        on_result is called with each result as it comes in."""
+        if not logger:
+            logger = logging.getLogger("Advanced_Video_Editor")
+        ffmpeg_bin = BinaryManager.get_executable('ffmpeg')
+        source = f"testsrc2=size={size}:rate={rate}:duration={duration}"
+        available = BinaryManager.available_encoders()
+        results = []
+        work_dir = tempfile.mkdtemp(prefix="encoder_calibration_")
+        try:
+            for encoder, presets in CALIBRATION_PRESETS.items():
+                if encoder not in available:
+                    continue
+                for preset in presets:
+                    out = os.path.join(work_dir, f"{encoder}_{preset}.mkv")
+                    cmd = [ffmpeg_bin, '-y', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', source,
+                           '-pix_fmt', 'yuv420p', '-c:v', encoder, PRESET_OPTIONS.get(encoder, '-preset'), preset]
+                    cmd.extend(CALIBRATION_RATE_ARGS.get(encoder, []))
+                    cmd.append(out)
+                    started = time.monotonic()
+                    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **_no_window())
+                    elapsed = max(1e-3, time.monotonic() - started)
+                    if res.returncode != 0:
+                        logger.warning(f"[BINARY] Calibration: {encoder} {preset} failed: "
+                                       f"{res.stderr.decode(errors='ignore').strip()[-200:]}")
+                        continue
+                    result = {'encoder': encoder, 'preset': preset, 'fps': round(duration * rate / elapsed, 1),
+                              'bytes': os.path.getsize(out), 'ssim': BinaryManager._measure_ssim(ffmpeg_bin, out, source)}
+                    logger.info(f"[BINARY] Calibration: {encoder} {preset}: {result['fps']} fps, "
+                                f"{result['bytes']} bytes, SSIM {result['ssim']:.4f}")
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        data = {'ffmpeg_version': list(BinaryManager.get_ffmpeg_version(logger)), 'created': time.time(),
+                'source': source, 'results': results}
+        path = BinaryManager.calibration_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_path, path)
+        BinaryManager._calibration = data
+        return data
+
+    @staticmethod
+    def _measure_ssim(ffmpeg_bin, encoded, source):
+        cmd = [ffmpeg_bin, '-hide_banner', '-i', encoded, '-f', 'lavfi', '-i', source,
+               '-lavfi', '[0:v][1:v]ssim', '-f', 'null', '-']
+        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **_no_window())
+        match = re.search(r"All:([\d.]+)", res.stderr.decode(errors='ignore'))
+        return float(match.group(1)) if match else 0.0
+
+    @staticmethod
+    def load_calibration(logger=None):
+        """Stored calibration results, or None when there are none for the ffmpeg in use."""
+        if BinaryManager._calibration is not None:
+            return BinaryManager._calibration or None
+        path = BinaryManager.calibration_path()
+        data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                (logger or logging.getLogger("Advanced_Video_Editor")).warning(f"[BINARY] Unreadable calibration {path}: {e}")
+                data = {}
+            # Results from another ffmpeg build say nothing about this one
+            if data and tuple(data.get('ffmpeg_version', ())) != tuple(BinaryManager.get_ffmpeg_version(logger)):
+                data = {}
+        BinaryManager._calibration = data
+        return data or None
+
+    @staticmethod
+    def get_encoder_setting(purpose, logger=None):
+        """Calibrated {'encoder', 'preset', ...} result for 'export' or 'proxy', or None without a calibration."""
+        data = BinaryManager.load_calibration(logger)
+        if not data:
+            return None
+        target = dict(ENCODER_TARGETS[purpose])
+        if BinaryManager._config:
+            target.update((BinaryManager._config.get("encoder_targets") or {}).get(purpose, {}))
+        encoders = ('libx264',) if BinaryManager._cpu_only else target.get('encoders')
+        return select_setting(data.get('results', []), target.get('min_ssim'), target.get('min_fps'),
+                              target.get('max_size_ratio'), encoders)
+
+    @staticmethod
+    def get_encoder(purpose, logger=None):
+        """Encoder for 'export' or 'proxy': the calibrated choice if there is one, else get_best_encoder()."""
+        setting = BinaryManager.get_encoder_setting(purpose, logger)
+        return setting['encoder'] if setting else BinaryManager.get_best_encoder(logger)
+
+    @staticmethod
+    def preset_args(setting, encoder):
+        """The calibrated preset as ffmpeg arguments when setting applies to encoder, else []."""
+        if not setting or setting['encoder'] != encoder:
+            return []
+        return [PRESET_OPTIONS.get(encoder, '-preset'), setting['preset']]
+
+    @staticmethod
+    def get_ffmpeg_version(logger=None):
+        """Returns the ffmpeg major/minor version as a tuple, (0, 0) when unknown. Git builds count as current."""
+        if BinaryManager._cached_ffmpeg_version:
+            return BinaryManager._cached_ffmpeg_version
+        if not logger:
+            logger = logging.getLogger("Advanced_Video_Editor")
+        version = (0, 0)
+        try:
+            output = subprocess.check_output([BinaryManager.get_executable('ffmpeg'), '-version'],
+                                             stderr=subprocess.STDOUT, **_no_window()).decode('utf-8', errors='ignore')
+            tag = output.split()[2] if output.startswith("ffmpeg version") else ""
+            tag = tag.lstrip('n')
+            if tag.startswith("N-"):
+                version = (99, 0)
+            else:
+                nums = [int(p) for p in tag.split('-')[0].split('.')[:2] if p.isdigit()]
+                version = tuple(nums + [0] * (2 - len(nums))) if nums else (0, 0)
+            logger.info(f"[BINARY] ffmpeg version {version[0]}.{version[1]}")
+        except Exception as e:
+            logger.warning(f"[BINARY] ffmpeg version probe failed: {e}")
+        BinaryManager._cached_ffmpeg_version = version
+        return version
+
+    @staticmethod
     def purge_vlc_cache(bin_dir, logger):
         """Nukes stale plugin-registry to prevent 'ghost' DLL errors."""
         plugins_dat = os.path.join(bin_dir, "plugins", "plugins.dat")
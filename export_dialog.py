@@ -1,16 +1,22 @@
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QTextEdit, QProgressBar, QPushButton, QFileDialog
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QTextEdit, QProgressBar, QPushButton, QFileDialog, QCheckBox, QLineEdit, QListWidget
 from PyQt5.QtCore import Qt
 from render_worker import RenderWorker
+from render_queue import RenderJob
 import constants
 
 class ExportDialog(QDialog):
-    def __init__(self, timeline_state, track_vols, track_mutes, res_mode, audio_analysis_results, parent=None):
+    def __init__(self, timeline_state, track_vols, track_mutes, res_mode, audio_analysis_results, parent=None, cache_dir=None,
+                 render_queue=None):
         super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.render_queue = render_queue
+        self.job_id = None
         self.state = timeline_state
         self.vols = track_vols
         self.mutes = track_mutes
         self.res_mode = res_mode
         self.audio_analysis_results = audio_analysis_results
+        self.extra_targets = []
         self.worker = None
         self.setup_ui()
 
@@ -29,11 +35,67 @@ class ExportDialog(QDialog):
         self.bar = QProgressBar()
         self.bar.setRange(0, 100)
         l.addWidget(self.bar)
+        self.lbl_eta = QLabel("ETA: --:--")
+        self.lbl_eta.setStyleSheet("color: #AAA; font-family: 'Consolas';")
+        l.addWidget(self.lbl_eta)
+        quality_row = QHBoxLayout()
+        quality_row.addWidget(QLabel("Scaling Quality:"))
+        self.combo_quality = QComboBox()
+        for label, profile in (("Final (Lanczos)", 'final'), ("Preview (Fast Bilinear)", 'preview'), ("Draft (Nearest)", 'draft')):
+            self.combo_quality.addItem(label, profile)
+        self.combo_quality.setToolTip("Scaler used when resizing clips; Draft renders fastest, Final looks best")
+        quality_row.addWidget(self.combo_quality)
+        l.addLayout(quality_row)
+        self.chk_segmented = QCheckBox("Parallel Segmented Render")
+        self.chk_segmented.setToolTip("Render the timeline in segments on several encoder processes and join them without re-encoding")
+        l.addWidget(self.chk_segmented)
+        self.chk_incremental = QCheckBox("Reuse Unchanged Segments")
+        self.chk_incremental.setToolTip("Keep encoded segments in the project cache and only re-encode the parts of the timeline that changed")
+        self.chk_incremental.setEnabled(bool(self.cache_dir))
+        l.addWidget(self.chk_incremental)
+        self.chk_smart = QCheckBox("Smart Render (copy untouched footage)")
+        self.chk_smart.setToolTip("Stream-copy stretches where a single unedited clip plays and only re-encode around its keyframes")
+        l.addWidget(self.chk_smart)
+        l.addWidget(QLabel("Additional Outputs (encoded in the same pass):"))
+        target_row = QHBoxLayout()
+        self.combo_target_res = QComboBox()
+        self.combo_target_res.addItems([
+            "Landscape 1920x1080 (HD)", "Landscape 2560x1440 (QHD)", "Landscape 3840x2160 (4K)",
+            "Portrait 1080x1920 (Mobile HD)", "Portrait 1440x2560 (Mobile QHD)"])
+        target_row.addWidget(self.combo_target_res)
+        self.combo_target_codec = QComboBox()
+        self.combo_target_codec.addItem("Auto Encoder", 'auto')
+        self.combo_target_codec.addItem("H.264 (CPU)", 'libx264')
+        target_row.addWidget(self.combo_target_codec)
+        self.edit_target_bitrate = QLineEdit()
+        self.edit_target_bitrate.setPlaceholderText("Bitrate, e.g. 4M")
+        self.edit_target_bitrate.setToolTip("Leave empty for the same constant quality as the main export")
+        target_row.addWidget(self.edit_target_bitrate)
+        btn_add_target = QPushButton("Add Output...")
+        btn_add_target.setCursor(Qt.PointingHandCursor)
+        btn_add_target.clicked.connect(self.add_target)
+        target_row.addWidget(btn_add_target)
+        l.addLayout(target_row)
+        self.list_targets = QListWidget()
+        self.list_targets.setMaximumHeight(70)
+        l.addWidget(self.list_targets)
+        btn_remove_target = QPushButton("Remove Output")
+        btn_remove_target.setCursor(Qt.PointingHandCursor)
+        btn_remove_target.clicked.connect(self.remove_target)
+        l.addWidget(btn_remove_target)
         self.btn_start = QPushButton("Start Export")
         self.btn_start.setCursor(Qt.PointingHandCursor)
         self.btn_start.setToolTip("Start the video export process")
         self.btn_start.clicked.connect(self.start_export)
         l.addWidget(self.btn_start)
+        if self.render_queue is not None:
+            self.btn_queue = QPushButton("Add to Render Queue")
+            self.btn_queue.setCursor(Qt.PointingHandCursor)
+            self.btn_queue.setToolTip("Queue this export and keep editing; queued exports share the CPU/encoder budget")
+            self.btn_queue.clicked.connect(lambda: self.queue_export(track=False))
+            l.addWidget(self.btn_queue)
+            self.render_queue.job_changed.connect(self._on_job_changed)
+            self.render_queue.job_stats.connect(self._on_job_stats)
 
     def calculate_estimate(self):
         """Calculates rough file size based on duration and target bitrate."""
@@ -62,14 +124,89 @@ class ExportDialog(QDialog):
     def log(self, t):
         self.console.append(t)
 
+    def add_target(self):
+        """Adds another deliverable; the timeline is composited once and scaled for each output."""
+        out, _ = QFileDialog.getSaveFileName(self, "Save Additional Output", "", "Video (*.mp4)")
+        if not out: return
+        bitrate = self.edit_target_bitrate.text().strip()
+        # Bitrate-capped outputs are review copies; their audio does not need the master's 320k either
+        target = {'path': out, 'resolution': self.combo_target_res.currentText(),
+                  'codec': self.combo_target_codec.currentData(),
+                  'video_bitrate': bitrate, 'audio_bitrate': '192k' if bitrate else '320k'}
+        self.extra_targets.append(target)
+        self.list_targets.addItem(f"{target['path']}  {target['resolution']} / {self.combo_target_codec.currentText()}"
+                                  f"{' @ ' + target['video_bitrate'] if target['video_bitrate'] else ''}")
+
+    def remove_target(self):
+        row = self.list_targets.currentRow()
+        if row >= 0:
+            self.list_targets.takeItem(row)
+            del self.extra_targets[row]
+
+    def queue_export(self, track=True):
+        """Hands the export to the render queue; with track, this dialog follows the job's progress."""
+        out, _ = QFileDialog.getSaveFileName(self, "Save Video", "", "Video (*.mp4)")
+        if not out: return
+        job = RenderJob(out, [dict(c) for c in self.state], self.res_mode, self.combo_quality.currentData(),
+                        dict(self.vols), dict(self.mutes), dict(self.audio_analysis_results or {}),
+                        segmented=self.chk_segmented.isChecked(), incremental=self.chk_incremental.isChecked(),
+                        smart=self.chk_smart.isChecked(), cache_dir=self.cache_dir or "",
+                        extra_targets=[dict(t) for t in self.extra_targets])
+        if track:
+            self.job_id = job.job_id
+            self.btn_start.setEnabled(False)
+            self.btn_start.setText("Queued...")
+            self.bar.setValue(0)
+        self.render_queue.add_job(job)
+        self.log(f"Queued: {out} ({len(self.render_queue.jobs)} jobs in queue)")
+
+    def _on_job_stats(self, job_id, stats):
+        if job_id == self.job_id:
+            self.update_stats(stats)
+
+    def done(self, result):
+        """The queue outlives the dialog, so its signals are let go when the dialog closes."""
+        if self.render_queue is not None:
+            for signal, slot in ((self.render_queue.job_changed, self._on_job_changed),
+                                 (self.render_queue.job_stats, self._on_job_stats)):
+                try:
+                    signal.disconnect(slot)
+                except TypeError:
+                    pass
+        super().done(result)
+
+    def _on_job_changed(self, job_id):
+        job = self.render_queue.job(job_id) if job_id == self.job_id else None
+        if not job:
+            return
+        self.bar.setValue(job.progress)
+        if job.status == 'running':
+            self.btn_start.setText("Rendering...")
+        elif job.status == 'done':
+            self.log("Export Successful!")
+        elif job.status in ('failed', 'cancelled'):
+            self.log(f"CRITICAL ERROR: {job.error or job.status}")
+        if job.status in ('done', 'failed', 'cancelled'):
+            self.job_id = None
+            self.btn_start.setEnabled(True)
+            self.btn_start.setText("Start Export" if job.status == 'done' else "Retry Export")
+
     def start_export(self):
+        if self.render_queue is not None:
+            self.queue_export(track=True)
+            return
         out, _ = QFileDialog.getSaveFileName(self, "Save Video", "", "Video (*.mp4)")
         if not out: return
         self.btn_start.setEnabled(False)
         self.btn_start.setText("Rendering...")
         self.bar.setValue(0)
-        self.worker = RenderWorker(self.state, out, self.res_mode, self.vols, self.mutes, self.audio_analysis_results)
+        self.worker = RenderWorker(self.state, out, self.res_mode, self.vols, self.mutes, self.audio_analysis_results,
+                                   segmented=self.chk_segmented.isChecked(), cache_dir=self.cache_dir,
+                                   quality=self.combo_quality.currentData(),
+                                   incremental=self.chk_incremental.isChecked(), smart=self.chk_smart.isChecked(),
+                                   extra_targets=self.extra_targets)
         self.worker.progress.connect(self.bar.setValue)
+        self.worker.stats.connect(self.update_stats)
         
         def on_finished():
             self.log("Export Successful!")
@@ -85,6 +222,17 @@ class ExportDialog(QDialog):
         self.worker.start()
         self.log(f"Export initiated: {out}")
 
+    def update_stats(self, stats):
+        """Shows the remaining time and encoder throughput from RenderWorker.stats."""
+        eta = stats.get('eta')
+        eta_text = "--:--" if eta is None else f"{int(eta // 60):02}:{int(eta % 60):02}"
+        parts = [f"ETA: {eta_text}", f"{stats.get('fps', 0.0):.1f} fps", f"{stats.get('speed', 0.0):.2f}x"]
+        if stats.get('frame'):
+            parts.append(f"frame {stats['frame']}")
+        if stats.get('bitrate') not in (None, 'N/A'):
+            parts.append(stats['bitrate'])
+        self.lbl_eta.setText(" | ".join(parts))
+
     def update_ui_estimate(self):
         """Goal 21: Live bitrate math with Discord safety threshold."""
         text = self.calculate_estimate()
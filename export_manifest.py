@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+
+def job_dir_for(output_path):
+    """Hidden folder next to the output that holds a fragmented export's finished fragments and manifest.
+    It is derived from the output path only, so restarting the same export finds it again."""
+    output_path = os.path.abspath(output_path)
+    return os.path.join(os.path.dirname(output_path), f".{os.path.basename(output_path)}.parts")
+
+class ExportManifest:
+    """Checkpoints of a fragmented export. Each finished fragment is recorded under the content key it was
+    rendered for, with its path and size; a fragment only counts as done while that file is still intact,
+    so edits to the timeline or a half-written file simply make it render again."""
+    FILE_NAME = "manifest.json"
+
+    def __init__(self, job_dir, output_path):
+        self.job_dir = job_dir
+        self.path = os.path.join(job_dir, self.FILE_NAME)
+        self.output_path = os.path.abspath(output_path)
+        self.fragments = {}
+        self.logger = logging.getLogger("Advanced_Video_Editor")
+        os.makedirs(job_dir, exist_ok=True)
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"[RENDER] Ignoring unreadable export manifest {self.path}: {e}")
+            return
+        if data.get('output') == self.output_path:
+            self.fragments = data.get('fragments', {})
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'output': self.output_path, 'fragments': self.fragments}, f, indent=4)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"[RENDER] Could not write export manifest: {e}")
+
+    def finished(self, key):
+        """Path of the verified fragment rendered for key, or None."""
+        entry = self.fragments.get(key)
+        if not entry:
+            return None
+        try:
+            if os.path.getsize(entry['path']) == entry['size'] and entry['size'] > 0:
+                return entry['path']
+        except OSError:
+            pass
+        return None
+
+    def record(self, key, path):
+        """Marks the fragment for key as finished and writes the manifest straight away."""
+        self.fragments[key] = {'path': os.path.abspath(path), 'size': os.path.getsize(path)}
+        self.save()
@@ -1,29 +1,88 @@
+import hashlib
+import json
 import logging
-from filter_graph import FilterGraph, FilterNode
+import threading
+from collections import OrderedDict
+from filter_graph import FilterGraph, FilterNode, FilterChain
+
+# Graphs longer than this go to a filter script file instead of the command line
+FILTER_SCRIPT_THRESHOLD = 16 * 1024
+# Pixel format the compositor works in; sources are converted to it once, before any scaling or overlay
+WORKING_PIX_FMT = 'yuv420p'
+# Scaler settings per use: draft and preview trade quality for speed, final is for exports.
+# skip_same_size drops the scale step when the (cropped) source already has the target size.
+QUALITY_PROFILES = {
+    'draft': {'flags': 'neighbor', 'dither': 'none', 'skip_same_size': True},
+    'preview': {'flags': 'fast_bilinear', 'dither': None, 'skip_same_size': True},
+    'final': {'flags': 'lanczos+accurate_rnd+full_chroma_int', 'dither': 'ed', 'skip_same_size': False},
+}
+# Frames a shared decoder may hold back for lagging split outputs before the source is opened again
+SHARED_SOURCE_BUDGET_MB = 512
 
 class FilterGraphGenerator:
-    def __init__(self, clips, width=1920, height=1080, volumes=None, mutes=None, audio_analysis=None):
+    # Serialized per-clip chains shared across builds, keyed by the clip's uid and content hash plus the
+    # arguments the chain was built from, so an edit only formats the chains of the clips it touched
+    _fragment_cache = OrderedDict()
+    _fragment_lock = threading.Lock()
+    FRAGMENT_CACHE_LIMIT = 20000
+
+    def __init__(self, clips, width=1920, height=1080, volumes=None, mutes=None, audio_analysis=None,
+                 memory_budget_mb=SHARED_SOURCE_BUDGET_MB, fps=30.0, normalize_formats=True):
         self.clips = clips
         self.w = width
         self.h = height
+        self.fps = fps
+        self.normalize_formats = normalize_formats
+        self.quality = 'preview'
+        self._inline_norm = {}
         self.vols = volumes or {}
         self.mutes = mutes or {}
         self.audio_analysis = audio_analysis or {}
+        self.input_seeks = []
+        # Where each input actually starts decoding; differs from input_seeks once a compiled timeline is
+        # instantiated past its start, as trims stay relative to input_seeks
+        self.input_starts = []
+        self.memory_budget_mb = memory_budget_mb
+        self.buffered_frames_estimate = 0
+        self._usage_inputs = {}
+        self._clip_hashes = {}
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        self.graph = None
         self.logger = logging.getLogger("Advanced_Video_Editor")
 
-    def build(self, start_time=0.0, duration=None, is_export=False):
+    def build(self, start_time=0.0, duration=None, is_export=False, quality=None, video=True, audio=True):
+        """quality names a QUALITY_PROFILES entry; exports default to 'final', everything else to 'preview'.
+        video/audio switch either half of the graph off; its output pin is returned as None."""
+        quality = quality or ('final' if is_export else 'preview')
+        if quality not in QUALITY_PROFILES:
+            raise ValueError(f"Unknown quality profile '{quality}'")
+        self.quality = quality
         graph = FilterGraph()
+        self._clip_hashes = {}
+        self.fragment_hits = 0
+        self.fragment_misses = 0
         render_end = start_time + (duration if duration else 99999)
         raw_clips = [c for c in self.clips if c['start'] < render_end and (c['start'] + c.get('dur', c.get('duration', 0))) > start_time]
-        for c in raw_clips:
-            if c.get('path'):
-                graph.add_input(c['path'])
-        if not graph.inputs:
+        if not any(c.get('path') for c in raw_clips):
+            self.input_seeks = []
+            self.input_starts = []
+            self.graph = None
             return [], "", "[vo]", "[ao]", False
-        video_clips = sorted([c for c in raw_clips if c.get('width', 0) > 0], key=lambda x: (-x['track'], x['start']))
-        all_audio_clips = sorted([c for c in raw_clips if c.get('has_audio', True) and not (c.get('muted') or self.mutes.get(c['track']))], key=lambda x: (x['track'], x['start']))
+        video_clips = sorted([c for c in raw_clips if video and c.get('width', 0) > 0], key=lambda x: (-x['track'], x['start']))
+        all_audio_clips = sorted([c for c in raw_clips if audio and c.get('has_audio', True) and not (c.get('muted') or self.mutes.get(c['track']))], key=lambda x: (x['track'], x['start']))
         audio_clips = all_audio_clips
-        last_video_pin = self._build_video_chain(graph, video_clips, start_time, duration, is_export)
+        if duration is not None:
+            window_dur = max(0.25, float(duration))
+        else:
+            max_end = max([c['start'] + c.get('dur', c.get('duration', 0)) for c in self.clips], default=start_time + 10.0)
+            window_dur = max(0.25, max_end - start_time)
+        pieces = self._plan_video_pieces(video_clips, start_time, start_time + window_dur) if video else []
+        usages = [(clip, t0) for _, _, _, spans in pieces for clip, t0, _ in spans]
+        usages += [(clip, max(start_time, clip['start'])) for clip in audio_clips]
+        # Inputs are registered by their first use, so sources that were culled everywhere never get opened
+        self._plan_inputs(graph, usages)
+        last_video_pin = self._build_video_chain(graph, pieces) if pieces else None
         last_audio_pin = self._build_audio_chain(graph, audio_clips, start_time, duration)
         if last_video_pin:
             final_video_node = FilterNode("null", num_inputs=1, num_outputs=1)
@@ -35,175 +94,660 @@ class FilterGraphGenerator:
             final_audio_node.input_pins[0] = last_audio_pin
             final_audio_node.output_pins[0] = "[ao]"
             graph.add_node(final_audio_node)
-        else:
+        elif audio:
             null_audio = FilterNode("anullsrc", {'layout': 'stereo', 'sample_rate': 44100}, num_inputs=0)
             null_audio.output_pins[0] = "[ao]"
             graph.add_node(null_audio)
         main_input_used = any(c['path'].replace('\\','/') == graph.inputs[0] for c in video_clips) if graph.inputs else False
-        return graph.inputs, graph.to_string(), "[vo]", "[ao]", main_input_used
+        self.input_seeks = list(graph.input_seeks)
+        self.input_starts = list(graph.input_seeks)
+        self.logger.debug(f"[GRAPH] Reused {self.fragment_hits} clip fragments, rebuilt {self.fragment_misses}")
+        node_count = len(graph.nodes)
+        removed = graph.optimize()
+        self.logger.debug(f"[GRAPH] Optimizer removed {removed} filters, {node_count} nodes fused into {len(graph.nodes)}")
+        self.graph = graph
+        return graph.inputs, graph.to_string(), "[vo]" if video else None, "[ao]" if audio else None, main_input_used
 
-    def _build_video_chain(self, graph, video_clips, start_time, duration, is_export):
-        if duration is not None:
-            window_dur = max(0.25, float(duration))
-        else:
-            max_end = max([c['start'] + c.get('dur', c.get('duration', 0)) for c in self.clips], default=start_time + 10.0)
-            window_dur = max(0.25, max_end - start_time)
-        base_node = FilterNode("color", {'c': 'black', 's': f'{self.w}x{self.h}', 'd': f'{window_dur:.3f}'}, num_inputs=0)
-        graph.add_node(base_node)
-        last_v_pin = base_node.output_pins[0]
-        video_src_pins = {}
-        video_counts = {}
-        for clip in video_clips:
-            norm_path = clip['path'].replace('\\', '/')
-            video_counts[norm_path] = video_counts.get(norm_path, 0) + 1
-        for norm_path, count in video_counts.items():
+    def compile_timeline(self, is_export=False, quality=None, video=True, audio=True):
+        """Builds the whole timeline once, independent of the playhead. Every concat piece and audio clip
+        is compiled to its own serialized body reading placeholder pins, so CompiledTimeline.at() only
+        has to re-emit what the playhead cuts into and wire the sources up."""
+        quality = quality or ('final' if is_export else 'preview')
+        if quality not in QUALITY_PROFILES:
+            raise ValueError(f"Unknown quality profile '{quality}'")
+        self.quality = quality
+        graph = FilterGraph()
+        self._clip_hashes = {}
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        end = max([c['start'] + c.get('dur', c.get('duration', 0)) for c in self.clips], default=0.0)
+        raw_clips = [c for c in self.clips if c['start'] + c.get('dur', c.get('duration', 0)) > 0]
+        if not any(c.get('path') for c in raw_clips):
+            return CompiledTimeline(self, graph, graph, [], OrderedDict(), {}, 0.0, False, video, audio)
+        video_clips = sorted([c for c in raw_clips if video and c.get('width', 0) > 0], key=lambda x: (-x['track'], x['start']))
+        audio_clips = sorted([c for c in raw_clips if audio and c.get('has_audio', True) and not (c.get('muted') or self.mutes.get(c['track']))], key=lambda x: (x['track'], x['start']))
+        pieces = self._plan_video_pieces(video_clips, 0.0, max(0.25, end)) if video else []
+        video_uses = [(clip, t0) for _, _, _, spans in pieces for clip, t0, _ in spans]
+        self._plan_inputs(graph, video_uses + [(clip, clip['start']) for clip in audio_clips])
+        shared_norm = self._plan_normalization([(self._input_for(clip, t0), clip) for clip, t0 in video_uses])
+        # Sections continue each other's pin labels, so bodies never collide however they are combined
+        part = graph
+        use_idx = 0
+        compiled_pieces = []
+        for k, (kind, a, b, spans) in enumerate(pieces):
+            part = part.section()
+            layers = []
+            for clip, t0, t1 in spans:
+                layers.append((clip, t0, t1, self._input_for(clip, t0), f"[u{use_idx}]"))
+                use_idx += 1
+            self._pin_piece(part, self._emit_piece(part, kind, layers, a, b), a, b, f"[c{k}]")
+            part.optimize()
+            compiled_pieces.append((kind, a, b, layers, part.to_string()))
+        # Lanes are packed on absolute times; clips before the playhead are dropped from them at instantiation
+        lanes = OrderedDict()
+        for k, clip in enumerate(audio_clips):
+            length = clip.get('dur', clip.get('duration', 0))
+            if length <= 0:
+                continue
+            ref = self._input_for(clip, clip['start'])
+            part = part.section()
+            use_pin = f"[u{use_idx}]"
+            use_idx += 1
+            out_pin, length = self._emit_audio_clip(part, clip, ref, use_pin, clip['start'], length, f"[b{k}]")
+            part.optimize()
+            t0 = round(clip['start'], 3)
+            track_lanes = lanes.setdefault(clip['track'], [])
+            lane = next((l for l in track_lanes if l[-1][1] <= t0 + 0.001), None)
+            if lane is None:
+                lane = []
+                track_lanes.append(lane)
+            lane.append((t0, t0 + length, clip, ref, use_pin, out_pin, part.to_string()))
+        main_input_used = any(c['path'].replace('\\','/') == graph.inputs[0] for c in video_clips) if graph.inputs else False
+        self.logger.debug(f"[GRAPH] Compiled {len(compiled_pieces)} pieces and {len(audio_clips)} audio clips, "
+                          f"reused {self.fragment_hits} clip fragments, rebuilt {self.fragment_misses}")
+        return CompiledTimeline(self, graph, part, compiled_pieces, lanes, shared_norm, self._snap(end), main_input_used, video, audio)
+
+    def write_filter_script(self, path):
+        """Streams the most recently built graph to path without joining it into one string first."""
+        with open(path, 'w', encoding='utf-8') as f:
+            self.graph.write_script(f)
+        return path
+
+    def _playable(self, clip):
+        """Timeline seconds of the clip that play source frames, between the start and end freezes."""
+        clip_duration = clip.get('dur', clip.get('duration', 0))
+        return max(0.0, clip_duration - clip.get('start_freeze', 0.0) - clip.get('end_freeze', 0.0))
+
+    def _source_start(self, clip, t):
+        """Source timestamp the clip shows at timeline time t (its first frame if t is before the clip).
+        Start freezes hold the first frame, end freezes the last one, and speed scales the part in between."""
+        local = max(0.0, t - clip['start']) - clip.get('start_freeze', 0.0)
+        playable = self._playable(clip)
+        speed = clip.get('speed', 1.0)
+        if clip.get('end_freeze', 0.0) > 0 and local >= playable:
+            return clip.get('source_in', 0.0) + max(0.0, playable * speed - 1.0 / float(clip.get('fps') or 30.0))
+        return clip.get('source_in', 0.0) + min(max(0.0, local), playable) * speed
+
+    def _plan_inputs(self, graph, usages):
+        """Decides per source between one decoder feeding split/asplit and separately seeked inputs.
+        A shared decoder holds frames for every output that lags behind the one being fed; the lag between
+        two uses is the difference of their (source time - timeline time) offsets. Uses are grouped by that
+        offset while the group's lag fits the memory budget, and each group is one input seeked to its
+        earliest frame, so the decoder starts there instead of at the first frame of the file."""
+        budget = self.memory_budget_mb * 1024 * 1024
+        by_path = OrderedDict()
+        for clip, t0 in usages:
+            by_path.setdefault(clip['path'].replace('\\', '/'), []).append((clip, t0))
+        self._usage_inputs = {}
+        self.buffered_frames_estimate = 0
+        for norm_path, items in by_path.items():
+            fps = max(float(c.get('fps') or 30.0) for c, _ in items)
+            frame_bytes = max(c.get('width', 0) * c.get('height', 0) for c, _ in items) * 1.5
+            bytes_per_sec = fps * frame_bytes + 44100 * 2 * 4
+            groups = []
+            # (source time - timeline time, source time, clip, t0), computed once per use
+            uses = sorted(((src - t0, src, clip, t0) for clip, t0 in items for src in (self._source_start(clip, t0),)),
+                          key=lambda u: u[0])
+            for offset, src, clip, t0 in uses:
+                if groups and (offset - groups[-1][0]) * bytes_per_sec <= budget:
+                    groups[-1][1].append((clip, t0))
+                    groups[-1][2] = offset
+                    groups[-1][3] = min(groups[-1][3], src)
+                else:
+                    groups.append([offset, [(clip, t0)], offset, src])
+            for idx, (first_offset, members, last_offset, seek) in enumerate(groups):
+                key = norm_path if idx == 0 else f"{norm_path}#{idx}"
+                graph.set_input_seek(norm_path, round(seek, 3), key)
+                for c, t in members:
+                    self._usage_inputs[(id(c), round(t, 3))] = (norm_path, key)
+                self.buffered_frames_estimate += int((last_offset - first_offset) * fps)
+        self.logger.debug(f"[GRAPH] {len(by_path)} sources opened as {len(graph.inputs)} inputs, "
+                          f"~{self.buffered_frames_estimate} frames buffered by shared decoders")
+
+    def _input_for(self, clip, t0):
+        """(path, input key) chosen by _plan_inputs for the use of clip starting at timeline time t0."""
+        return self._usage_inputs[(id(clip), round(t0, 3))]
+
+    def _fade_windows(self, clip, in_offset, remaining):
+        """Maps clip-local fades onto a render window that starts in_offset seconds into the clip.
+        Keeps fades anchored to the clip edges when the timeline is rendered in segments."""
+        clip_duration = clip.get('dur', clip.get('duration', 0))
+        fade_in = clip.get('fade_in', 0.0)
+        fade_out = clip.get('fade_out', 0.0)
+        windows = []
+        if fade_in > 0 and in_offset < fade_in:
+            windows.append(('in', 0.0, fade_in - in_offset))
+        if fade_out > 0:
+            fade_start = clip_duration - fade_out - in_offset
+            if fade_start < remaining:
+                windows.append(('out', max(0.0, fade_start), fade_out + min(0.0, fade_start)))
+        return windows
+
+    def _normalize_filters(self, clip):
+        """fps/format conversion needed to bring a source to the project rate and working format, from probe data."""
+        if not self.normalize_formats:
+            return []
+        filters = []
+        source_fps = float(clip.get('fps') or 0.0)
+        if source_fps and abs(source_fps - self.fps) > 0.01:
+            filters.append(("fps", {'fps': f'{self.fps:g}'}))
+        if clip.get('pix_fmt') and clip['pix_fmt'] != WORKING_PIX_FMT:
+            filters.append(("format", {'pix_fmts': WORKING_PIX_FMT}))
+        return filters
+
+    def _plan_normalization(self, uses):
+        """One conversion per video input, so concat and overlay never need implicit converters.
+        An input read by a single chain converts right after its trim, where the fewest frames are left;
+        a split input converts once before the split instead of in every branch. uses is (ref, clip) pairs."""
+        counts = OrderedDict()
+        for ref, _ in uses:
+            counts[ref] = counts.get(ref, 0) + 1
+        self._inline_norm = {}
+        shared = {}
+        for ref, clip in uses:
+            filters = self._normalize_filters(clip)
+            if filters:
+                (shared if counts[ref] > 1 else self._inline_norm)[ref] = filters
+        return shared
+
+    def _source_pins(self, graph, refs, stream_type, normalize=None):
+        """Hands out one input pin per consumer, splitting inputs that feed more than one chain.
+        normalize maps split inputs to the filters they go through before the split."""
+        counts = OrderedDict()
+        for ref in refs:
+            counts[ref] = counts.get(ref, 0) + 1
+        src_pins = {}
+        for ref, count in counts.items():
             if count > 1:
-                input_pin = graph.get_input_stream(norm_path, 'v')
-                split_node = FilterNode("split", str(count), num_outputs=count)
-                split_node.input_pins[0] = input_pin
-                graph.add_node(split_node)
-                video_src_pins[norm_path] = split_node.output_pins
+                src_pins[ref] = self._split_source(graph, ref, stream_type, [None] * count, (normalize or {}).get(ref))
             else:
-                video_src_pins[norm_path] = [graph.get_input_stream(norm_path, 'v')]
+                src_pins[ref] = [graph.get_input_stream(ref[0], stream_type, ref[1])]
+        return src_pins
+
+    def _split_source(self, graph, ref, stream_type, pins, normalize=None):
+        """Feeds input ref, converted by the normalize filters first, to one output per entry of pins
+        (None picks the next free label). Returns the output pins."""
+        input_pin = graph.get_input_stream(ref[0], stream_type, ref[1])
+        if normalize:
+            norm_chain = FilterChain(normalize)
+            norm_chain.input_pins[0] = input_pin
+            graph.add_node(norm_chain)
+            input_pin = norm_chain.output_pins[0]
+        if len(pins) > 1:
+            node = FilterNode("split" if stream_type == 'v' else "asplit", str(len(pins)), num_outputs=len(pins))
+        else:
+            node = FilterNode("null" if stream_type == 'v' else "anull")
+        node.input_pins[0] = input_pin
+        node.output_pins = list(pins)
+        graph.add_node(node)
+        return list(node.output_pins)
+
+    def _is_full_frame(self, clip):
+        return (clip.get('scale_x', 1.0) == 1.0 and clip.get('scale_y', 1.0) == 1.0
+                and clip.get('pos_x', 0.0) == 0.0 and clip.get('pos_y', 0.0) == 0.0)
+
+    def _fade_active(self, clip, a, b):
+        clip_end = clip['start'] + clip.get('dur', clip.get('duration', 0))
+        fade_in = clip.get('fade_in', 0.0)
+        fade_out = clip.get('fade_out', 0.0)
+        return (fade_in > 0 and a < clip['start'] + fade_in) or (fade_out > 0 and b > clip_end - fade_out)
+
+    def _visible_clips(self, active, a, b):
+        """Occlusion culling: drops every clip under the topmost full-frame clip that is not fading over [a, b)."""
+        visible = []
+        for clip in sorted(active, key=lambda x: x['track']):
+            visible.append(clip)
+            if self._is_full_frame(clip) and not self._fade_active(clip, a, b):
+                break
+        return visible
+
+    def _plan_video_pieces(self, video_clips, start_time, window_end):
+        """Cuts the render window at every clip and fade edge and labels each stretch:
+        'gap' (nothing visible), 'single' (one full-frame clip) or 'stack' (clips that need compositing).
+        Neighbouring stretches of the same kind are merged so each becomes one concat piece;
+        its spans are [clip, t0, t1] timeline ranges where the clip is actually visible.
+        Edges are snapped to the output frame grid, so concatenated pieces add up to whole frames."""
+        edges = {self._snap(start_time), self._snap(window_end)}
         for clip in video_clips:
-            norm_path = clip['path'].replace('\\', '/')
-            if not video_src_pins.get(norm_path): continue
-            clip_v_pin = video_src_pins[norm_path].pop(0)
-            source_in = clip.get('source_in', 0.0)
-            in_offset = max(0.0, start_time - clip['start'])
-            clip_duration = clip.get('dur', clip.get('duration',0))
-            remaining = clip_duration - in_offset
-            clip_end = clip['start'] + clip_duration
-            render_end = start_time + (duration if duration else 99999)
-            if clip_end > render_end:
-                remaining = max(0, render_end - max(start_time, clip['start']))
-            if remaining <= 0: continue
-            trim_start = source_in + in_offset
-            trim_node = FilterNode("trim", {'start': f'{trim_start:.3f}', 'duration': f'{remaining:.3f}'})
-            trim_node.input_pins[0] = clip_v_pin
-            graph.add_node(trim_node)
-            fade_in = clip.get('fade_in', 0.0)
-            fade_out = clip.get('fade_out', 0.0)
-            current_pin = trim_node.output_pins[0]
-            if fade_in > 0 or fade_out > 0:
-                fade_expr_parts = []
-                if fade_in > 0:
-                    fade_expr_parts.append(f"if(lt(t,{fade_in}),t/{fade_in},1)")
-                if fade_out > 0:
-                    fade_expr_parts.append(f"if(gt(t,{remaining - fade_out}),({remaining}-t)/{fade_out},1)")
-                if fade_expr_parts:
-                    fade_expr = "*".join(fade_expr_parts)
-                    fade_node = FilterNode("fade", {'type': 'in', 'start_time': 0, 'duration': f'{remaining:.3f}', 'alpha': 1, 'expr': fade_expr})
-                    graph.connect(trim_node, fade_node)
-                    graph.add_node(fade_node)
-                    current_pin = fade_node.output_pins[0]
-            scale_node = FilterNode("scale", {'w': int(self.w * clip.get('scale_x', 1.0)), 'h': int(self.h * clip.get('scale_y', 1.0)), 'flags': 'fast_bilinear'})
-            scale_node.input_pins[0] = current_pin
-            graph.add_node(scale_node)
-            rel_start = max(0.0, clip['start'] - start_time)
-            pts_offset = rel_start / clip.get('speed', 1.0)
-            setpts_node = FilterNode("setpts", {'expr': f'PTS-STARTPTS+{pts_offset:.3f}/TB'})
-            graph.connect(scale_node, setpts_node)
-            graph.add_node(setpts_node)
+            clip_end = clip['start'] + clip.get('dur', clip.get('duration', 0))
+            points = [clip['start'], clip_end]
+            if clip.get('fade_in', 0.0) > 0:
+                points.append(clip['start'] + clip['fade_in'])
+            if clip.get('fade_out', 0.0) > 0:
+                points.append(clip_end - clip['fade_out'])
+            for t in points:
+                if start_time < t < window_end:
+                    edges.add(self._snap(t))
+        edges = sorted(edges)
+        # Sweep the edges once, adding clips as they start and dropping them once they have ended,
+        # so planning stays O(clips log clips) instead of rescanning every clip per stretch
+        ends = [c['start'] + c.get('dur', c.get('duration', 0)) for c in video_clips]
+        by_start = sorted(range(len(video_clips)), key=lambda i: video_clips[i]['start'])
+        by_end = sorted(range(len(video_clips)), key=lambda i: ends[i])
+        next_start = next_end = 0
+        active_idx = {}
+        pieces = []
+        for a, b in zip(edges, edges[1:]):
+            while next_start < len(by_start) and video_clips[by_start[next_start]]['start'] < b:
+                active_idx[by_start[next_start]] = True
+                next_start += 1
+            while next_end < len(by_end) and ends[by_end[next_end]] <= a:
+                active_idx.pop(by_end[next_end], None)
+                next_end += 1
+            active = [video_clips[i] for i in sorted(active_idx)]
+            visible = self._visible_clips(active, a, b)
+            if not visible:
+                kind = 'gap'
+            elif len(visible) == 1 and self._is_full_frame(visible[0]):
+                kind = 'single'
+            else:
+                kind = 'stack'
+            prev = pieces[-1] if pieces else None
+            if prev and prev[0] == kind and (kind != 'single' or prev[3][0][0] is visible[0]):
+                spans = prev[3]
+                for clip in visible:
+                    span = next((sp for sp in spans if sp[0] is clip and sp[2] == a), None)
+                    if span:
+                        span[2] = b
+                    else:
+                        spans.append([clip, a, b])
+                pieces[-1] = (kind, prev[1], b, spans)
+            else:
+                pieces.append((kind, a, b, [[clip, a, b] for clip in visible]))
+        # Composite bottom layer first, in the generator's track order
+        order = {id(c): i for i, c in enumerate(video_clips)}
+        for _, _, _, spans in pieces:
+            spans.sort(key=lambda sp: (order[id(sp[0])], sp[1]))
+        return pieces
+
+    def _snap(self, t):
+        """Timeline time t moved to the nearest output frame boundary."""
+        return round(t * self.fps) / self.fps
+
+    def _frames(self, a, b):
+        return int(round((b - a) * self.fps))
+
+    def _clip_hash(self, clip):
+        """Content hash of the clip dict, computed once per build. The dict is kept next to its hash,
+        so an id() that is reused within the build can never return another clip's hash."""
+        entry = self._clip_hashes.get(id(clip))
+        if entry is None or entry[0] is not clip:
+            blob = json.dumps(clip, sort_keys=True, default=str).encode('utf-8')
+            entry = (clip, hashlib.sha1(blob).hexdigest())
+            self._clip_hashes[id(clip)] = entry
+        return entry[1]
+
+    def _emit_clip_chain(self, graph, pin, kind, clip, args, make_filters, out_pin=None):
+        """Adds a clip's linear filter run as one chain node fed from pin, reusing the chain of an earlier
+        build when neither the clip nor the arguments it was built from have changed."""
+        key = (kind, clip.get('uid'), self._clip_hash(clip), args)
+        cache = FilterGraphGenerator._fragment_cache
+        with FilterGraphGenerator._fragment_lock:
+            fragment = cache.get(key)
+            if fragment is not None:
+                cache.move_to_end(key)
+        if fragment is None:
+            filters = make_filters()
+            fragment = (filters, FilterChain.format_chain(filters))
+            with FilterGraphGenerator._fragment_lock:
+                cache[key] = fragment
+                if len(cache) > self.FRAGMENT_CACHE_LIMIT:
+                    cache.popitem(last=False)
+            self.fragment_misses += 1
+        else:
+            self.fragment_hits += 1
+        chain = FilterChain(*fragment)
+        chain.input_pins[0] = pin
+        chain.output_pins[0] = out_pin
+        graph.add_node(chain)
+        return chain.output_pins[0]
+
+    @staticmethod
+    def _atempo_chain(speed):
+        """atempo only takes factors between 0.5 and 2.0, so larger changes are chained."""
+        factors = []
+        while speed > 2.0:
+            factors.append(2.0)
+            speed /= 2.0
+        while speed < 0.5:
+            factors.append(0.5)
+            speed /= 0.5
+        factors.append(speed)
+        return [("atempo", f'{f:.4f}') for f in factors if abs(f - 1.0) > 1e-6]
+
+    def _crop_filter(self, clip):
+        x1, y1 = clip.get('crop_x1', 0.0), clip.get('crop_y1', 0.0)
+        x2, y2 = clip.get('crop_x2', 1.0), clip.get('crop_y2', 1.0)
+        if (x1, y1, x2, y2) == (0.0, 0.0, 1.0, 1.0) or x2 <= x1 or y2 <= y1:
+            return []
+        return [("crop", {'w': f'iw*{x2 - x1:.4f}', 'h': f'ih*{y2 - y1:.4f}', 'x': f'iw*{x1:.4f}', 'y': f'ih*{y1:.4f}'})]
+
+    def _clip_filters(self, clip, trim_start, in_offset, length, alpha=False, audio=False, normalize=()):
+        """Source side of a clip chain for the part starting in_offset seconds into the clip and lasting
+        length timeline seconds: trim, speed, rate/format normalization, crop (before any scale, so fewer
+        pixels get scaled), freezes and fades. The output starts at zero and runs on timeline time."""
+        start_freeze = clip.get('start_freeze', 0.0)
+        speed = clip.get('speed', 1.0)
+        playable_end = start_freeze + self._playable(clip)
+        play_from = min(max(in_offset, start_freeze), playable_end)
+        play_to = max(min(in_offset + length, playable_end), play_from)
+        head = max(0.0, min(start_freeze, in_offset + length) - in_offset)
+        tail = max(0.0, in_offset + length - max(in_offset, playable_end))
+        # A stretch that is all freeze still needs the one frame it holds
+        source_len = max((play_to - play_from) * speed, 1.0 / float(clip.get('fps') or 30.0))
+        if audio:
+            filters = [("atrim", {'start': f'{trim_start:.3f}', 'duration': f'{source_len:.3f}'}),
+                       ("asetpts", {'expr': 'PTS-STARTPTS'})]
+            filters += self._atempo_chain(speed)
+            if head > 0:
+                head_ms = int(round(head * 1000))
+                filters.append(("adelay", {'delays': f'{head_ms}|{head_ms}'}))
+        else:
+            expr = 'PTS-STARTPTS' if speed == 1.0 else f'(PTS-STARTPTS)/{speed:.4f}'
+            filters = [("trim", {'start': f'{trim_start:.3f}', 'duration': f'{source_len:.3f}'}),
+                       ("setpts", {'expr': expr})]
+            filters += list(normalize)
+            filters += self._crop_filter(clip)
+            if head > 0 or tail > 0:
+                tpad = {}
+                if head > 0:
+                    tpad.update({'start_mode': 'clone', 'start_duration': f'{head:.3f}'})
+                if tail > 0:
+                    tpad.update({'stop_mode': 'clone', 'stop_duration': f'{tail:.3f}'})
+                filters.append(("tpad", tpad))
+        for fade_type, fade_start, fade_dur in self._fade_windows(clip, in_offset, length):
+            fade_params = {'t': fade_type, 'st': f'{fade_start:.3f}', 'd': f'{fade_dur:.3f}'}
+            if alpha:
+                fade_params['alpha'] = 1
+            filters.append(("afade" if audio else "fade", fade_params))
+        return filters
+
+    def _scale_filters(self, clip, w, h):
+        """Scale step under the active quality profile, or nothing when the profile skips same-size scaling."""
+        profile = QUALITY_PROFILES[self.quality]
+        if profile['skip_same_size']:
+            src_w = round(clip.get('width', 0) * (clip.get('crop_x2', 1.0) - clip.get('crop_x1', 0.0)))
+            src_h = round(clip.get('height', 0) * (clip.get('crop_y2', 1.0) - clip.get('crop_y1', 0.0)))
+            if (src_w, src_h) == (w, h):
+                return []
+        params = {'w': w, 'h': h, 'flags': profile['flags']}
+        if profile['dither']:
+            params['sws_dither'] = profile['dither']
+        return [("scale", params)]
+
+    def _trim_args(self, graph, clip, ref, t0, length):
+        trim_start = max(0.0, self._source_start(clip, t0) - graph.get_input_seek(*ref))
+        return round(trim_start, 3), round(max(0.0, t0 - clip['start']), 3), round(length, 3)
+
+    def _build_single_piece(self, graph, pin, clip, ref, a, b):
+        """A lone full-frame clip needs no base layer: trim, scale to the canvas and start at zero."""
+        trim_start, in_offset, length = self._trim_args(graph, clip, ref, a, b - a)
+        norm = self._inline_norm.get(ref, [])
+        args = (trim_start, in_offset, length, self.w, self.h, FilterChain.format_chain(norm), self.quality)
+        return self._emit_clip_chain(graph, pin, 'single', clip, args, lambda: (
+            self._clip_filters(clip, trim_start, in_offset, length, normalize=norm)
+            + self._scale_filters(clip, self.w, self.h) + [("setsar", "1")]))
+
+    def _build_stack_piece(self, graph, layers, a, b):
+        """Overlay compositing for a stretch where clips really stack, timed relative to the stretch.
+        layers are (clip, t0, t1, input ref, source pin), bottom first."""
+        base_node = FilterNode("color", {'c': 'black', 's': f'{self.w}x{self.h}', 'd': f'{b - a:.3f}', 'r': f'{self.fps:g}'}, num_inputs=0)
+        graph.add_node(base_node)
+        last_v_pin = base_node.output_pins[0]
+        for clip, t0, t1, ref, clip_v_pin in layers:
+            trim_start, in_offset, remaining = self._trim_args(graph, clip, ref, t0, t1 - t0)
+            rel_start = t0 - a
+            pts_offset = rel_start
+            norm = self._inline_norm.get(ref, [])
+            args = (trim_start, in_offset, remaining, pts_offset, self.w, self.h, FilterChain.format_chain(norm), self.quality)
+            layer_pin = self._emit_clip_chain(graph, clip_v_pin, 'layer', clip, args, lambda: (
+                self._clip_filters(clip, trim_start, in_offset, remaining, alpha=True, normalize=norm)
+                + self._scale_filters(clip, int(self.w * clip.get('scale_x', 1.0)), int(self.h * clip.get('scale_y', 1.0)))
+                + [("setpts", {'expr': f'PTS-STARTPTS+{pts_offset:.3f}/TB'})]))
             overlay_node = FilterNode("overlay", {'x': f"((W-w)/2)+({clip.get('pos_x', 0.0)}*W)", 'y': f"((H-h)/2)-({clip.get('pos_y', 0.0)}*H)", 'enable': f'between(t,{rel_start:.3f},{rel_start + remaining:.3f})'}, num_inputs=2)
             overlay_node.input_pins[0] = last_v_pin
-            graph.connect(setpts_node, overlay_node, from_pin_idx=0, to_pin_idx=1)
+            overlay_node.input_pins[1] = layer_pin
             graph.add_node(overlay_node)
             last_v_pin = overlay_node.output_pins[0]
         return last_v_pin
-        
+
+    def _build_video_chain(self, graph, pieces):
+        """Concatenates the window out of pieces so only stretches with stacked clips pay for overlays."""
+        uses = [(self._input_for(clip, t0), clip) for _, _, _, spans in pieces for clip, t0, _ in spans]
+        shared_norm = self._plan_normalization(uses)
+        src_pins = self._source_pins(graph, [ref for ref, _ in uses], 'v', shared_norm)
+        piece_pins = []
+        for kind, a, b, spans in pieces:
+            layers = []
+            for clip, t0, t1 in spans:
+                ref = self._input_for(clip, t0)
+                layers.append((clip, t0, t1, ref, src_pins[ref].pop(0)))
+            piece_pins.append(self._emit_piece(graph, kind, layers, a, b))
+        if len(piece_pins) == 1:
+            return piece_pins[0]
+        piece_pins = [self._pin_piece(graph, pin, a, b) for pin, (_, a, b, _) in zip(piece_pins, pieces)]
+        return self._concat_pieces(graph, piece_pins)
+
+    def _emit_piece(self, graph, kind, layers, a, b):
+        """The picture of one concat piece over [a, b); layers as for _build_stack_piece."""
+        if kind == 'gap':
+            gap_node = FilterNode("color", {'c': 'black', 's': f'{self.w}x{self.h}', 'd': f'{b - a:.3f}', 'r': f'{self.fps:g}'}, num_inputs=0)
+            graph.add_node(gap_node)
+            return gap_node.output_pins[0]
+        if kind == 'single':
+            clip, _, _, ref, pin = layers[0]
+            return self._build_single_piece(graph, pin, clip, ref, a, b)
+        return self._build_stack_piece(graph, layers, a, b)
+
+    def _pin_piece(self, graph, pin, a, b, out_pin=None):
+        # concat places each piece after the previous one by its frame count, so a piece that trim or color
+        # rounds a frame long or short would shift everything after it; each is held to its exact length.
+        # The count is only meaningful at the project rate, and sped-up clips or sources with an unknown
+        # rate reach this point at another one, so every piece is resampled to it first.
+        pin_node = FilterChain([("setpts", {'expr': 'PTS-STARTPTS'}), ("fps", {'fps': f'{self.fps:g}'}),
+                                ("tpad", {'stop_mode': 'clone', 'stop': 1}), ("trim", {'end_frame': self._frames(a, b)})])
+        pin_node.input_pins[0] = pin
+        pin_node.output_pins[0] = out_pin
+        graph.add_node(pin_node)
+        return pin_node.output_pins[0]
+
+    def _concat_pieces(self, graph, piece_pins):
+        concat_node = FilterNode("concat", {'n': len(piece_pins), 'v': 1, 'a': 0}, num_inputs=len(piece_pins))
+        concat_node.input_pins = list(piece_pins)
+        graph.add_node(concat_node)
+        return concat_node.output_pins[0]
+
+    def _audio_filters(self, clip, trim_start, in_offset, remaining):
+        filters = self._clip_filters(clip, trim_start, in_offset, remaining, audio=True)
+        clip_volume = clip.get('volume', 100.0) / 100.0
+        if clip_volume != 1.0:
+            filters.append(("volume", {'volume': f'{clip_volume:.3f}'}))
+        # Short source audio is padded so the clips after it on the bus stay in place
+        filters.append(("apad", {'whole_dur': f'{remaining:.3f}'}))
+        return filters
+
+    def _silence(self, graph, seconds):
+        node = FilterNode("anullsrc", {'channel_layout': 'stereo', 'sample_rate': 44100, 'd': f'{seconds:.3f}'}, num_inputs=0)
+        graph.add_node(node)
+        return node.output_pins[0]
+
     def _build_audio_chain(self, graph, audio_clips, start_time, duration=None):
+        """Mixes one bus per track instead of one amix input per clip: a track's clips are joined
+        back to back with silence in the gaps, so the mix only grows with the number of tracks.
+        Clips that overlap on a track go to an extra bus of that track."""
         if not audio_clips:
             return None
-        audio_src_pins = {}
-        audio_counts = {}
-        for clip in audio_clips:
-            norm_path = clip['path'].replace('\\', '/')
-            audio_counts[norm_path] = audio_counts.get(norm_path, 0) + 1
-        for norm_path, count in audio_counts.items():
-            if count > 1:
-                input_pin = graph.get_input_stream(norm_path, 'a')
-                split_node = FilterNode("asplit", str(count), num_outputs=count)
-                split_node.input_pins[0] = input_pin
-                graph.add_node(split_node)
-                audio_src_pins[norm_path] = split_node.output_pins
-            else:
-                audio_src_pins[norm_path] = [graph.get_input_stream(norm_path, 'a')]
-        processed_audio_pins = []
+        audio_src_pins = self._source_pins(graph, [self._input_for(c, max(start_time, c['start'])) for c in audio_clips], 'a')
+        render_end = start_time + (duration if duration else 99999)
+        buses = OrderedDict()
         for clip in audio_clips:
-            norm_path = clip['path'].replace('\\', '/')
-            if not audio_src_pins.get(norm_path): continue
-            clip_a_pin = audio_src_pins[norm_path].pop(0)
-            source_in = clip.get('source_in', 0.0)
+            ref = self._input_for(clip, max(start_time, clip['start']))
+            if not audio_src_pins.get(ref): continue
+            clip_a_pin = audio_src_pins[ref].pop(0)
             in_offset = max(0.0, start_time - clip['start'])
             clip_duration = clip.get('dur', clip.get('duration',0))
             remaining = clip_duration - in_offset
             clip_end = clip['start'] + clip_duration
-            render_end = start_time + (duration if duration else 99999)
             if clip_end > render_end:
                 remaining = max(0, render_end - max(start_time, clip['start']))
             if remaining <= 0: continue
-            trim_start = source_in + in_offset
-            trim_node = FilterNode("atrim", {'start': f'{trim_start:.3f}', 'duration': f'{remaining:.3f}'})
-            trim_node.input_pins[0] = clip_a_pin
-            graph.add_node(trim_node)
-            setpts_node = FilterNode("asetpts", {'expr': 'PTS-STARTPTS'})
-            graph.connect(trim_node, setpts_node)
-            graph.add_node(setpts_node)
-            delay_ms = int(max(0.0, clip['start'] - start_time) * 1000)
-            last_pin_node = setpts_node
-            if delay_ms > 0:
-                delay_node = FilterNode("adelay", {'delays': f'{delay_ms}|{delay_ms}'})
-                graph.connect(setpts_node, delay_node)
-                graph.add_node(delay_node)
-                last_pin_node = delay_node
-            clip_volume = clip.get('volume', 100.0) / 100.0
-            track_volume = self.vols.get(clip['track'], 100.0) / 100.0
-            total_volume = clip_volume * track_volume
-            fade_in = clip.get('fade_in', 0.0)
-            fade_out = clip.get('fade_out', 0.0)
-            if fade_in > 0 or fade_out > 0:
-                fade_params = {}
-                if fade_in > 0:
-                    fade_params['t'] = 'in'
-                    fade_params['st'] = 0
-                    fade_params['d'] = f'{fade_in:.3f}'
-                if fade_out > 0:
-                    fade_params['t'] = 'out'
-                    fade_params['st'] = f'{remaining - fade_out:.3f}'
-                    fade_params['d'] = f'{fade_out:.3f}'
-                if fade_in > 0 and fade_out > 0:
-                    fade_in_node = FilterNode("afade", {'t': 'in', 'st': '0', 'd': f'{fade_in:.3f}'})
-                    graph.connect(last_pin_node, fade_in_node)
-                    graph.add_node(fade_in_node)
-                    last_pin_node = fade_in_node
-                    fade_out_node = FilterNode("afade", {'t': 'out', 'st': f'{remaining - fade_out:.3f}', 'd': f'{fade_out:.3f}'})
-                    graph.connect(last_pin_node, fade_out_node)
-                    graph.add_node(fade_out_node)
-                    last_pin_node = fade_out_node
-                elif fade_in > 0:
-                    fade_node = FilterNode("afade", {'t': 'in', 'st': '0', 'd': f'{fade_in:.3f}'})
-                    graph.connect(last_pin_node, fade_node)
-                    graph.add_node(fade_node)
-                    last_pin_node = fade_node
-                elif fade_out > 0:
-                    fade_node = FilterNode("afade", {'t': 'out', 'st': f'{remaining - fade_out:.3f}', 'd': f'{fade_out:.3f}'})
-                    graph.connect(last_pin_node, fade_node)
-                    graph.add_node(fade_node)
-                    last_pin_node = fade_node
-            if total_volume != 1.0:
-                volume_node = FilterNode("volume", {'volume': f'{total_volume:.3f}'})
-                graph.connect(last_pin_node, volume_node)
+            clip_pin, remaining = self._emit_audio_clip(graph, clip, ref, clip_a_pin, max(start_time, clip['start']), remaining)
+            rel_start = round(max(0.0, clip['start'] - start_time), 3)
+            lanes = buses.setdefault(clip['track'], [])
+            lane = next((l for l in lanes if l['end'] <= rel_start + 0.001), None)
+            if lane is None:
+                lane = {'end': 0.0, 'pins': []}
+                lanes.append(lane)
+            if rel_start - lane['end'] > 0.001:
+                lane['pins'].append(self._silence(graph, rel_start - lane['end']))
+            lane['pins'].append(clip_pin)
+            lane['end'] = rel_start + remaining
+        return self._mix_buses(graph, OrderedDict((track, [lane['pins'] for lane in lanes]) for track, lanes in buses.items()))
+
+    def _emit_audio_clip(self, graph, clip, ref, pin, t0, length, out_pin=None):
+        """The clip's audio from timeline time t0 on, length seconds of it. Returns (pin, rounded length)."""
+        trim_start, in_offset, remaining = self._trim_args(graph, clip, ref, t0, length)
+        out = self._emit_clip_chain(graph, pin, 'audio', clip, (trim_start, in_offset, remaining),
+                                    lambda: self._audio_filters(clip, trim_start, in_offset, remaining), out_pin)
+        return out, remaining
+
+    def _mix_buses(self, graph, buses):
+        """Joins each lane's pins back to back, applies its track volume and sums the lanes.
+        buses maps track -> list of lanes, each a list of pins."""
+        bus_pins = []
+        for track, lanes in buses.items():
+            track_volume = self.vols.get(track, 100.0) / 100.0
+            for pins in lanes:
+                pin = pins[0]
+                if len(pins) > 1:
+                    concat_node = FilterNode("concat", {'n': len(pins), 'v': 0, 'a': 1}, num_inputs=len(pins))
+                    concat_node.input_pins = list(pins)
+                    graph.add_node(concat_node)
+                    pin = concat_node.output_pins[0]
+                volume_node = FilterNode("volume", {'volume': f'{track_volume:.3f}'})
+                volume_node.input_pins[0] = pin
                 graph.add_node(volume_node)
-                last_pin_node = volume_node
-            processed_audio_pins.append(last_pin_node.output_pins[0])
-        if not processed_audio_pins:
+                bus_pins.append(volume_node.output_pins[0])
+        if not bus_pins:
             return None
-        if len(processed_audio_pins) > 1:
-            mix_node = FilterNode("amix", {'inputs': len(processed_audio_pins), 'duration': 'longest'}, num_inputs=len(processed_audio_pins))
-            for i, pin in enumerate(processed_audio_pins):
-                mix_node.input_pins[i] = pin
-            graph.add_node(mix_node)
-            return mix_node.output_pins[0]
-        else:
-            return processed_audio_pins[0]
+        self.logger.debug(f"[GRAPH] Mixing {len(bus_pins)} audio buses")
+        if len(bus_pins) == 1:
+            return bus_pins[0]
+        # Buses are summed as they are; amix's default normalization would scale them by 1/N
+        mix_node = FilterNode("amix", {'inputs': len(bus_pins), 'duration': 'longest', 'normalize': 0}, num_inputs=len(bus_pins))
+        mix_node.input_pins = list(bus_pins)
+        graph.add_node(mix_node)
+        return mix_node.output_pins[0]
+
+
+class CompiledTimeline:
+    """A timeline compiled by FilterGraphGenerator.compile_timeline, instantiated at any playhead with at()."""
+
+    def __init__(self, gen, graph, last_part, pieces, lanes, shared_norm, end, main_input_used, video, audio):
+        self.gen = gen
+        self.inputs = list(graph.inputs)
+        self.seeks = list(graph.input_seeks)
+        self.quality = gen.quality
+        self.inline_norm = dict(gen._inline_norm)
+        self._graph = graph
+        self._last_part = last_part
+        self.pieces = pieces
+        self.lanes = lanes
+        self.shared_norm = shared_norm
+        self.end = end
+        self.main_input_used = main_input_used
+        self.video = video
+        self.audio = audio
+
+    def at(self, playhead):
+        """(inputs, filter string, video pin, audio pin, main input used, input starts) for playback from
+        playhead. Trims stay relative to the compiled input seeks; starts are where each input can begin
+        decoding, which the player seeks to before rebasing timestamps onto the compiled seek."""
+        gen = self.gen
+        t = gen._snap(max(0.0, playhead))
+        if not self.inputs or t >= self.end:
+            return [], "", "[vo]", "[ao]", False, []
+        gen.quality = self.quality
+        gen._inline_norm = self.inline_norm
+        glue = self._last_part.section()
+        bodies = []
+        # (ref, stream) -> [(placeholder pin, source time it is first read at)]
+        uses = OrderedDict()
+        if self.video:
+            piece_pins = []
+            for k, (kind, a, b, layers, body) in enumerate(self.pieces):
+                if b <= t:
+                    continue
+                if a < t:
+                    # The piece the playhead cuts into is emitted again from the playhead on
+                    layers = [(clip, max(t0, t), t1, ref, pin) for clip, t0, t1, ref, pin in layers if t1 > t]
+                    piece_pins.append(gen._pin_piece(glue, gen._emit_piece(glue, kind, layers, t, b), t, b))
+                else:
+                    bodies.append(body)
+                    piece_pins.append(f"[c{k}]")
+                for clip, t0, _, ref, pin in layers:
+                    uses.setdefault((ref, 'v'), []).append((pin, gen._source_start(clip, t0)))
+            out_node = FilterNode("null")
+            out_node.input_pins[0] = piece_pins[0] if len(piece_pins) == 1 else gen._concat_pieces(glue, piece_pins)
+            out_node.output_pins[0] = "[vo]"
+            glue.add_node(out_node)
+        if self.audio:
+            buses = OrderedDict()
+            for track, track_lanes in self.lanes.items():
+                for lane in track_lanes:
+                    pins = []
+                    cursor = t
+                    for t0, t1, clip, ref, use_pin, out_pin, body in lane:
+                        if t1 <= t:
+                            continue
+                        if t0 - cursor > 0.001:
+                            pins.append(gen._silence(glue, t0 - cursor))
+                        if t0 < t:
+                            out_pin, _ = gen._emit_audio_clip(glue, clip, ref, use_pin, t, t1 - t)
+                        else:
+                            bodies.append(body)
+                        uses.setdefault((ref, 'a'), []).append((use_pin, gen._source_start(clip, max(t0, t))))
+                        pins.append(out_pin)
+                        cursor = t1
+                    if pins:
+                        buses.setdefault(track, []).append(pins)
+            mix_pin = gen._mix_buses(glue, buses)
+            if mix_pin:
+                final_audio_node = FilterNode("aresample", {'sample_rate': 44100})
+                final_audio_node.input_pins[0] = mix_pin
+            else:
+                final_audio_node = FilterNode("anullsrc", {'layout': 'stereo', 'sample_rate': 44100}, num_inputs=0)
+            final_audio_node.output_pins[0] = "[ao]"
+            glue.add_node(final_audio_node)
+        starts = list(self.seeks)
+        first_read = {}
+        for (ref, stream), items in uses.items():
+            gen._split_source(glue, ref, stream, [pin for pin, _ in items], self.shared_norm.get(ref) if stream == 'v' else None)
+            idx = glue.add_input(*ref)
+            first_read[idx] = min([first_read.get(idx, float('inf'))] + [src for _, src in items])
+        for idx, src in first_read.items():
+            starts[idx] = round(src, 3)
+        glue.optimize()
+        bodies.append(glue.to_string())
+        return (list(self.inputs), ";".join(bodies), "[vo]" if self.video else None,
+                "[ao]" if self.audio else None, self.main_input_used, starts)
@@ -1,5 +1,13 @@
-import uuid
+import hashlib
 import logging
+import re
+
+_SHIFT_PTS = re.compile(r"^PTS-STARTPTS(\+[\d.]+/TB)?$")
+# Filters that never change frame size, so a scale after them can be checked against the size before them
+_SIZE_PRESERVING = {'trim', 'fade', 'setpts', 'setsar', 'null', 'format', 'fps', 'tpad', 'select', 'split'}
+# Serialized graphs run to megabytes on long timelines, so DEBUG only logs their size and hash.
+# Switch this on to log every graph in full while debugging the generator.
+LOG_FULL_GRAPH = False
 
 class FilterNode:
     """Represents a single filter in an FFmpeg filter graph."""
@@ -8,25 +16,67 @@ class FilterNode:
         self.name = name
         self.params = params
         self.input_pins = [None] * num_inputs
-        self.output_pins = [f"[{self._generate_pin_id()}]" for _ in range(num_outputs)]
-        
-    def _generate_pin_id(self):
-        return f"stream_{uuid.uuid4().hex[:8]}"
+        # Unlabelled until the node joins a graph, which hands out sequential labels
+        self.output_pins = [None] * num_outputs
+
+    @staticmethod
+    def format_filter(name, params):
+        """Formats a bare 'name=k=v:k=v' filter description."""
+        param_str = ""
+        if params:
+            if isinstance(params, dict):
+                param_str = "=" + ":".join([f"{k}={v}" for k, v in params.items()])
+            elif isinstance(params, str):
+                param_str = f"={params}"
+        return f"{name}{param_str}"
+
+    def body(self):
+        return self.format_filter(self.name, self.params)
+
+    def filter_list(self):
+        return [(self.name, self.params)]
+
+    def write(self, parts):
+        """Appends the node's serialized pieces to parts without building intermediate strings."""
+        for pin in self.input_pins:
+            if pin:
+                parts.append(pin)
+        parts.append(self.body())
+        for pin in self.output_pins:
+            if pin:
+                parts.append(pin)
 
     def __str__(self):
         """Generates the string representation of the filter node."""
-        logger = logging.getLogger("Advanced_Video_Editor")
-        inputs = "".join(str(pin) for pin in self.input_pins if pin)
-        outputs = "".join(self.output_pins)
-        param_str = ""
-        if self.params:
-            if isinstance(self.params, dict):
-                param_str = "=" + ":".join([f"{k}={v}" for k, v in self.params.items()])
-            elif isinstance(self.params, str):
-                param_str = f"={self.params}"
-        result = f"{inputs}{self.name}{param_str}{outputs}"
-        logger.debug(f"[FILTER_NODE] Generated string: {result}")
-        return result
+        parts = []
+        self.write(parts)
+        return "".join(parts)
+
+class FilterChain(FilterNode):
+    """A linear run of filters serialized as one comma-joined chain, with no pins in between.
+    Only the first filter may take several inputs. filters is a sequence of (name, params);
+    body_str may carry the already formatted chain."""
+
+    def __init__(self, filters, body_str=None, num_inputs=1, num_outputs=1):
+        super().__init__("chain", None, num_inputs=num_inputs, num_outputs=num_outputs)
+        self.filters = list(filters)
+        self._body = body_str
+
+    @staticmethod
+    def format_chain(filters):
+        return ",".join(FilterNode.format_filter(name, params) for name, params in filters)
+
+    def body(self):
+        if self._body is None:
+            self._body = self.format_chain(self.filters)
+        return self._body
+
+    def filter_list(self):
+        return self.filters
+
+    def set_filters(self, filters):
+        self.filters = list(filters)
+        self._body = None
 
 class FilterGraph:
     """Manages a collection of FilterNodes and their connections."""
@@ -35,22 +85,48 @@ class FilterGraph:
         self.nodes = []
         self._inputs = []
         self._input_map = {}
+        self._input_seeks = []
+        self._next_pin = 0
 
-    def add_input(self, file_path):
-        """Adds a file as an input source for the graph."""
+    def add_input(self, file_path, key=None):
+        """Adds a file as an input source for the graph.
+        A distinct key opens the same file again as a separate input, with its own seek."""
         norm_path = file_path.replace('\\', '/')
-        if norm_path not in self._input_map:
-            self._input_map[norm_path] = len(self._inputs)
+        key = key or norm_path
+        if key not in self._input_map:
+            self._input_map[key] = len(self._inputs)
             self._inputs.append(norm_path)
-        return self._input_map[norm_path]
+            self._input_seeks.append(0.0)
+        return self._input_map[key]
+
+    def section(self):
+        """Empty graph sharing this graph's inputs and seeks, with pin labels continuing after this graph's.
+        Parts of one graph can be built and optimized on their own and serialized side by side."""
+        part = FilterGraph()
+        part._inputs, part._input_map, part._input_seeks = self._inputs, self._input_map, self._input_seeks
+        part._next_pin = self._next_pin
+        return part
 
-    def get_input_stream(self, file_path, stream_type='v'):
+    def set_input_seek(self, file_path, seconds, key=None):
+        """Sets the position the input is opened at (-ss before -i / movie seek_point)."""
+        self._input_seeks[self.add_input(file_path, key)] = max(0.0, seconds)
+
+    def get_input_seek(self, file_path, key=None):
+        return self._input_seeks[self.add_input(file_path, key)]
+
+    def get_input_stream(self, file_path, stream_type='v', key=None):
         """Gets a pin for a specific input stream (e.g., '[0:v]')."""
-        input_index = self.add_input(file_path)
+        input_index = self.add_input(file_path, key)
         return f"[{input_index}:{stream_type}]"
 
     def add_node(self, node):
-        """Adds a FilterNode to the graph."""
+        """Adds a FilterNode to the graph, labelling its unnamed outputs [p0], [p1], ... in insertion order.
+        Labels only depend on the order nodes are added, so identical timelines serialize identically."""
+        pins = node.output_pins
+        for i, pin in enumerate(pins):
+            if pin is None:
+                pins[i] = f"[p{self._next_pin}]"
+                self._next_pin += 1
         self.nodes.append(node)
         return node
 
@@ -58,16 +134,180 @@ class FilterGraph:
         """Connects the output of one node to the input of another."""
         if from_pin_idx >= len(from_node.output_pins):
             raise ValueError(f"Source node '{from_node.name}' has no output pin at index {from_pin_idx}")
+        if from_node.output_pins[from_pin_idx] is None:
+            raise ValueError(f"Source node '{from_node.name}' must be added to the graph before it is connected")
         if to_pin_idx >= len(to_node.input_pins):
             raise ValueError(f"Target node '{to_node.name}' has no input pin at index {to_pin_idx}")
         to_node.input_pins[to_pin_idx] = from_node.output_pins[from_pin_idx]
 
+    @staticmethod
+    def _param(params, key):
+        if isinstance(params, dict):
+            return str(params.get(key, ''))
+        return str(params or '')
+
+    @staticmethod
+    def _is_internal(pin):
+        return bool(pin) and pin.startswith("[p") and pin[2:-1].isdigit()
+
+    def _is_identity(self, name, params, in_size):
+        """True for filters that pass frames through untouched."""
+        if name in ('null', 'anull'):
+            return True
+        if name in ('split', 'asplit'):
+            return self._param(params, 'outputs') in ('', '1')
+        if name == 'volume':
+            try:
+                return float(self._param(params, 'volume')) == 1.0
+            except ValueError:
+                return False
+        if name == 'scale' and in_size:
+            return (self._param(params, 'w'), self._param(params, 'h')) == tuple(str(v) for v in in_size)
+        return False
+
+    def _simplify_filters(self, filters, in_size):
+        """Drops identity filters and shift-only setpts that the next setpts overrides.
+        Returns the kept filters and the frame size coming out of them, if known."""
+        kept = []
+        size = in_size
+        for name, params in filters:
+            if self._is_identity(name, params, size):
+                continue
+            if kept and name in ('setpts', 'asetpts') and kept[-1][0] == name:
+                if self._param(params, 'expr').startswith("PTS-STARTPTS") and _SHIFT_PTS.match(self._param(kept[-1][1], 'expr')):
+                    kept.pop()
+            if name == 'color':
+                dims = self._param(params, 's').split('x')
+                size = tuple(dims) if len(dims) == 2 and all(d.isdigit() for d in dims) else None
+            elif name == 'scale':
+                dims = (self._param(params, 'w'), self._param(params, 'h'))
+                size = dims if all(d.isdigit() for d in dims) else None
+            elif name not in _SIZE_PRESERVING:
+                size = None
+            kept.append((name, params))
+        return kept, size
+
+    def optimize(self):
+        """Removes redundant work before serialization: pass-through nodes (null, single-output split,
+        unity volume, same-size scale), setpts that a following setpts overrides, and nodes nobody reads.
+        Linear runs are then fused into chains. Returns how many filters were removed."""
+        before = sum(len(node.filter_list()) for node in self.nodes)
+        producers = {pin: node for node in self.nodes for pin in node.output_pins}
+        consumers = {}
+        for node in self.nodes:
+            for idx, pin in enumerate(node.input_pins):
+                if pin:
+                    consumers[pin] = (node, idx)
+        removed = set()
+
+        def bypass(node):
+            src, dst = node.input_pins[0], node.output_pins[0]
+            if dst in consumers:
+                target, idx = consumers.pop(dst)
+                target.input_pins[idx] = src
+                consumers[src] = (target, idx)
+            elif not self._is_internal(dst):
+                # Graph outputs such as [vo] keep their label: the upstream node takes it over
+                producer = producers.get(src)
+                if producer is None or producer in removed:
+                    return False
+                producer.output_pins[producer.output_pins.index(src)] = dst
+                producers[dst] = producers.pop(src)
+                consumers.pop(src, None)
+            else:
+                consumers.pop(src, None)
+            removed.add(node)
+            return True
+
+        def simplify_pass(nodes):
+            """Identity filters, tracking frame sizes along the way so same-size scales can be spotted."""
+            sizes = {}
+            for node in nodes:
+                in_size = sizes.get(node.input_pins[0]) if node.input_pins else None
+                filters, out_size = self._simplify_filters(node.filter_list(), in_size)
+                if node.name == 'overlay' or (node.name == 'concat' and len({sizes.get(p) for p in node.input_pins}) == 1):
+                    out_size = sizes.get(node.input_pins[0])
+                if filters or len(node.input_pins) != 1 or len(node.output_pins) != 1 or not bypass(node):
+                    if filters and len(filters) != len(node.filter_list()):
+                        node.set_filters(filters)
+                    for pin in node.output_pins:
+                        sizes[pin] = out_size
+
+        simplify_pass(self.nodes)
+        # Dead nodes: every output is internal and unread
+        changed = True
+        while changed:
+            changed = False
+            for node in self.nodes:
+                if node in removed or not node.output_pins:
+                    continue
+                if all(self._is_internal(pin) and pin not in consumers for pin in node.output_pins):
+                    removed.add(node)
+                    for pin in node.input_pins:
+                        if consumers.get(pin, (None,))[0] is node:
+                            del consumers[pin]
+                    changed = True
+        # Fuse single-consumer links into comma-joined chains
+        fused = []
+        emitted = set()
+        absorbed = set()
+        for node in self.nodes:
+            if node in removed or node in absorbed:
+                continue
+            emitted.add(node)
+            while len(node.output_pins) == 1 and self._is_internal(node.output_pins[0]):
+                nxt = consumers.get(node.output_pins[0], (None,))[0]
+                if nxt is None or nxt in removed or nxt in emitted or len(nxt.input_pins) != 1:
+                    break
+                chain = FilterChain(node.filter_list() + nxt.filter_list(), f"{node.body()},{nxt.body()}",
+                                    num_inputs=len(node.input_pins), num_outputs=len(nxt.output_pins))
+                chain.input_pins = list(node.input_pins)
+                chain.output_pins = list(nxt.output_pins)
+                for idx, pin in enumerate(chain.input_pins):
+                    if consumers.get(pin, (None,))[0] is node:
+                        consumers[pin] = (chain, idx)
+                for pin in chain.output_pins:
+                    producers[pin] = chain
+                absorbed.add(nxt)
+                node = chain
+            fused.append(node)
+        self.nodes = fused
+        # Fusing can make setpts filters from neighbouring nodes adjacent
+        simplify_pass(self.nodes)
+        self.nodes = [node for node in self.nodes if node not in removed]
+        return before - sum(len(node.filter_list()) for node in self.nodes)
+
     def to_string(self):
-        """Serializes the entire graph into a single string for FFmpeg."""
+        """Serializes the entire graph into a single string for FFmpeg in one pass."""
+        parts = []
+        for node in self.nodes:
+            if parts:
+                parts.append(";")
+            node.write(parts)
+        full_graph_str = "".join(parts)
         logger = logging.getLogger("Advanced_Video_Editor")
-        full_graph_str = ";".join(str(node) for node in self.nodes)
-        logger.debug(f"[FILTER_GRAPH] Full serialized graph: {full_graph_str}")
+        if logger.isEnabledFor(logging.DEBUG):
+            if LOG_FULL_GRAPH:
+                logger.debug(f"[FILTER_GRAPH] Full serialized graph: {full_graph_str}")
+            else:
+                digest = hashlib.sha1(full_graph_str.encode('utf-8')).hexdigest()[:10]
+                logger.debug(f"[FILTER_GRAPH] Serialized graph: {len(self.nodes)} chains, {len(full_graph_str)} chars, sha1 {digest}")
         return full_graph_str
+
+    def write_script(self, stream):
+        """Streams the graph to a file object one filter chain per line, for -filter_complex_script."""
+        first = True
+        for node in self.nodes:
+            parts = [] if first else [";\n"]
+            node.write(parts)
+            stream.write("".join(parts))
+            first = False
+        stream.write("\n")
+
     @property
     def inputs(self):
-        return self._inputs
\ No newline at end of file
+        return self._inputs
+
+    @property
+    def input_seeks(self):
+        return self._input_seeks
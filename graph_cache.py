@@ -0,0 +1,60 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+
+class CompiledGraphCache:
+    """LRU cache of compiled timelines, keyed by a hash of everything FilterGraphGenerator.compile_timeline reads.
+    The playhead is not part of the key: it is applied when a compiled timeline is instantiated, so play,
+    pause and seek reuse the compiled graph as long as the timeline itself is unchanged."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self.logger = logging.getLogger("Advanced_Video_Editor")
+
+    @staticmethod
+    def make_key(clips, width, height, volumes, mutes, is_export, quality=None, video=True, audio=True):
+        """Stable content hash: clip order and dict ordering do not change the key."""
+        state = sorted(clips, key=lambda c: (c.get('track', 0), c.get('start', 0), str(c.get('uid', ''))))
+        payload = {
+            'clips': state,
+            'canvas': [width, height],
+            'volumes': {str(k): v for k, v in (volumes or {}).items()},
+            'mutes': {str(k): v for k, v in (mutes or {}).items()},
+            'mode': 'export' if is_export else 'preview',
+            'quality': quality,
+            'streams': [bool(video), bool(audio)],
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+    def get_or_build(self, gen, start_time=0.0, is_export=False, quality=None, video=True, audio=True):
+        """Returns the graph for playback from start_time in gen.build's (inputs, filter, video pin, audio pin,
+        main input used) form, compiling the timeline only when no identical one is cached.
+        Sets gen.input_seeks (what trims are relative to) and gen.input_starts (where inputs begin decoding)."""
+        key = self.make_key(gen.clips, gen.w, gen.h, gen.vols, gen.mutes, is_export, quality, video, audio)
+        compiled = self._entries.get(key)
+        if compiled is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.logger.debug(f"[GRAPH-CACHE] Hit {key[:10]} ({self.hits} hits / {self.misses} misses)")
+        else:
+            self.misses += 1
+            compiled = gen.compile_timeline(is_export=is_export, quality=quality, video=video, audio=audio)
+            self._entries[key] = compiled
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.logger.debug(f"[GRAPH-CACHE] Miss {key[:10]} ({self.hits} hits / {self.misses} misses)")
+        *result, starts = compiled.at(start_time)
+        gen.input_seeks = list(compiled.seeks) if result[0] else []
+        gen.input_starts = starts
+        return tuple(result)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
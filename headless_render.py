@@ -0,0 +1,118 @@
+"""
+Headless export: renders a saved project without the editor window.
+
+    python -m advanced_video_editor render <project_dir> --out final.mp4 [--res "Landscape 1920x1080 (HD)"]
+    python headless_render.py <project_dir> --out final.mp4 --quality draft --cpu
+    python -m advanced_video_editor calibrate
+
+
+Progress is printed to stdout, one line per ffmpeg progress report. Exit code 0 on success.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+from PyQt5.QtCore import QCoreApplication
+from binary_manager import BinaryManager
+from model import ClipModel
+from project import ProjectManager
+from render_worker import RenderWorker
+from ffmpeg_generator import QUALITY_PROFILES
+from system import ConfigManager
+
+RESOLUTIONS = [
+    "Landscape 1920x1080 (HD)", "Landscape 2560x1440 (QHD)", "Landscape 3840x2160 (4K)",
+    "Portrait 1080x1920 (Mobile HD)", "Portrait 1440x2560 (Mobile QHD)",
+]
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="advanced_video_editor render", description="Export a project without the editor UI.")
+    parser.add_argument("project_dir", help="Project directory containing project.json")
+    parser.add_argument("--out", required=True, help="Output video file")
+    parser.add_argument("--res", default=None, help="Resolution mode; defaults to the one saved with the project")
+    parser.add_argument("--quality", default='final', choices=sorted(QUALITY_PROFILES), help="Scaling quality profile")
+    parser.add_argument("--segmented", action="store_true", help="Render in parallel fragments and join them")
+    parser.add_argument("--incremental", action="store_true", help="Reuse segments from earlier exports that did not change")
+    parser.add_argument("--smart", action="store_true", help="Stream-copy untouched source footage instead of re-encoding it")
+    parser.add_argument("--jobs", type=int, default=None, help="Fragment processes for --segmented")
+    parser.add_argument("--cpu", action="store_true", help="Encode with libx264 even if a hardware encoder is present")
+    return parser
+
+def load_timeline(project_dir, base_dir):
+    """Returns (clips, ui_state) from the project's newest save, with ClipModel defaults filled in."""
+    data = ProjectManager(base_dir).load_project_from_dir(os.path.abspath(project_dir))
+    if data is None:
+        raise FileNotFoundError(f"No readable project.json in {project_dir}")
+    clips = [{**ClipModel.from_dict(c).to_dict(), **c} for c in data.get('timeline', [])]
+    return clips, data.get('ui_state', {})
+
+def format_progress(stats):
+    eta = stats.get('eta')
+    eta_text = "--:--" if eta is None else f"{int(eta // 60):02}:{int(eta % 60):02}"
+    return f"{stats['percent']:3d}% | {stats.get('fps', 0.0):6.1f} fps | {stats.get('speed', 0.0):5.2f}x | ETA {eta_text}"
+
+def main(argv=None, base_dir=None):
+    args = build_parser().parse_args(argv)
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    logger = logging.getLogger("Advanced_Video_Editor")
+    # QProcess needs a core application object, but no display and no running event loop
+    app = QCoreApplication.instance() or QCoreApplication([])
+    BinaryManager(ConfigManager(os.path.join(base_dir, "config", "Advanced_Video_Editor.conf"))).ensure_env()
+    if args.cpu:
+        BinaryManager._cached_encoder = 'libx264'
+        BinaryManager._cpu_only = True
+    try:
+        clips, ui_state = load_timeline(args.project_dir, base_dir)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if not clips:
+        print("error: project timeline is empty", file=sys.stderr)
+        return 2
+    res_mode = args.res or ui_state.get('resolution', RESOLUTIONS[0])
+    track_vols = {int(k): v for k, v in ui_state.get('track_volumes', {}).items()}
+    track_mutes = {int(k): v for k, v in ui_state.get('track_mutes', {}).items()}
+    worker = RenderWorker(clips, os.path.abspath(args.out), res_mode, track_vols, track_mutes, {},
+                          segmented=args.segmented, max_parallel=args.jobs, quality=args.quality,
+                          cache_dir=os.path.join(os.path.abspath(args.project_dir), "cache"),
+                          incremental=args.incremental, smart=args.smart)
+    outcome = {}
+    worker.stats.connect(lambda stats: print(format_progress(stats), flush=True))
+    worker.finished.connect(lambda: outcome.setdefault('ok', True))
+    worker.error.connect(lambda err: outcome.setdefault('error', err))
+    print(f"Rendering {len(clips)} clips -> {args.out} ({res_mode}, {args.quality})", flush=True)
+    logger.info(f"[HEADLESS] Rendering {args.project_dir} -> {args.out}")
+    # run() directly: the render happens on this thread, signals are delivered synchronously
+    worker.run()
+    if 'error' in outcome:
+        print(f"error: {outcome['error']}", file=sys.stderr)
+        return 1
+    print("Done.", flush=True)
+    return 0
+
+def calibrate_main(argv=None, base_dir=None):
+    """Benchmarks every available encoder and preset once; exports and proxies use the results from then on."""
+    parser = argparse.ArgumentParser(prog="advanced_video_editor calibrate", description="Measure encoder speed and quality.")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Length of the test clip")
+    parser.add_argument("--size", default="1280x720", help="Frame size of the test clip")
+    args = parser.parse_args(argv)
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    BinaryManager(ConfigManager(os.path.join(base_dir, "config", "Advanced_Video_Editor.conf"))).ensure_env()
+    try:
+        data = BinaryManager.calibrate(duration=args.seconds, size=args.size, on_result=lambda r: print(
+            f"{r['encoder']:>11} {r['preset']:<10} {r['fps']:8.1f} fps {r['bytes'] / 1024:9.0f} KiB  SSIM {r['ssim']:.4f}", flush=True))
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    if not data['results']:
+        print("error: no encoder could be benchmarked", file=sys.stderr)
+        return 1
+    for purpose in ('export', 'proxy'):
+        setting = BinaryManager.get_encoder_setting(purpose)
+        print(f"{purpose}: {setting['encoder']} {setting['preset']}" if setting else f"{purpose}: no setting meets the target")
+    print(f"Saved to {BinaryManager.calibration_path()}", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
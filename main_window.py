@@ -5,7 +5,7 @@ import json
 import subprocess
 from PyQt5.QtWidgets import (QMainWindow, QDockWidget, QAction, QToolButton, QMenu, 
                             QWidget, QSizePolicy, QPushButton, QLabel, QMessageBox, 
-                            QActionGroup, QDesktopWidget, QSplitter, QListWidgetItem, QStyle, QApplication, QDialog,
+                            QActionGroup, QDesktopWidget, QSplitter, QListWidgetItem, QStyle, QApplication,
                             QProgressBar, QComboBox)
 
 from PyQt5.QtGui import QIcon, QColor, QKeySequence, QPixmap
@@ -16,7 +16,7 @@ from asset_loader import AssetLoader
 from binary_manager import BinaryManager
 from system import ConfigManager
 from project import ProjectManager
-from playback_manager import PlaybackManager
+from playback_manager import PlaybackManager, PREVIEW_SCALES
 from history import UndoStack
 from recorder import VoiceoverRecorder
 from player import MPVPlayer
@@ -28,7 +28,8 @@ from export_dialog import ExportDialog
 from shortcuts_dialog import ShortcutsDialog
 from clip_item import ClipItem
 import constants
-from render_worker import RenderWorker
+from render_queue import RenderQueue
+from render_queue_dialog import RenderQueueDialog
 
 class MainWindow(QMainWindow):
     def __init__(self, base_dir, binary_manager, file_to_load=None):
@@ -48,6 +49,9 @@ class MainWindow(QMainWindow):
         self.track_volumes = {}
         self.track_mutes = {}
         self.audio_analysis_results = {}
+        self.render_queue = RenderQueue(os.path.join(base_dir, "config", "render_queue.json"),
+                                        cpu_slots=self.config.get("render_cpu_slots"),
+                                        encoder_slots=self.config.get("render_encoder_slots"), parent=self)
         self.player_node = MPVPlayer(binary_manager=self.binary_manager)
         self.recorder = VoiceoverRecorder()
         self.recorder.recording_started.connect(self.on_recording_started)
@@ -151,6 +155,9 @@ class MainWindow(QMainWindow):
     def finalize_setup(self):
         self.preview.set_player(self.player_node)
         self.playback = PlaybackManager(self, self.player_node, self.timeline, self.inspector)
+        self.playback.set_preview_scale(self.toolbar_preview_combo.currentText())
+        # Jobs restored from the last session pick up where the queue left off
+        self.render_queue.schedule()
         self.playback.playhead_updated.connect(self.timeline.set_visual_time)
         self.timeline.time_updated.connect(self.playback.seek_and_sync)
         self.playback.state_changed.connect(self.preview.update_play_pause_button)
@@ -227,6 +234,11 @@ class MainWindow(QMainWindow):
         self.logger.info(f"Project switched to {res_text} ({w}x{h})")
         self.is_dirty = True
 
+    def on_preview_scale_switched(self, mode):
+        self.playback.set_preview_scale(mode)
+        self.config.set("preview_scale", mode)
+        self.logger.info(f"Preview resolution set to {mode}")
+
     def setup_toolbar(self):
         tb = self.addToolBar("Main")
         tb.setObjectName("MainToolbar")
@@ -329,6 +341,11 @@ class MainWindow(QMainWindow):
         btn_export.setFixedHeight(35)
         btn_export.setStyleSheet(f"background-color: {constants.COLOR_SUCCESS.name()}; color: white; font-weight: bold; border-radius: 3px; padding: 4px; margin-right: 10px; font-size: 11px;")
         tb.addWidget(btn_export)
+        btn_queue = QPushButton("Render Queue")
+        btn_queue.setCursor(Qt.PointingHandCursor)
+        btn_queue.setToolTip("Show queued exports")
+        btn_queue.clicked.connect(self.open_render_queue)
+        tb.addWidget(btn_queue)
         # Export Resolution Combo Box
         self.toolbar_res_combo = QComboBox()
         self.toolbar_res_combo.addItems([
@@ -342,6 +359,15 @@ class MainWindow(QMainWindow):
         self.toolbar_res_combo.setCursor(Qt.PointingHandCursor)
         self.toolbar_res_combo.currentTextChanged.connect(self.on_resolution_switched)
         tb.addWidget(self.toolbar_res_combo)
+        self.toolbar_preview_combo = QComboBox()
+        self.toolbar_preview_combo.addItems(PREVIEW_SCALES)
+        self.toolbar_preview_combo.setToolTip("Preview Resolution (export always renders at full resolution)")
+        self.toolbar_preview_combo.setFixedWidth(80)
+        self.toolbar_preview_combo.setFixedHeight(35)
+        self.toolbar_preview_combo.setCursor(Qt.PointingHandCursor)
+        self.toolbar_preview_combo.setCurrentText(self.config.get("preview_scale", "Full") or "Full")
+        self.toolbar_preview_combo.currentTextChanged.connect(self.on_preview_scale_switched)
+        tb.addWidget(self.toolbar_preview_combo)
         shortcuts_action = QAction("⌨ Shortcuts", self)
         shortcuts_action.setToolTip("View keyboard command reference")
         shortcuts_action.triggered.connect(self.show_shortcuts)
@@ -541,17 +567,14 @@ class MainWindow(QMainWindow):
 
     def open_export(self):
         """Goal 21: High-fidelity render handoff."""
+        cache_dir = os.path.join(self.pm.current_project_dir, "cache") if self.pm.current_project_dir else None
         dlg = ExportDialog(self.timeline.get_state(), self.track_volumes, self.track_mutes, 
-                            self.toolbar_res_combo.currentText(), self.audio_analysis_results, self)
-        if dlg.exec_() == QDialog.Accepted:
-            self.render_worker = RenderWorker(
-                self.timeline.get_state(), dlg.output_path, dlg.resolution_mode,
-                self.track_volumes, self.track_mutes, self.audio_analysis_results
-            )
-            self.render_worker.progress.connect(lambda p: self.statusBar().showMessage(f"RENDERING FORNITE MONTAGE: {p}%"))
-            self.render_worker.finished.connect(lambda: QMessageBox.information(self, "Success", "Export Finished!"))
-            self.render_worker.error.connect(lambda e: QMessageBox.critical(self, "Export Error", e))
-            self.render_worker.start()
+                            self.toolbar_res_combo.currentText(), self.audio_analysis_results, self, cache_dir=cache_dir,
+                            render_queue=self.render_queue)
+        dlg.exec_()
+
+    def open_render_queue(self):
+        RenderQueueDialog(self.render_queue, self).exec_()
 
     def show_shortcuts(self):
         dlg = ShortcutsDialog(self)
@@ -596,6 +619,7 @@ class MainWindow(QMainWindow):
         self.preview.overlay.set_selected_clip(models[0] if models else None)
 
     def closeEvent(self, e):
+        self.render_queue.shutdown()
         self.asset_loader.cleanup()
         self.player_node.cleanup()
         pool_assets = []
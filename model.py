@@ -18,6 +18,13 @@ class ClipModel:
     width: int = 1920
     height: int = 1080
     bitrate: int = 0
+    fps: float = 0.0
+    pix_fmt: str = ""
+    video_codec: str = ""
+    video_profile: str = ""
+    video_level: int = 0
+    sar: str = ""
+    time_base: str = ""
     crop_x1: float = 0.0
     crop_y1: float = 0.0
     crop_x2: float = 1.0
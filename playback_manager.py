@@ -2,6 +2,27 @@ import logging
 import os
 from PyQt5.QtCore import QObject, QTimer, pyqtSignal
 from ffmpeg_generator import FilterGraphGenerator
+from graph_cache import CompiledGraphCache
+
+PREVIEW_SCALES = ["Full", "1/2", "1/4", "Auto"]
+
+def preview_divisor(mode, canvas_w, canvas_h, view_w=0, view_h=0):
+    """How much the preview canvas is shrunk. Auto picks the smallest canvas that still covers the view."""
+    if mode == "1/2":
+        return 2
+    if mode == "1/4":
+        return 4
+    if mode == "Auto" and view_w > 0 and view_h > 0:
+        for divisor in (4, 2):
+            if canvas_w / divisor >= view_w and canvas_h / divisor >= view_h:
+                return divisor
+    return 1
+
+def reduced_canvas(canvas_w, canvas_h, divisor):
+    """Even-sized canvas 1/divisor of the project canvas, as the encoders and yuv420p require."""
+    if divisor <= 1:
+        return canvas_w, canvas_h
+    return max(2, int(canvas_w / divisor) // 2 * 2), max(2, int(canvas_h / divisor) // 2 * 2)
 
 class PlaybackManager(QObject):
     playhead_updated = pyqtSignal(float)
@@ -18,6 +39,7 @@ class PlaybackManager(QObject):
         self.start_offset = 0.0
         self.canvas_width = 1920
         self.canvas_height = 1080
+        self.preview_scale = "Full"
         self.loop_enabled = False
         self.loop_in = 0.0
         self.loop_out = 0.0
@@ -29,6 +51,7 @@ class PlaybackManager(QObject):
         self._seek_timer.timeout.connect(self._execute_seek)
         self._seeking = False
         self._pending_seek_time = 0.0
+        self.graph_cache = CompiledGraphCache()
 
     def set_resolution(self, w, h):
         """Updates the internal canvas size for the renderer."""
@@ -37,6 +60,24 @@ class PlaybackManager(QObject):
             self.canvas_height = h
             self.mark_dirty(serious=True)
 
+    def set_preview_scale(self, mode):
+        """Preview compositing resolution: Full, 1/2, 1/4 or Auto (follows the preview widget size)."""
+        if mode in PREVIEW_SCALES and mode != self.preview_scale:
+            self.preview_scale = mode
+            self.mark_dirty(serious=True)
+
+    def preview_canvas(self):
+        """Canvas the preview graph composites at. Export always uses the full project canvas."""
+        view_w = view_h = 0
+        if self.preview_scale == "Auto":
+            try:
+                ratio = self.player.devicePixelRatioF()
+                view_w, view_h = int(self.player.width() * ratio), int(self.player.height() * ratio)
+            except Exception:
+                pass
+        divisor = preview_divisor(self.preview_scale, self.canvas_width, self.canvas_height, view_w, view_h)
+        return reduced_canvas(self.canvas_width, self.canvas_height, divisor)
+
     def mark_dirty(self, serious=True):
         """Only force a full rebuild for structural timeline changes."""
         if serious:
@@ -105,6 +146,12 @@ class PlaybackManager(QObject):
                 except:
                     pass
 
+    def _graph_script_dir(self):
+        """Project cache folder for filter scripts too large to inline."""
+        pm = getattr(self.mw, 'pm', None)
+        proj_dir = getattr(pm, 'current_project_dir', None)
+        return os.path.join(proj_dir, "cache", "graphs") if proj_dir else None
+
     def _rebuild_and_play(self, proxy_enabled, track_vols, track_mutes, start_time=None, play_now=True):
         """Rebuilds the FFmpeg filter graph and sends it to the player."""
         self.logger.debug("Rebuilding filter graph for playback...")
@@ -120,23 +167,25 @@ class PlaybackManager(QObject):
             for clip in state:
                 if clip.get('proxy_path') and os.path.exists(clip['proxy_path']):
                     clip['path'] = clip['proxy_path']
+        preview_w, preview_h = self.preview_canvas()
+        if (preview_w, preview_h) != (self.canvas_width, self.canvas_height):
+            self.logger.debug(f"[PLAYBACK] Compositing preview at {preview_w}x{preview_h}")
         gen = FilterGraphGenerator(
             state,
-            width=self.canvas_width,
-            height=self.canvas_height,
+            width=preview_w,
+            height=preview_h,
             volumes=track_vols,
             mutes=track_mutes,
             audio_analysis=self.mw.audio_analysis_results
         )
-        timeline_end = self.timeline.get_content_end()
-        playback_duration = max(0.1, timeline_end - current_time) if timeline_end > current_time else 10.0
-        inputs, complex_filter, v_pad, a_pad, main_input_used = gen.build(
+        inputs, complex_filter, v_pad, a_pad, main_input_used = self.graph_cache.get_or_build(
+            gen,
             start_time=current_time,
-            duration=playback_duration,
-            is_export=False
+            is_export=False,
+            quality='draft' if is_scrubbing else 'preview'
         )
         if is_scrubbing:
-            complex_filter = complex_filter.replace("null[vo]", "select=not(mod(n\\,5)),setpts=N/FRAME_RATE/TB[vo]")
+            complex_filter = complex_filter.replace("[vo]", ",select=not(mod(n\\,5)),setpts=N/FRAME_RATE/TB[vo]")
         self.logger.info(f"[PLAYBACK] lavfi supported? {self.player.lavfi_supported()}")
         self.logger.info(f"[PLAYBACK] complex_filter length: {len(complex_filter)}")
         if not self.player.lavfi_supported():
@@ -291,7 +340,8 @@ class PlaybackManager(QObject):
                 self.is_dirty = False
                 return
         try:
-            self.player.play_filter_graph(complex_filter, inputs, main_input_used)
+            self.player.play_filter_graph(complex_filter, inputs, main_input_used, gen.input_seeks, self._graph_script_dir(),
+                                         starts=gen.input_starts)
             if play_now:
                 self.player.play()
                 self.timer.start()
@@ -15,6 +15,7 @@ import mpv
 from PyQt5.QtWidgets import QWidget
 from PyQt5.QtCore import Qt
 from binary_manager import BinaryManager
+from ffmpeg_generator import FILTER_SCRIPT_THRESHOLD
 
 class MPVPlayer(QWidget):
     def __init__(self, parent=None, binary_manager=None):
@@ -242,7 +243,10 @@ class MPVPlayer(QWidget):
             self._playing = False
             return 0.0
 
-    def play_filter_graph(self, filter_str: str, inputs: list, main_input_used_for_video: bool):
+    def play_filter_graph(self, filter_str: str, inputs: list, main_input_used_for_video: bool, seeks: list = None, script_dir: str = None,
+                          starts: list = None):
+        """starts, where given, is where each input begins decoding; timestamps are still rebased onto seeks,
+        which the graph's trims are relative to."""
         if not self.mpv:
             self.logger.error("MPV not initialized, cannot play filter graph.")
             return
@@ -268,16 +272,36 @@ class MPVPlayer(QWidget):
             pad_name = f"src_{idx}_{stream_type}"
             if pad_name not in created_pads:
                 filter_name = "movie" if stream_type == 'v' else "amovie"
-                source_defs.append(f"{filter_name}='{path}':loop=0[{pad_name}]")
+                seek = seeks[idx] if seeks and idx < len(seeks) else 0.0
+                start = starts[idx] if starts and idx < len(starts) else seek
+                if start > 0 or seek > 0:
+                    # movie keeps source timestamps after seeking; rebase them so trims stay relative to the seek point
+                    rebase = "setpts" if stream_type == 'v' else "asetpts"
+                    source_defs.append(f"{filter_name}='{path}':loop=0:seek_point={start:.3f},{rebase}=PTS-{seek:.3f}/TB[{pad_name}]")
+                else:
+                    source_defs.append(f"{filter_name}='{path}':loop=0[{pad_name}]")
                 created_pads.add(pad_name)
             return f"[{pad_name}]"
         try:
             self.mpv.pause = True
             self._playing = False
+            # Crop is compiled into the graph; a crop left over from single-clip playback would apply twice
+            self.mpv.vf = ""
             final_graph = re.sub(r"\[(\d+):([va])\]", input_replacer, graph)
             full_command = f"{';'.join(source_defs)};{final_graph}"
-            self.logger.info(f"[MPV] Loading self-contained graph via lavfi://")
-            self.mpv.command("loadfile", f"lavfi://[{full_command}]", "replace")
+            if script_dir and len(full_command) > FILTER_SCRIPT_THRESHOLD:
+                # Large graphs are read by the lavfi device from a file instead of being packed into the URL
+                os.makedirs(script_dir, exist_ok=True)
+                script_path = os.path.join(script_dir, "preview.ffgraph")
+                with open(script_path, 'w', encoding='utf-8') as f:
+                    f.write(full_command)
+                self.logger.info(f"[MPV] Loading graph from script file ({len(full_command)} chars)")
+                self.mpv.command("change-list", "demuxer-lavf-o", "append", f"graph_file={script_path}")
+                self.mpv.command("loadfile", "av://lavfi:nullsrc", "replace")
+            else:
+                self.mpv.command("change-list", "demuxer-lavf-o", "remove", "graph_file")
+                self.logger.info(f"[MPV] Loading self-contained graph via lavfi://")
+                self.mpv.command("loadfile", f"lavfi://[{full_command}]", "replace")
             self.mpv.pause = False
             self._playing = True
             self.logger.info("Playback of filter graph initiated.")
@@ -8,6 +8,7 @@ import shutil
 import hashlib
 from PyQt5.QtCore import QRunnable, QObject, pyqtSignal, QThread
 import queue
+from thread_budget import budget
 
 class ProbeSignals(QObject):
     result = pyqtSignal(dict)
@@ -110,6 +111,13 @@ class ProbeWorker(QRunnable):
                 'bitrate': get_val(fmt, 'bit_rate', int, 0),
                 'width': 0,
                 'height': 0,
+                'fps': 0.0,
+                'pix_fmt': '',
+                'video_codec': '',
+                'video_profile': '',
+                'video_level': 0,
+                'sar': '',
+                'time_base': '',
                 'has_audio': False,
                 'has_video': False
             }
@@ -120,6 +128,19 @@ class ProbeWorker(QRunnable):
                     h = get_val(s, 'height', int, 0)
                     if w > 0: phys_data['width'] = w
                     if h > 0: phys_data['height'] = h
+                    rate = s.get('avg_frame_rate') or s.get('r_frame_rate') or '0/0'
+                    num, _, den = rate.partition('/')
+                    try:
+                        phys_data['fps'] = round(float(num) / float(den or 1), 3)
+                    except (ValueError, ZeroDivisionError):
+                        pass
+                    phys_data['pix_fmt'] = s.get('pix_fmt', '')
+                    phys_data['video_codec'] = s.get('codec_name', '')
+                    # Stream parameters a stream copy has to share with the re-encoded parts around it
+                    phys_data['video_profile'] = s.get('profile', '')
+                    phys_data['video_level'] = get_val(s, 'level', int, 0)
+                    phys_data['sar'] = s.get('sample_aspect_ratio', '')
+                    phys_data['time_base'] = s.get('time_base', '')
                 elif s.get('codec_type') == 'audio':
                     phys_data['has_audio'] = True
             if cache_file:
@@ -231,7 +252,8 @@ class WaveformWorker(QThread):
                 ]
                 si = subprocess.STARTUPINFO()
                 si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                subprocess.run(cmd, capture_output=True, text=True, startupinfo=si, check=True, encoding='utf-8')
+                with budget.acquire('waveform') as lease:
+                    subprocess.run(lease.apply(cmd), capture_output=True, text=True, startupinfo=si, check=True, encoding='utf-8')
                 self.finished.emit(uid, out)
                 self.queue.task_done()
             except Exception as e:
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field, fields, asdict
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# Consumer NVENC drivers refuse more concurrent encode sessions than this
+GPU_ENCODER_SESSIONS = 3
+# How long shutdown waits for each cancelled render thread to wind down
+SHUTDOWN_WAIT_MS = 5000
+# Note on jobs that were still rendering when the editor closed; they wait paused until resumed
+INTERRUPTED_NOTE = "Interrupted when the editor closed"
+
+@dataclass
+class RenderJob:
+    """One queued export: a frozen timeline snapshot plus everything RenderWorker needs to render it."""
+    output_path: str
+    clips: list
+    resolution_mode: str = "1920x1080"
+    quality: str = 'final'
+    track_vols: dict = field(default_factory=dict)
+    track_mutes: dict = field(default_factory=dict)
+    audio_analysis: dict = field(default_factory=dict)
+    segmented: bool = False
+    incremental: bool = False
+    smart: bool = False
+    extra_targets: list = field(default_factory=list)
+    cache_dir: str = ""
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = 'queued'
+    progress: int = 0
+    error: str = ""
+    created: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_dict(cls, data):
+        valid_keys = {f.name for f in fields(cls)}
+        job = cls(**{k: v for k, v in data.items() if k in valid_keys})
+        # JSON turns the integer track keys into strings
+        job.track_vols = {int(k): v for k, v in job.track_vols.items()}
+        job.track_mutes = {int(k): v for k, v in job.track_mutes.items()}
+        return job
+
+    def to_dict(self):
+        return asdict(self)
+
+    @property
+    def name(self):
+        return os.path.basename(self.output_path)
+
+class RenderQueue(QObject):
+    """Runs export jobs one after another, or side by side as far as the CPU and encoder budgets allow.
+    A job costs one CPU slot (its fragment pool for segmented jobs) and one encoder slot when the
+    hardware encoder is used. The queue is written to disk on every change; jobs that were running
+    when the editor closed come back paused on the next launch, so nothing starts rendering unasked,
+    and once resumed segmented ones continue from their last finished fragment."""
+    job_changed = pyqtSignal(str)
+    job_stats = pyqtSignal(str, dict)
+    queue_changed = pyqtSignal()
+
+    STATUSES = ('queued', 'running', 'paused', 'done', 'failed', 'cancelled')
+
+    def __init__(self, path, cpu_slots=None, encoder_slots=None, worker_factory=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.cpu_slots = cpu_slots or max(1, (os.cpu_count() or 2) // 2)
+        self.encoder_slots = encoder_slots
+        self.worker_factory = worker_factory or self._make_worker
+        self.logger = logging.getLogger("Advanced_Video_Editor")
+        self.jobs = []
+        self.dispatching = True
+        self._workers = {}
+        self._costs = {}
+        # Workers that reported back but whose threads may still be unwinding; dropping them early destroys a running QThread
+        self._retired = []
+        self.load()
+
+    # ---------- persistence ----------
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"[QUEUE] Could not read render queue {self.path}: {e}")
+            return
+        self.dispatching = data.get('dispatching', True)
+        self.jobs = [RenderJob.from_dict(d) for d in data.get('jobs', [])]
+        for job in self.jobs:
+            if job.status == 'running':
+                job.status, job.progress, job.error = 'paused', 0, INTERRUPTED_NOTE
+        self.logger.info(f"[QUEUE] Restored {len(self.jobs)} render jobs")
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'dispatching': self.dispatching, 'jobs': [job.to_dict() for job in self.jobs]}, f, indent=4)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"[QUEUE] Could not save render queue: {e}")
+
+    # ---------- job control ----------
+    def job(self, job_id):
+        return next((job for job in self.jobs if job.job_id == job_id), None)
+
+    def add_job(self, job):
+        self.jobs.append(job)
+        self.logger.info(f"[QUEUE] Added {job.name} ({job.quality}, {job.resolution_mode})")
+        self._changed()
+        return job.job_id
+
+    def pause(self, job_id):
+        """Holds a queued job back. A running job is stopped; on resume a segmented job keeps its finished
+        fragments, any other job renders again from the start."""
+        job = self.job(job_id)
+        if not job or job.status not in ('queued', 'running'):
+            return False
+        if job.status == 'running':
+            self._stop_worker(job_id)
+        job.status, job.progress = 'paused', 0
+        self._changed(job_id)
+        return True
+
+    def resume(self, job_id):
+        job = self.job(job_id)
+        if not job or job.status not in ('paused', 'failed', 'cancelled'):
+            return False
+        job.status, job.progress, job.error = 'queued', 0, ""
+        self._changed(job_id)
+        return True
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        if not job or job.status in ('done', 'cancelled'):
+            return False
+        if job.status == 'running':
+            self._stop_worker(job_id)
+        job.status = 'cancelled'
+        self._changed(job_id)
+        return True
+
+    def remove(self, job_id):
+        job = self.job(job_id)
+        if not job or job.status == 'running':
+            return False
+        self.jobs.remove(job)
+        self._changed()
+        return True
+
+    def move(self, job_id, index):
+        """Reorders the queue; index is clamped to the list."""
+        job = self.job(job_id)
+        if not job:
+            return False
+        self.jobs.remove(job)
+        self.jobs.insert(max(0, min(index, len(self.jobs))), job)
+        self._changed()
+        return True
+
+    def pause_queue(self):
+        """Stops starting new jobs; running ones finish."""
+        self.dispatching = False
+        self._changed()
+
+    def resume_queue(self):
+        self.dispatching = True
+        self._changed()
+
+    def running_jobs(self):
+        return [job for job in self.jobs if job.status == 'running']
+
+    # ---------- scheduling ----------
+    def _job_cost(self, job):
+        """(cpu slots, encoder slots) a job occupies while it runs."""
+        from binary_manager import BinaryManager
+        from render_worker import RenderWorker
+        # Extra outputs are encoded in the same single pass, one hardware session each
+        segmented = (job.segmented or job.incremental or job.smart) and not job.extra_targets
+        cpu = min(self.cpu_slots, RenderWorker.default_parallelism()) if segmented else 1
+        encoder = 1 if BinaryManager.get_encoder('export', self.logger) != 'libx264' else 0
+        sessions = 1 + sum(1 for t in job.extra_targets if (t.get('codec') or 'auto') == 'auto')
+        return cpu, encoder * (cpu if segmented else sessions)
+
+    def _encoder_limit(self):
+        return self.encoder_slots if self.encoder_slots is not None else GPU_ENCODER_SESSIONS
+
+    def schedule(self):
+        """Starts queued jobs in order while they fit the budget. A job that does not fit blocks the ones
+        behind it, so queue order is respected instead of small jobs overtaking big ones."""
+        self._retired = [w for w in self._retired if getattr(w, 'isRunning', lambda: False)()]
+        if not self.dispatching:
+            return
+        cpu_used = sum(cost[0] for cost in self._costs.values())
+        enc_used = sum(cost[1] for cost in self._costs.values())
+        for job in self.jobs:
+            if job.status != 'queued':
+                continue
+            cpu, enc = self._job_cost(job)
+            fits_cpu = cpu_used + cpu <= self.cpu_slots or not self._costs
+            fits_enc = enc_used + enc <= self._encoder_limit() or not self._costs
+            if not (fits_cpu and fits_enc):
+                break
+            self._start(job, (cpu, enc))
+            cpu_used += cpu
+            enc_used += enc
+
+    def _make_worker(self, job):
+        from render_worker import RenderWorker
+        return RenderWorker(job.clips, job.output_path, job.resolution_mode, job.track_vols, job.track_mutes,
+                            job.audio_analysis, segmented=job.segmented, quality=job.quality,
+                            max_parallel=self._job_cost(job)[0], cache_dir=job.cache_dir or None,
+                            incremental=job.incremental, smart=job.smart, extra_targets=job.extra_targets)
+
+    def _start(self, job, cost):
+        worker = self.worker_factory(job)
+        self._workers[job.job_id] = worker
+        self._costs[job.job_id] = cost
+        job.status, job.progress, job.error = 'running', 0, ""
+        worker.progress.connect(lambda pct, jid=job.job_id: self._on_progress(jid, pct))
+        if hasattr(worker, 'stats'):
+            worker.stats.connect(lambda stats, jid=job.job_id: self.job_stats.emit(jid, stats))
+        worker.finished.connect(lambda jid=job.job_id: self._on_done(jid, None))
+        worker.error.connect(lambda err, jid=job.job_id: self._on_done(jid, err))
+        self.logger.info(f"[QUEUE] Starting {job.name} (cpu {cost[0]}, encoder {cost[1]})")
+        self.save()
+        self.job_changed.emit(job.job_id)
+        worker.start()
+
+    def _stop_worker(self, job_id):
+        worker = self._workers.pop(job_id, None)
+        self._costs.pop(job_id, None)
+        if worker is not None:
+            worker.cancel()
+            self._retired.append(worker)
+
+    def _on_progress(self, job_id, pct):
+        job = self.job(job_id)
+        if job and job.status == 'running':
+            job.progress = pct
+            self.job_changed.emit(job_id)
+
+    def _on_done(self, job_id, error):
+        # Workers that were paused or cancelled are already detached
+        worker = self._workers.pop(job_id, None)
+        if worker is None:
+            return
+        self._retired.append(worker)
+        self._costs.pop(job_id, None)
+        job = self.job(job_id)
+        if job:
+            if error:
+                job.status, job.error = 'failed', error
+                self.logger.error(f"[QUEUE] {job.name} failed: {error}")
+            else:
+                job.status, job.progress = 'done', 100
+                self.logger.info(f"[QUEUE] {job.name} finished")
+        self._changed(job_id)
+
+    def _changed(self, job_id=None):
+        self.save()
+        if job_id:
+            self.job_changed.emit(job_id)
+        self.queue_changed.emit()
+        self.schedule()
+
+    def shutdown(self):
+        """Stops running renders; they are marked paused, so the next launch lists them without restarting them.
+        Waits for every cancelled worker thread, so none is destroyed while it still writes its output."""
+        for job_id in list(self._workers):
+            self._stop_worker(job_id)
+            job = self.job(job_id)
+            if job:
+                job.status, job.progress, job.error = 'paused', 0, INTERRUPTED_NOTE
+        self.save()
+        for worker in self._retired:
+            wait = getattr(worker, 'wait', None)
+            if wait and not wait(SHUTDOWN_WAIT_MS):
+                self.logger.warning(f"[QUEUE] Render thread did not stop within {SHUTDOWN_WAIT_MS} ms")
+        self._retired = []
@@ -0,0 +1,84 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QPushButton, QLabel
+from PyQt5.QtCore import Qt
+
+class RenderQueueDialog(QDialog):
+    """Lists the render queue and drives RenderQueue's pause, cancel and reorder controls."""
+
+    def __init__(self, render_queue, parent=None):
+        super().__init__(parent)
+        self.queue = render_queue
+        self.setWindowTitle("Render Queue")
+        self.resize(560, 380)
+        layout = QVBoxLayout(self)
+        self.lbl_state = QLabel()
+        layout.addWidget(self.lbl_state)
+        self.list = QListWidget()
+        layout.addWidget(self.list)
+        row = QHBoxLayout()
+        for text, handler in (("Up", lambda: self._move(-1)), ("Down", lambda: self._move(1)),
+                              ("Pause", lambda: self._apply(self.queue.pause)),
+                              ("Resume", lambda: self._apply(self.queue.resume)),
+                              ("Cancel", lambda: self._apply(self.queue.cancel)),
+                              ("Remove", lambda: self._apply(self.queue.remove))):
+            btn = QPushButton(text)
+            btn.setCursor(Qt.PointingHandCursor)
+            btn.clicked.connect(handler)
+            row.addWidget(btn)
+        layout.addLayout(row)
+        self.btn_dispatch = QPushButton()
+        self.btn_dispatch.setCursor(Qt.PointingHandCursor)
+        self.btn_dispatch.clicked.connect(self._toggle_dispatch)
+        layout.addWidget(self.btn_dispatch)
+        self.queue.queue_changed.connect(self.refresh)
+        self.queue.job_changed.connect(self._on_job_changed)
+        self.refresh()
+
+    def done(self, result):
+        """The queue outlives the dialog, so its signals are let go when the dialog closes."""
+        for signal, slot in ((self.queue.queue_changed, self.refresh), (self.queue.job_changed, self._on_job_changed)):
+            try:
+                signal.disconnect(slot)
+            except TypeError:
+                pass
+        super().done(result)
+
+    def _on_job_changed(self, _job_id):
+        self.refresh()
+
+    def refresh(self):
+        selected = self._selected_id()
+        self.list.clear()
+        for job in self.queue.jobs:
+            text = f"[{job.status.upper()}] {job.name}  {job.resolution_mode} / {job.quality}"
+            if job.status == 'running':
+                text += f"  {job.progress}%"
+            elif job.error:
+                text += f"  ({job.error})"
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, job.job_id)
+            self.list.addItem(item)
+            if job.job_id == selected:
+                self.list.setCurrentItem(item)
+        running = len(self.queue.running_jobs())
+        self.lbl_state.setText(f"{len(self.queue.jobs)} jobs, {running} rendering | budget: {self.queue.cpu_slots} CPU slots")
+        self.btn_dispatch.setText("Pause Queue" if self.queue.dispatching else "Resume Queue")
+
+    def _selected_id(self):
+        item = self.list.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+    def _apply(self, action):
+        job_id = self._selected_id()
+        if job_id:
+            action(job_id)
+
+    def _move(self, step):
+        job_id = self._selected_id()
+        if job_id:
+            self.queue.move(job_id, self.list.currentRow() + step)
+
+    def _toggle_dispatch(self):
+        if self.queue.dispatching:
+            self.queue.pause_queue()
+        else:
+            self.queue.resume_queue()
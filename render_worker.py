@@ -1,17 +1,164 @@
+import os
 import traceback
 import logging
 import subprocess
 import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from PyQt5.QtCore import QThread, pyqtSignal, QProcess
 from binary_manager import BinaryManager
-from ffmpeg_generator import FilterGraphGenerator
+from ffmpeg_generator import FilterGraphGenerator, FILTER_SCRIPT_THRESHOLD, WORKING_PIX_FMT, QUALITY_PROFILES
+from segment_cache import SegmentRenderCache, DEFAULT_AUDIO_CACHE_BYTES
+from export_manifest import ExportManifest, job_dir_for
+from smart_render import ENCODER_CODECS, KeyframeIndex, encoder_stream_args, is_passthrough, plan_smart_pieces, stream_params
+from thread_budget import budget
+
+def timeline_duration(clips):
+    """Returns the end time of the last clip on the timeline."""
+    return max([c.get('start', 0) + c.get('dur', c.get('duration', 0)) for c in clips], default=0.0)
+
+def parse_timecode(text):
+    """Converts an ffmpeg 'HH:MM:SS.xx' stamp into seconds."""
+    h, m, s = text.strip().split(':')
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+def _number(text):
+    try:
+        return float(str(text).strip().rstrip('x'))
+    except (TypeError, ValueError):
+        return None
+
+class ProgressParser:
+    """Incremental reader for ffmpeg's -progress output: key=value lines grouped into blocks,
+    each closed by progress=continue (or progress=end). Chunks may split lines anywhere."""
+
+    def __init__(self):
+        self._buf = ""
+        self._block = {}
+
+    def feed(self, text):
+        """Consumes a chunk of output and returns the blocks it completed."""
+        self._buf += text.replace('\r', '\n')
+        *lines, self._buf = self._buf.split('\n')
+        blocks = []
+        for line in lines:
+            key, sep, value = line.strip().partition('=')
+            if not sep:
+                continue
+            self._block[key] = value.strip()
+            if key == 'progress':
+                blocks.append(self._block)
+                self._block = {}
+        return blocks
+
+def progress_seconds(block):
+    """Output position of a progress block; out_time_ms is in microseconds as well, despite its name."""
+    for key in ('out_time_us', 'out_time_ms'):
+        value = _number(block.get(key))
+        if value is not None and value >= 0:
+            return value / 1_000_000
+    try:
+        return max(0.0, parse_timecode(block['out_time']))
+    except (KeyError, ValueError):
+        return 0.0
+
+def progress_stats(block, total_duration):
+    """Turns a progress block into the figures the export UI shows; eta is None until speed is known."""
+    seconds = progress_seconds(block)
+    speed = _number(block.get('speed'))
+    eta = None
+    if speed and speed > 0:
+        eta = max(0.0, total_duration - seconds) / speed
+    if block.get('progress') == 'end':
+        seconds, eta = total_duration, 0.0
+    return {
+        'percent': min(100, int(seconds / total_duration * 100)) if total_duration > 0 else 0,
+        'seconds': seconds,
+        'frame': int(_number(block.get('frame')) or 0),
+        'fps': _number(block.get('fps')) or 0.0,
+        'speed': speed or 0.0,
+        'bitrate': block.get('bitrate', 'N/A'),
+        'eta': eta,
+    }
+
+def plan_segments(clips, target_length=60.0, snap_window=0.25, fps=30.0):
+    """Cuts the timeline into export windows of roughly target_length seconds.
+    Boundaries snap to clip cut points when one lies within snap_window * target_length,
+    so most fragments start and end on a cut instead of in the middle of a fade.
+    Every boundary then lands on the output frame grid, so the fragments' frame counts add up
+    to the timeline's and the joined video stays in step with the continuous audio mix."""
+    total_frames = int(round(timeline_duration(clips) * fps))
+    if total_frames <= 0:
+        return []
+    total = total_frames / fps
+    cuts = set()
+    for c in clips:
+        start = c.get('start', 0)
+        for t in (start, start + c.get('dur', c.get('duration', 0))):
+            if 0 < t < total:
+                cuts.add(round(t, 3))
+    cuts = sorted(cuts)
+    segments = []
+    pos = 0
+    while total - pos / fps > target_length * (1 + snap_window):
+        target = pos / fps + target_length
+        reach = target_length * snap_window
+        candidates = [t for t in cuts if target - reach <= t <= target + reach]
+        end = min(candidates, key=lambda t: abs(t - target)) if candidates else float(round(target))
+        end = max(pos + 1, int(round(end * fps)))
+        segments.append((pos / fps, (end - pos) / fps))
+        pos = end
+    segments.append((pos / fps, (total_frames - pos) / fps))
+    return segments
+
+def canvas_size(resolution_mode):
+    """Frame size for one of the editor's resolution modes."""
+    if "2560" in resolution_mode:
+        return 2560, 1440
+    if "3840" in resolution_mode:
+        return 3840, 2160
+    return (1080, 1920) if "Portrait" in resolution_mode else (1920, 1080)
+
+def split_outputs(v_map, a_map, canvas, sizes, scale_flags='lanczos'):
+    """Filter chains that fan one composited picture and mix out to several outputs: split/asplit, then a
+    scaler per output whose size differs from the canvas (letterboxed if the aspect ratio differs).
+    Returns (chains, [(video_pin, audio_pin), ...]); chains is "" for a single output at canvas size.
+    Without an a_map the audio pins are None and only the picture is split."""
+    if len(sizes) == 1 and tuple(sizes[0]) == tuple(canvas):
+        return "", [(v_map, a_map)]
+    n = len(sizes)
+    v_pins = [f"[mv{i}]" for i in range(n)]
+    a_pins = [f"[ma{i}]" if a_map else None for i in range(n)]
+    chains = [f"{v_map}split={n}{''.join(v_pins)}"]
+    if a_map:
+        chains.append(f"{a_map}asplit={n}{''.join(a_pins)}")
+    outs = []
+    for i, (w, h) in enumerate(sizes):
+        if (w, h) == tuple(canvas):
+            outs.append((v_pins[i], a_pins[i]))
+            continue
+        chains.append(f"{v_pins[i]}scale={w}:{h}:force_original_aspect_ratio=decrease:flags={scale_flags},"
+                      f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1[tv{i}]")
+        outs.append((f"[tv{i}]", a_pins[i]))
+    return ";".join(chains), outs
 
 class RenderWorker(QThread):
     progress = pyqtSignal(int)
+    stats = pyqtSignal(dict)
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, clips, output_path, resolution_mode, track_vols, track_mutes, audio_analysis_results):
+    def __init__(self, clips, output_path, resolution_mode, track_vols, track_mutes, audio_analysis_results,
+                 segmented=False, segment_length=60.0, max_parallel=None, cache_dir=None, quality='final',
+                 incremental=False, smart=False, extra_targets=None):
+        """cache_dir is the project's cache folder: filter scripts go to graphs/, reusable segments to renders/.
+        incremental renders in segments and only re-encodes the ones whose content changed since the last export.
+        smart stream-copies stretches where one untouched source clip plays, between its keyframes.
+        extra_targets are further deliverables of the same timeline, dicts with path, resolution and optionally
+        codec ('auto' or an encoder name), video_bitrate and audio_bitrate; they are encoded in the same pass."""
         super().__init__()
         self.clips = clips
         self.out = output_path
@@ -19,83 +166,489 @@ class RenderWorker(QThread):
         self.vols = track_vols
         self.mutes = track_mutes
         self.audio_analysis_results = audio_analysis_results
+        self.segmented = segmented
+        self.segment_length = segment_length
+        self.max_parallel = max_parallel or self.default_parallelism()
+        self.cache_dir = cache_dir
+        self.quality = quality
+        self.incremental = incremental and bool(cache_dir)
+        self.smart = smart
+        self.extra_targets = list(extra_targets or [])
         self.logger = logging.getLogger("Advanced_Video_Editor")
         self.process = None
+        self._fragment_procs = []
+        self._fragment_lock = threading.Lock()
+        self._fragment_times = []
+        self._fragment_peers = 1
+        # Profile and level arguments that match re-encoded fragments to the stream-copied ones
+        self._copy_stream_args = []
+        self._aborted = False
+        self._progress_parser = ProgressParser()
+        self._total_duration = 1.0
+        self._error_tail = ""
+
+    @staticmethod
+    def default_parallelism():
+        """Fragment processes a segmented export runs side by side when not told otherwise."""
+        return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+    def _canvas_size(self):
+        return canvas_size(self.res)
+
+    def _targets(self):
+        primary = {'path': self.out, 'resolution': self.res, 'codec': 'auto', 'video_bitrate': '', 'audio_bitrate': '320k'}
+        return [primary] + self.extra_targets
+
+    def _target_video_args(self, target, gpu_codec):
+        codec = target.get('codec') or 'auto'
+        args = self._video_codec_args(gpu_codec if codec == 'auto' else codec)
+        bitrate = target.get('video_bitrate')
+        if not bitrate:
+            return args
+        # A bitrate target replaces the constant-quality settings
+        capped = []
+        skip = False
+        for arg in args:
+            if skip:
+                skip = False
+            elif arg in ('-crf', '-cq', '-b:v'):
+                skip = True
+            else:
+                capped.append(arg)
+        return capped + ['-b:v', bitrate, '-maxrate', bitrate, '-bufsize', bitrate]
+
+    def _video_codec_args(self, gpu_codec):
+        # A calibrated preset (BinaryManager.calibrate) replaces the fixed default for its encoder
+        calibrated = BinaryManager.preset_args(BinaryManager.get_encoder_setting('export', self.logger), gpu_codec)
+        if gpu_codec != 'libx264':
+            is_modern = gpu_codec in ['av1_nvenc', 'hevc_nvenc']
+            preset = 'p7' if is_modern else 'p4'
+            cq_value = '18' if is_modern else '21'
+            args = ['-c:v', gpu_codec, '-pix_fmt', 'p010le' if is_modern else 'yuv420p']
+            args.extend(calibrated or ['-preset', preset])
+            args.extend(['-tier', 'high', '-rc', 'vbr', '-cq', cq_value, '-b:v', '0', '-rc-lookahead', '32'])
+            if gpu_codec == 'hevc_nvenc':
+                args.extend(['-spatial-aq', '1', '-temporal-aq', '1'])
+            return args
+        return ['-c:v', 'libx264'] + (calibrated or ['-preset', 'medium']) + ['-crf', '18']
+
+    def _input_args(self, inputs, seeks=None):
+        """Builds the -i arguments, seeking each input before it is opened."""
+        args = []
+        for idx, inp in enumerate(inputs):
+            seek = seeks[idx] if seeks and idx < len(seeks) else 0.0
+            if seek > 0:
+                args.extend(['-ss', f'{seek:.3f}'])
+            args.extend(['-i', inp])
+        return args
+
+    def _script_graph(self, gen, f_str, script_path, tail=""):
+        """Writes graphs past FILTER_SCRIPT_THRESHOLD to a script file; returns its path, or None to pass f_str inline.
+        tail holds chains appended to the generator's graph (output splits), written after it."""
+        if len(f_str) <= FILTER_SCRIPT_THRESHOLD or gen.graph is None:
+            return None
+        os.makedirs(os.path.dirname(script_path), exist_ok=True)
+        gen.write_filter_script(script_path)
+        if tail:
+            with open(script_path, 'a', encoding='utf-8') as f:
+                f.write(f";\n{tail}\n")
+        self.logger.info(f"[RENDER] Filter graph ({len(f_str)} chars) written to {script_path}")
+        return script_path
+
+    def _filter_args(self, f_str, script_path=None):
+        if not script_path:
+            return ['-filter_complex', f_str]
+        if BinaryManager.get_ffmpeg_version(self.logger) >= (7, 0):
+            return ['-/filter_complex', script_path]
+        return ['-filter_complex_script', script_path]
 
     def run(self):
-        """Standard Rendering Implementation."""
+        """Standard Rendering Implementation. The audio is mixed to FLAC first, through the same cache as
+        segmented exports, and muxed into every target next to the one-pass picture."""
+        frag_dir = None
+        completed = False
+        audio_cache = None
         try:
-            if "2560" in self.res: 
-                w, h = 2560, 1440
-            elif "3840" in self.res: 
-                w, h = 3840, 2160
-            else:
-                w, h = (1080, 1920) if "Portrait" in self.res else (1920, 1080)
+            w, h = self._canvas_size()
+            self._total_duration = timeline_duration(self.clips) or 1.0
+            if self.extra_targets and (self.segmented or self.incremental or self.smart):
+                self.logger.warning("[RENDER] Several outputs are encoded in one pass; segmented options are ignored")
+            elif self.segmented or self.incremental or self.smart:
+                self._run_segmented(w, h)
+                return
+            targets = self._targets()
+            sizes = [canvas_size(t['resolution']) for t in targets]
+            # Composite once at the largest deliverable; the others are scaled down from it
+            w, h = max(sizes, key=lambda size: size[0] * size[1])
             gen = FilterGraphGenerator(self.clips, w, h, self.vols, self.mutes, self.audio_analysis_results)
-            inputs, f_str, v_map, a_map, _ = gen.build(is_export=True)
-            gpu_codec = BinaryManager.get_best_encoder(self.logger)
-            cmd = [BinaryManager.get_executable('ffmpeg'), '-y', '-hide_banner']
+            frag_dir = job_dir_for(self.out)
+            audio_cache = SegmentRenderCache(os.path.join(self.cache_dir, "audio"), DEFAULT_AUDIO_CACHE_BYTES, ext=".flac") \
+                if self.cache_dir else None
+            # Mixed before the picture is built: the mix builds its own graph on the same generator
+            audio_path, err = self._single_pass_mix(gen, self._total_duration, frag_dir, ExportManifest(frag_dir, self.out), audio_cache)
+            if not audio_path:
+                self.error.emit("Export cancelled" if self._aborted else f"Audio mixdown failed: {err}")
+                return
+            inputs, f_str, v_map, _, _ = gen.build(is_export=True, quality=self.quality, audio=False)
+            if not inputs:
+                f_str, v_map = f"color=c=black:s={w}x{h}:d={self._total_duration:.3f}:r={gen.fps:g}[vo]", "[vo]"
+            tail, outs = split_outputs(v_map, None, (w, h), sizes, QUALITY_PROFILES[self.quality]['flags'])
+            if tail:
+                f_str = f"{f_str};{tail}"
+            script_dir = os.path.join(self.cache_dir, "graphs") if self.cache_dir else os.path.dirname(os.path.abspath(self.out))
+            script_path = self._script_graph(gen, f_str, os.path.join(script_dir, f".export_{os.getpid()}_{id(self):x}.ffgraph"), tail)
+            gpu_codec = BinaryManager.get_encoder('export', self.logger)
+            cmd = [BinaryManager.get_executable('ffmpeg'), '-y', '-hide_banner', '-nostats', '-progress', 'pipe:1']
             if 'nvenc' in gpu_codec:
                 cmd.extend(['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda'])
-            for inp in inputs:
-                cmd.extend(['-i', inp])
-            cmd.extend(['-filter_complex', f_str])
-            cmd.extend(['-map', v_map, '-map', a_map])
-            if gpu_codec != 'libx264':
-                is_modern = gpu_codec in ['av1_nvenc', 'hevc_nvenc']
-                preset = 'p7' if is_modern else 'p4'
-                cq_value = '18' if is_modern else '21'
-                cmd.extend(['-c:v', gpu_codec, '-pix_fmt', 'p010le' if is_modern else 'yuv420p'])
-                cmd.extend(['-preset', preset, '-tier', 'high', '-rc', 'vbr', '-cq', cq_value, '-b:v', '0', '-rc-lookahead', '32'])
-                if gpu_codec == 'hevc_nvenc':
-                    cmd.extend(['-spatial-aq', '1', '-temporal-aq', '1'])
-            else:
-                cmd.extend(['-c:v', 'libx264', '-preset', 'medium', '-crf', '18'])
-            cmd.extend(['-c:a', 'aac', '-b:a', '320k'])
-            cmd.append(self.out)
+            cmd.extend(self._input_args(inputs, gen.input_seeks))
+            cmd.extend(['-i', audio_path])
+            cmd.extend(self._filter_args(f_str, script_path))
+            for target, (v_pin, _) in zip(targets, outs):
+                cmd.extend(['-map', v_pin, '-map', f'{len(inputs)}:a:0'])
+                cmd.extend(self._target_video_args(target, gpu_codec))
+                cmd.extend(['-c:a', 'aac', '-b:a', target.get('audio_bitrate') or '320k'])
+                cmd.append(target['path'])
+            lease = budget.acquire('export')
+            cmd = lease.apply(cmd, outputs=[t['path'] for t in targets])
             self.logger.info(f"Render CMD: {' '.join(cmd)}")
             self.process = QProcess()
-            self.process.setProcessChannelMode(QProcess.MergedChannels)
+            self._progress_parser = ProgressParser()
             self.process.readyReadStandardOutput.connect(self.read_log)
-            self.process.start(cmd[0], cmd[1:])
-            self.process.waitForFinished(-1)
-            if self.process.exitCode() == 0:
+            self.process.readyReadStandardError.connect(self.read_errors)
+            try:
+                self.process.start(cmd[0], cmd[1:])
+                if not self.process.waitForStarted():
+                    self.error.emit(f"Could not start ffmpeg: {self.process.errorString()}")
+                    return
+                while self.process.state() != QProcess.NotRunning and not self.process.waitForFinished(200):
+                    if self._aborted:
+                        self.process.kill()
+            finally:
+                lease.release()
+            if script_path and os.path.exists(script_path):
+                os.remove(script_path)
+            if self._aborted:
+                self.error.emit("Export cancelled")
+            elif self.process.exitCode() == 0:
+                completed = True
                 self.finished.emit()
             else:
-                self.error.emit(f"FFmpeg Exit Code: {self.process.exitCode()}")
+                detail = f": {self._error_tail}" if self._error_tail else ""
+                self.error.emit(f"FFmpeg Exit Code: {self.process.exitCode()}{detail}")
         except Exception as e:
             self.error.emit(str(e))
+        finally:
+            if audio_cache:
+                audio_cache.release()
+            # A failed export keeps its mix for the next attempt, like the fragments of a segmented one
+            if completed and frag_dir:
+                shutil.rmtree(frag_dir, ignore_errors=True)
+
+    def _single_pass_mix(self, gen, total, frag_dir, manifest, cache=None):
+        """Runs or reuses the audio mixdown of _audio_mixdown for a single-pass export.
+        Returns (path, error); path is None when the mix failed."""
+        key, path, render = self._audio_mixdown(gen, total, frag_dir, manifest, cache)
+        if render:
+            ok, err = render()
+            if not ok:
+                return None, err
+            if cache:
+                path = cache.put(key, path)
+            manifest.record(key, path)
+        return path, ""
 
     def read_log(self):
-        """Goal 15: Hardened progress parsing with buffer-clearing."""
+        """Feeds -progress output from stdout to the parser; blocks split across reads are completed later."""
         raw_data = self.process.readAllStandardOutput().data().decode(errors='ignore')
-        for line in raw_data.split('\r'):
-            if "time=" in line:
-                try:
-                    start = line.find("time=") + 5
-                    end = line.find(" ", start)
-                    time_str = line[start:end].strip()
-                    if ":" in time_str:
-                        h, m, s = time_str.split(':')
-                        current_seconds = int(h) * 3600 + int(m) * 60 + float(s)
-                        total_duration = max([c.get('start', 0) + c.get('dur', 0) for c in self.clips], default=1.0)
-                        progress_pct = int((current_seconds / total_duration) * 100)
-                        self.progress.emit(min(100, progress_pct))
-                except Exception:
-                    continue
-
-    def render_fragment(self, inputs, f_str, v_map, a_map, frag_path):
-        """Executes a single fragment render pass."""
-        gpu_codec = BinaryManager.get_best_encoder(self.logger)
-        cmd = [BinaryManager.get_executable('ffmpeg'), '-y', '-hide_banner', '-loglevel', 'error']
-        for inp in inputs:
-            cmd.extend(['-i', inp])
-        cmd.extend(['-filter_complex', f_str])
-        cmd.extend(['-map', v_map, '-map', a_map])
-        if gpu_codec != 'libx264':
-            cmd.extend(['-c:v', gpu_codec, '-preset', 'p1', '-f', 'mpegts'])
+        for block in self._progress_parser.feed(raw_data):
+            stats = progress_stats(block, self._total_duration)
+            self.progress.emit(stats['percent'])
+            self.stats.emit(stats)
+
+    def read_errors(self):
+        """ffmpeg's log goes to stderr; the last line is kept for the error message."""
+        raw_data = self.process.readAllStandardError().data().decode(errors='ignore')
+        lines = [line.strip() for line in raw_data.splitlines() if line.strip()]
+        if lines:
+            self._error_tail = lines[-1]
+            self.logger.debug(f"[RENDER] {lines[-1]}")
+
+    def _run_segmented(self, w, h):
+        """Renders timeline segments in a bounded pool of ffmpeg processes, then joins them with the concat demuxer.
+        Fragments carry video only; the audio is mixed once over the whole timeline (see _audio_mixdown) in the
+        same pool and muxed in by the join, so segment boundaries never cut the mix. For progress the mix
+        counts as one more fragment of average length.
+        Finished fragments are checkpointed in a job folder next to the output, so a failed or interrupted
+        export of the same file continues from the fragments that are still missing."""
+        gen = FilterGraphGenerator(self.clips, w, h, self.vols, self.mutes, self.audio_analysis_results)
+        segments = plan_segments(self.clips, self.segment_length, fps=gen.fps)
+        if not segments:
+            self.error.emit("Timeline is empty, nothing to export.")
+            return
+        frag_dir = job_dir_for(self.out)
+        manifest = ExportManifest(frag_dir, self.out)
+        total = sum(dur for _, dur in segments) or 1.0
+        pieces = self._smart_pieces(gen, segments) if self.smart else [('encode', s, d, None, None) for s, d in segments]
+        # The audio mix takes the slot after the last piece
+        audio_idx = len(pieces)
+        audio_share = total / len(pieces)
+        total_work = total + audio_share
+        self._fragment_times = [0.0] * (len(pieces) + 1)
+        fragment_fps = [0.0] * (len(pieces) + 1)
+        cache = SegmentRenderCache(os.path.join(self.cache_dir, "renders")) if self.incremental else None
+        audio_cache = SegmentRenderCache(os.path.join(self.cache_dir, "audio"), DEFAULT_AUDIO_CACHE_BYTES, ext=".flac") \
+            if self.cache_dir else None
+        encode_args = self._fragment_encode_args() + [str(BinaryManager.get_ffmpeg_version(self.logger))]
+        segment_paths = [None] * len(pieces)
+        keys = [None] * len(pieces)
+        jobs = []
+        resumed = 0
+        for idx, (kind, start, dur, clip, source_start) in enumerate(pieces):
+            if kind == 'copy':
+                keys[idx] = SegmentRenderCache.segment_key("copy", [clip['path']], [source_start], dur, encode_args)
+            else:
+                inputs, f_str, v_map, _, _ = gen.build(start_time=start, duration=dur, is_export=True,
+                                                       quality=self.quality, audio=False)
+                if not inputs:
+                    f_str, v_map = f"color=c=black:s={w}x{h}:d={dur:.3f}[vo]", "[vo]"
+                keys[idx] = SegmentRenderCache.segment_key(f_str, inputs, gen.input_seeks, dur, encode_args)
+            segment_paths[idx] = manifest.finished(keys[idx])
+            if segment_paths[idx]:
+                resumed += 1
+            elif cache and kind != 'copy':
+                segment_paths[idx] = cache.get(keys[idx])
+            if segment_paths[idx]:
+                self._fragment_times[idx] = dur
+                continue
+            # Named by content, so fragments of an earlier run never collide with this run's numbering
+            frag_path = os.path.join(frag_dir, f"{keys[idx]}.ts")
+            segment_paths[idx] = frag_path
+            if kind == 'copy':
+                jobs.append((idx, partial(self.render_passthrough, clip, source_start, dur, frag_path,
+                                          frames=int(round(dur * gen.fps)))))
+                continue
+            script_path = self._script_graph(gen, f_str, os.path.join(frag_dir, f"frag_{idx:04d}.ffgraph")) if inputs else None
+            jobs.append((idx, partial(self.render_fragment, inputs, f_str, v_map, None, frag_path, dur,
+                                      seeks=list(gen.input_seeks), script_path=script_path,
+                                      frames=int(round(dur * gen.fps)))))
+        audio_key, audio_path, audio_job = self._audio_mixdown(gen, total, frag_dir, manifest, audio_cache)
+        keys.append(audio_key)
+        segment_paths.append(audio_path)
+        if audio_job:
+            # Submitted first: it is the longest single job, so it should not be the one left running at the end
+            jobs.insert(0, (audio_idx, lambda on_time: audio_job(
+                on_time=lambda t, fps=0.0: on_time(t * audio_share / total))))
         else:
-            cmd.extend(['-c:v', 'libx264', '-preset', 'ultrafast', '-f', 'mpegts'])
+            self._fragment_times[audio_idx] = audio_share
+        if resumed:
+            self.logger.info(f"[RENDER] Resuming export: {resumed} of {len(pieces)} fragments already finished")
+        if cache:
+            reused = len(pieces) - sum(1 for idx, _ in jobs if idx != audio_idx) - resumed
+            self.logger.info(f"[RENDER] Incremental export: reusing {reused} of {len(pieces)} segments")
+        self.logger.info(f"[RENDER] Segmented export: {len(jobs)} fragments, {self.max_parallel} in parallel")
+        self._fragment_peers = max(1, min(self.max_parallel, len(jobs)))
+
+        started = time.monotonic()
+
+        def on_fragment_time(idx, seconds, fps=0.0):
+            with self._fragment_lock:
+                self._fragment_times[idx] = seconds
+                fragment_fps[idx] = fps
+                done = sum(self._fragment_times)
+                combined_fps = sum(fragment_fps)
+            percent = min(99, int(done / total_work * 100))
+            # Fragments run side by side, so overall speed is timeline seconds done per wall-clock second
+            speed = done / max(1e-6, time.monotonic() - started)
+            self.progress.emit(percent)
+            self.stats.emit({'percent': percent, 'seconds': done, 'frame': 0, 'fps': combined_fps, 'speed': speed,
+                             'bitrate': 'N/A', 'eta': (total_work - done) / speed if speed > 0 else None})
+
+        def checkpoint(idx):
+            piece_cache = audio_cache if idx == audio_idx else cache if pieces[idx][0] != 'copy' else None
+            if piece_cache:
+                segment_paths[idx] = piece_cache.put(keys[idx], segment_paths[idx])
+            manifest.record(keys[idx], segment_paths[idx])
+        failures = []
+        completed = False
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+                futures = {
+                    pool.submit(render, on_time=lambda t, fps=0.0, i=idx: on_fragment_time(i, t, fps)): idx
+                    for idx, render in jobs
+                }
+                for fut in as_completed(futures):
+                    ok, err = fut.result()
+                    idx = futures[fut]
+                    if ok:
+                        checkpoint(idx)
+                    else:
+                        failures.append(f"Audio mixdown failed: {err}" if idx == audio_idx else f"Fragment {idx}: {err}")
+                        self._abort_fragments()
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        # Fragments that finished while the pool wound down still count on the next attempt
+                        for other, other_idx in futures.items():
+                            if other is not fut and other.done() and not other.cancelled() and other.result()[0]:
+                                checkpoint(other_idx)
+                        break
+            if failures:
+                self.error.emit(failures[0])
+                return
+            ok, err = self._concat_fragments(segment_paths[:audio_idx], frag_dir, segment_paths[audio_idx])
+            if not ok:
+                self.error.emit(f"Fragment concat failed: {err}")
+                return
+            completed = True
+            self.progress.emit(100)
+            self.finished.emit()
+        finally:
+            for c in (cache, audio_cache):
+                if c:
+                    c.release()
+            # Anything short of a finished export keeps its checkpoints for the next attempt
+            if completed:
+                shutil.rmtree(frag_dir, ignore_errors=True)
+
+    def _smart_pieces(self, gen, segments):
+        """Splits export segments into stream-copy and re-encode pieces, see plan_smart_pieces."""
+        encoder = BinaryManager.get_encoder('export', self.logger)
+        codec_args = self._video_codec_args(encoder)
+        pix_fmt = codec_args[codec_args.index('-pix_fmt') + 1] if '-pix_fmt' in codec_args else WORKING_PIX_FMT
+        codec = ENCODER_CODECS.get(encoder)
+        # Copies are only spliced with fragments of the same profile, level, SAR and time base: the first
+        # copyable clip whose profile and level the encoder can be forced to sets them for the whole export
+        reference = next((stream_params(c) for c in sorted(self.clips, key=lambda c: c['start'])
+                          if encoder_stream_args(encoder, stream_params(c))
+                          and is_passthrough(c, gen.w, gen.h, gen.fps, codec, pix_fmt, stream_params(c))), None)
+        if reference is None:
+            self.logger.info("[SMART] No clip can be stream-copied into this export")
+            return [('encode', s, d, None, None) for s, d in segments]
+        self._copy_stream_args = encoder_stream_args(encoder, reference)
+        index = KeyframeIndex(os.path.join(self.cache_dir, "keyframes") if self.cache_dir else None)
+        eligible = lambda clip: is_passthrough(clip, gen.w, gen.h, gen.fps, codec, pix_fmt, reference)
+        pieces = []
+        for start, dur in segments:
+            pieces.extend(plan_smart_pieces(self.clips, start, dur, index.get, eligible, fps=gen.fps))
+        copied = sum(p[2] for p in pieces if p[0] == 'copy')
+        self.logger.info(f"[SMART] Stream-copying {copied:.1f}s of {sum(d for _, d in segments):.1f}s "
+                         f"in {sum(1 for p in pieces if p[0] == 'copy')} pieces")
+        return pieces
+
+    def cancel(self):
+        """Stops the render from any thread; the worker reports it through error("Export cancelled")."""
+        self._aborted = True
+        self._abort_fragments()
+
+    def _abort_fragments(self):
+        self._aborted = True
+        with self._fragment_lock:
+            procs = list(self._fragment_procs)
+        for proc in procs:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+
+    def _audio_mixdown(self, gen, total, frag_dir, manifest, cache=None):
+        """Plans the one-pass mix of the timeline's audio into a lossless FLAC. Returns (key, path, render):
+        render runs the mix like a fragment job and is None when a finished mix was found.
+        The key hashes the audio graph alone, so a video-only edit finds the mix in the manifest or cache again."""
+        inputs, f_str, _, a_map, _ = gen.build(0.0, total, is_export=True, quality=self.quality, video=False)
+        if not inputs:
+            f_str, a_map = f"anullsrc=channel_layout=stereo:sample_rate=44100,atrim=duration={total:.3f}[ao]", "[ao]"
+        version = str(BinaryManager.get_ffmpeg_version(self.logger))
+        key = SegmentRenderCache.segment_key(f_str, inputs, gen.input_seeks, total, ['-c:a', 'flac', version])
+        path = manifest.finished(key) or (cache.get(key) if cache else None)
+        if path:
+            self.logger.info("[RENDER] Reusing audio mix")
+            return key, path, None
+        self.logger.info(f"[RENDER] Mixing audio: {total:.1f}s from {len(inputs)} inputs")
+        path = os.path.join(frag_dir, f"{key}.flac")
+        script_path = self._script_graph(gen, f_str, os.path.join(frag_dir, "audio.ffgraph")) if inputs else None
+        cmd = [BinaryManager.get_executable('ffmpeg'), '-y', '-hide_banner', '-loglevel', 'error',
+               '-nostats', '-progress', 'pipe:1']
+        cmd.extend(self._input_args(inputs, gen.input_seeks))
+        cmd.extend(self._filter_args(f_str, script_path))
+        cmd.extend(['-map', a_map, '-t', f'{total:.3f}', '-c:a', 'flac', '-ar', '44100', '-ac', '2', path])
+        return key, path, partial(self._run_fragment, cmd, total)
+
+    def _concat_fragments(self, frag_paths, frag_dir, audio_path):
+        """Joins finished fragments with the concat demuxer, copying the video without re-encoding,
+        and encodes the audio mix alongside it."""
+        list_path = os.path.join(frag_dir, "fragments.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in frag_paths:
+                safe = path.replace('\\', '/').replace("'", "'\\''")
+                f.write(f"file '{safe}'\n")
+        cmd = [BinaryManager.get_executable('ffmpeg'), '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'concat', '-safe', '0', '-i', list_path, '-i', audio_path,
+               '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '320k', '-shortest', self.out]
+        self.logger.info(f"[RENDER] Concat CMD: {' '.join(cmd)}")
+        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return res.returncode == 0, res.stderr.decode(errors='ignore').strip()
+
+    def _fragment_encode_args(self, gpu_codec=None):
+        """Codec and container arguments every fragment is encoded with; part of the segment cache key."""
+        gpu_codec = gpu_codec or BinaryManager.get_encoder('export', self.logger)
+        return self._video_codec_args(gpu_codec) + self._copy_stream_args + ['-an', '-f', 'mpegts']
+
+    def render_fragment(self, inputs, f_str, v_map, a_map, frag_path, duration=None, on_time=None, seeks=None, script_path=None,
+                        frames=None):
+        """Executes a single fragment render pass; on_time gets (seconds, fps) from ffmpeg's progress reports.
+        frames caps the video at an exact frame count, which -t rounded to milliseconds can overshoot by one."""
+        gpu_codec = BinaryManager.get_encoder('export', self.logger)
+        cmd = [BinaryManager.get_executable('ffmpeg'), '-y', '-hide_banner', '-loglevel', 'error',
+               '-nostats', '-progress', 'pipe:1']
+        cmd.extend(self._input_args(inputs, seeks))
+        cmd.extend(self._filter_args(f_str, script_path))
+        cmd.extend(['-map', v_map])
+        if a_map:
+            cmd.extend(['-map', a_map])
+        if duration:
+            cmd.extend(['-t', f'{duration:.3f}'])
+        if frames:
+            cmd.extend(['-frames:v', str(frames)])
+        cmd.extend(self._fragment_encode_args(gpu_codec))
         cmd.append(frag_path)
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        proc.communicate()
\ No newline at end of file
+        return self._run_fragment(cmd, duration, on_time)
+
+    def render_passthrough(self, clip, source_start, duration, frag_path, on_time=None, frames=None):
+        """Copies a keyframe-aligned stretch of the clip's video packets into a fragment; its audio comes from the mix.
+        frames caps the copy at the piece's length on the frame grid, like render_fragment."""
+        cmd = [BinaryManager.get_executable('ffmpeg'), '-y', '-hide_banner', '-loglevel', 'error',
+               '-nostats', '-progress', 'pipe:1', '-ss', f'{source_start:.6f}', '-i', clip['path'],
+               '-map', '0:v:0', '-an', '-t', f'{duration:.6f}']
+        if frames:
+            cmd.extend(['-frames:v', str(frames)])
+        cmd.extend(['-c:v', 'copy', '-f', 'mpegts', frag_path])
+        return self._run_fragment(cmd, duration, on_time)
+
+    def _run_fragment(self, cmd, duration=None, on_time=None):
+        if self._aborted:
+            return False, "Export aborted"
+        # stderr goes to a file so a chatty log can never block the progress pipe
+        err_file = tempfile.TemporaryFile()
+        with budget.acquire('fragment', peers=self._fragment_peers) as lease:
+            proc = subprocess.Popen(lease.apply(cmd), stdout=subprocess.PIPE, stderr=err_file)
+            with self._fragment_lock:
+                self._fragment_procs.append(proc)
+            parser = ProgressParser()
+            while True:
+                chunk = proc.stdout.read1(4096)
+                if not chunk:
+                    break
+                for block in parser.feed(chunk.decode(errors='ignore')):
+                    if on_time:
+                        on_time(progress_seconds(block), _number(block.get('fps')) or 0.0)
+            proc.wait()
+        with self._fragment_lock:
+            self._fragment_procs.remove(proc)
+        err_file.seek(0)
+        err_lines = [line.strip() for line in err_file.read().decode(errors='ignore').splitlines() if line.strip()]
+        err_file.close()
+        tail = err_lines[-1] if err_lines else ""
+        if proc.returncode != 0:
+            return False, tail or f"FFmpeg Exit Code: {proc.returncode}"
+        if on_time and duration:
+            on_time(duration)
+        return True, ""
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+# Encoded segments kept per project before the least recently used ones are evicted
+DEFAULT_SEGMENT_CACHE_BYTES = 20 * 1024 ** 3
+# Lossless timeline audio mixes kept per project
+DEFAULT_AUDIO_CACHE_BYTES = 2 * 1024 ** 3
+
+def source_fingerprint(path):
+    """Identifies a source file by path, size and modification time, so re-encoded or replaced media changes the key."""
+    try:
+        st = os.stat(path)
+        return [os.path.abspath(path).replace('\\', '/'), st.st_size, st.st_mtime_ns]
+    except OSError:
+        return [path, None, None]
+
+class SegmentRenderCache:
+    """Encoded export segments on disk, keyed by a hash of everything that decides their content.
+    Entries are files named <key><ext>; their mtime doubles as the LRU clock, so the cache needs no index."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_SEGMENT_CACHE_BYTES, ext=".ts"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ext = ext
+        self.hits = 0
+        self.misses = 0
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("Advanced_Video_Editor")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def segment_key(f_str, inputs, seeks, duration, encode_args):
+        """Hash of a fragment's compiled graph (which carries every clip setting in the window),
+        the fingerprints of the sources it reads, where they are opened, its length and the encoder settings."""
+        payload = {
+            'graph': f_str,
+            'sources': [source_fingerprint(p) for p in inputs],
+            'seeks': [round(float(s), 3) for s in (seeks or [])],
+            'duration': round(float(duration), 3),
+            'encode': list(encode_args),
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.ext}")
+
+    def get(self, key):
+        """Returns the cached segment and marks it recently used, or None. Hits are pinned until release()."""
+        path = self.path_for(key)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path, None)
+                self._pinned.add(key)
+                self.hits += 1
+                return path
+            self.misses += 1
+            return None
+
+    def put(self, key, fragment_path):
+        """Moves a freshly encoded fragment into the cache, evicts down to the size cap and returns the cached path."""
+        path = self.path_for(key)
+        with self._lock:
+            shutil.move(fragment_path, path)
+            self._pinned.add(key)
+            self._evict()
+        return path
+
+    def release(self):
+        """Unpins the segments used by the last export so they can be evicted again."""
+        with self._lock:
+            self._pinned.clear()
+            self._evict()
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.ext):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((name[:-len(self.ext)], st.st_size, st.st_mtime))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            try:
+                os.remove(self.path_for(key))
+                total -= size
+                self.logger.debug(f"[RENDER-CACHE] Evicted segment {key[:10]} ({size} bytes)")
+            except OSError:
+                pass
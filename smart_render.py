@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+from binary_manager import BinaryManager
+from segment_cache import source_fingerprint
+
+# Codec each export encoder produces; a source can only be stream-copied into an export of the same codec
+ENCODER_CODECS = {'libx264': 'h264', 'h264_nvenc': 'h264', 'hevc_nvenc': 'hevc', 'av1_nvenc': 'av1'}
+# Copy ranges shorter than this are re-encoded; two extra cut points are not worth a second or so of copying
+MIN_COPY_SECONDS = 2.0
+# Encoder -profile:v value for each probed profile the encoder can produce; the re-encoded parts of a smart
+# export are forced to the profile of the copied ones, so sources in any other profile are always re-encoded
+ENCODER_PROFILES = {
+    'libx264': {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high'},
+    'h264_nvenc': {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high'},
+    'hevc_nvenc': {'Main': 'main', 'Main 10': 'main10'},
+}
+
+def probe_keyframes(path):
+    """Timestamps (seconds from the start of the file) of the keyframes in the first video stream.
+    Reads packet flags only, so nothing is decoded."""
+    cmd = [BinaryManager.get_executable('ffprobe'), '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'packet=pts_time,flags', '-show_entries', 'format=start_time', '-of', 'json', path]
+    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if res.returncode != 0:
+        raise OSError(res.stderr.decode(errors='ignore').strip() or f"ffprobe exit code {res.returncode}")
+    data = json.loads(res.stdout.decode('utf-8', errors='ignore') or "{}")
+    offset = float(data.get('format', {}).get('start_time') or 0.0)
+    times = set()
+    for packet in data.get('packets', []):
+        if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A'):
+            times.add(round(float(packet['pts_time']) - offset, 6))
+    return sorted(times)
+
+class KeyframeIndex:
+    """Keyframe lists per source, probed once and kept as JSON under cache_dir (keyed by path, size and mtime)."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.logger = logging.getLogger("Advanced_Video_Editor")
+        self._memory = {}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, path):
+        if not self.cache_dir:
+            return None
+        blob = json.dumps(source_fingerprint(path)).encode('utf-8')
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(blob).hexdigest()}.json")
+
+    def get(self, path):
+        """Keyframe times of path, or [] when the source cannot be indexed."""
+        with self._lock:
+            if path in self._memory:
+                return self._memory[path]
+        cache_path = self._cache_path(path)
+        keyframes = None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    keyframes = json.load(f)
+            except (OSError, ValueError):
+                keyframes = None
+        if keyframes is None:
+            try:
+                keyframes = probe_keyframes(path)
+                self.logger.info(f"[SMART] Indexed {len(keyframes)} keyframes in {os.path.basename(path)}")
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"[SMART] Could not index keyframes of {path}: {e}")
+                keyframes = []
+            if cache_path and keyframes:
+                temp_path = cache_path + ".tmp"
+                try:
+                    with open(temp_path, 'w', encoding='utf-8') as f:
+                        json.dump(keyframes, f)
+                    os.replace(temp_path, cache_path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._memory[path] = keyframes
+        return keyframes
+
+def stream_params(clip):
+    """(profile, level, sample aspect ratio, time base) of the clip's video stream, as probed."""
+    return (clip.get('video_profile', ''), int(clip.get('video_level') or 0), clip.get('sar', ''), clip.get('time_base', ''))
+
+def encoder_stream_args(encoder, params):
+    """Arguments that make encoder produce the profile and level of params, or None when it cannot."""
+    profile, level = ENCODER_PROFILES.get(encoder, {}).get(params[0]), params[1]
+    if not profile or level <= 0:
+        return None
+    # ffprobe reports H.264 levels times 10 and HEVC levels times 30
+    return ['-profile:v', profile, '-level', f'{level / (30 if encoder == "hevc_nvenc" else 10):g}']
+
+def is_passthrough(clip, width, height, fps, codec, pix_fmt, stream):
+    """True when the export would show the clip's source frames unchanged: full frame at the export size,
+    same codec, frame rate and pixel format, normal speed, and no crop, fade or freeze.
+    stream is the stream_params every copied clip has to share; the SAR must also be square, as it is
+    in the re-encoded parts, or the splice points would change the display shape or fail to decode."""
+    return (clip.get('media_type', 'video') == 'video' and bool(clip.get('path'))
+            and clip.get('video_codec', '') == codec
+            and stream_params(clip) == tuple(stream) and clip.get('sar') == '1:1'
+            and clip.get('width', 0) == width and clip.get('height', 0) == height
+            and abs(float(clip.get('fps') or 0.0) - fps) < 0.01
+            and clip.get('pix_fmt', '') == pix_fmt
+            and clip.get('speed', 1.0) == 1.0
+            and clip.get('scale_x', 1.0) == 1.0 and clip.get('scale_y', 1.0) == 1.0
+            and clip.get('pos_x', 0.0) == 0.0 and clip.get('pos_y', 0.0) == 0.0
+            and (clip.get('crop_x1', 0.0), clip.get('crop_y1', 0.0), clip.get('crop_x2', 1.0), clip.get('crop_y2', 1.0)) == (0.0, 0.0, 1.0, 1.0)
+            and clip.get('fade_in', 0.0) == 0.0 and clip.get('fade_out', 0.0) == 0.0
+            and clip.get('start_freeze', 0.0) == 0.0 and clip.get('end_freeze', 0.0) == 0.0)
+
+def _clip_end(clip):
+    return clip['start'] + clip.get('dur', clip.get('duration', 0))
+
+def _free_ranges(clip, others, a, b):
+    """Parts of [a, b) where no other clip is on the timeline."""
+    ranges = [(a, b)]
+    for other in others:
+        o_a, o_b = other['start'], _clip_end(other)
+        ranges = [piece for r_a, r_b in ranges
+                  for piece in ((r_a, min(r_b, o_a)), (max(r_a, o_b), r_b)) if piece[1] - piece[0] > 1e-6]
+    return ranges
+
+def plan_smart_pieces(clips, start, duration, keyframes_for, eligible, min_copy=MIN_COPY_SECONDS, fps=30.0):
+    """Splits the export window [start, start + duration) into ('copy', t0, length, clip, source_t0) pieces,
+    where a single eligible clip is the only picture on the timeline between two of its keyframes, and
+    ('encode', t0, length, None, None) pieces for everything else, so only GOP heads and tails are re-encoded.
+    Copies start and end on the fps frame grid, so every piece is a whole number of frames."""
+    end = start + duration
+    active = [c for c in clips if c['start'] < end and _clip_end(c) > start]
+    copies = []
+    for clip in active:
+        if not eligible(clip):
+            continue
+        # Audio comes from the separate timeline mix, so only other pictures keep a range from being copied
+        others = [c for c in active if c is not clip and c.get('media_type', 'video') == 'video' and c.get('width', 0) > 0]
+        for a, b in _free_ranges(clip, others, max(start, clip['start']), min(end, _clip_end(clip))):
+            src_a = clip.get('source_in', 0.0) + (a - clip['start'])
+            src_b = src_a + (b - a)
+            keyframes = [k for k in keyframes_for(clip['path']) if src_a - 1e-3 <= k <= src_b + 1e-3]
+            if len(keyframes) < 2 or keyframes[-1] - keyframes[0] < min_copy:
+                continue
+            t0 = round((a + keyframes[0] - src_a) * fps) / fps
+            length = round((keyframes[-1] - keyframes[0]) * fps) / fps
+            if t0 < start or t0 + length > end + 1e-6:
+                continue
+            copies.append(('copy', t0, length, clip, keyframes[0]))
+    pieces = []
+    pos = start
+    for piece in sorted(copies, key=lambda p: p[1]):
+        if piece[1] - pos > 1e-3:
+            pieces.append(('encode', pos, piece[1] - pos, None, None))
+        pieces.append(piece)
+        pos = piece[1] + piece[2]
+    if end - pos > 1e-3:
+        pieces.append(('encode', pos, end - pos, None, None))
+    return pieces
@@ -7,6 +7,7 @@ import os
 import shutil
 from unittest.mock import MagicMock, patch
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QObject, pyqtSignal
 import sys
 sys.path.insert(0, '.')
 
@@ -135,7 +136,9 @@ class TestThreeLayerStack:
             audio_analysis=None
         )
         inputs, graph, v_pad, a_pad, main_used = gen.build(start_time=0, duration=5)
-        assert graph.count("overlay") >= 2
+        # A covers the full frame, so B and C are culled from the picture but still heard
+        assert "overlay" not in graph
+        assert "[1:v]" not in graph and "[2:v]" not in graph
         assert "amix=inputs=3" in graph
 
 class TestTimelineOffsetStepEntry:
@@ -153,8 +156,10 @@ class TestTimelineOffsetStepEntry:
             audio_analysis=None
         )
         inputs, graph, v_pad, a_pad, main_used = gen.build(start_time=0, duration=15)
-        assert "color=c=black" in graph
-        assert "enable=between(t,10.000" in graph or "enable=between(t,10.0" in graph
+        # The leading gap is a black piece concatenated in front of the clip
+        assert "color=c=black:s=1920x1080:d=10.000" in graph
+        assert "concat=n=2:v=1:a=0" in graph
+        assert "overlay" not in graph
 
 class TestUnderLayerStart:
     """Test 5: The 'Under-Layer' Start."""
@@ -172,9 +177,10 @@ class TestUnderLayerStart:
             audio_analysis=None
         )
         inputs, graph, v_pad, a_pad, main_used = gen.build(start_time=0, duration=15)
-        assert graph.count("overlay") >= 2
-        assert "enable=between(t,0.000" in graph or "enable=between(t,0.0" in graph
-        assert "enable=between(t,10.000" in graph or "enable=between(t,10.0" in graph
+        # B plays alone until A starts and covers it completely
+        assert "concat=n=2:v=1:a=0" in graph
+        assert "overlay" not in graph
+        assert "trim=start=10.000:duration=5.000" not in graph
 
 class TestAudioContinuityHandoff:
     """Test 6: Audio Continuity During Handoff."""
@@ -214,7 +220,9 @@ class TestRevealDurationMismatch:
             audio_analysis=None
         )
         inputs, graph, v_pad, a_pad, main_used = gen.build(start_time=0, duration=10)
-        assert "enable=between(t,0.000,5.000)" in graph or "enable=between(t,0.0,5.0)" in graph
+        # B is hidden under A for the first five seconds and revealed by a cut afterwards
+        assert "concat=n=2:v=1:a=0" in graph
+        assert "[1:v]trim=start=5.000:duration=5.000" in graph
         assert graph.count("trim") >= 2
 
 class TestGapTest:
@@ -259,8 +267,9 @@ class TestSandwichLogic:
         )
         inputs, graph, v_pad, a_pad, main_used = gen.build(start_time=0, duration=5)
         assert isinstance(graph, str) and len(graph) > 0
-        # Should have two overlays (since track 1 empty)
-        assert graph.count("overlay") >= 1
+        # Track 1 is empty, so A on track 2 is the top layer and hides B
+        assert "overlay" not in graph
+        assert "[1:v]" not in graph
 
 # ---------- Additional Critical Tests ----------
 class TestOcclusionRenderingOptimization:
@@ -280,9 +289,952 @@ class TestOcclusionRenderingOptimization:
             audio_analysis=None
         )
         inputs, graph, v_pad, a_pad, main_used = gen.build(start_time=0, duration=5)
-        # The generator may still include both clips because occlusion detection is not implemented.
-        # We'll just ensure graph is generated.
-        assert isinstance(graph, str)
+        assert "overlay" not in graph
+        assert "[1:v]" not in graph
+
+    def test_culled_silent_source_is_not_opened(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1)
+        clip_b = clip_model_factory("B", start=0, duration=10, track=2, has_audio=False)
+        timeline_state.extend(state_from_clips([clip_a, clip_b]))
+        gen = FilterGraphGenerator(clips=timeline_state, width=1920, height=1080)
+        inputs, graph, _, _, _ = gen.build(start_time=0, duration=5)
+        assert inputs == ["/fake/path/A.mp4"]
+
+    def test_fading_top_clip_keeps_lower_layer(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1, fade_in=2.0)
+        clip_b = clip_model_factory("B", start=0, duration=10, track=2)
+        timeline_state.extend(state_from_clips([clip_a, clip_b]))
+        gen = FilterGraphGenerator(clips=timeline_state, width=1920, height=1080)
+        inputs, graph, _, _, _ = gen.build(start_time=0, duration=10)
+        # B shows through only while A fades in
+        assert graph.count("]trim=start=0.000:duration=2.000") == 2
+        assert graph.count("overlay") == 2
+        assert "concat=n=2:v=1:a=0" in graph
+
+class TestParallelSegmentedExport:
+    """Segment planning for the parallel fragment renderer."""
+    def test_segments_cover_timeline_and_snap_to_cuts(self, clip_model_factory):
+        from render_worker import plan_segments
+        clips = state_from_clips([
+            clip_model_factory("A", start=0, duration=58, track=1),
+            clip_model_factory("B", start=58, duration=70, track=1),
+            clip_model_factory("C", start=128, duration=40, track=1),
+        ])
+        segments = plan_segments(clips, target_length=60.0)
+        assert segments[0] == (0.0, 58.0)
+        assert abs(sum(d for _, d in segments) - 168.0) < 1e-6
+        for (s1, d1), (s2, _) in zip(segments, segments[1:]):
+            assert abs(s1 + d1 - s2) < 1e-6
+
+    def test_segment_boundaries_land_on_frames(self, clip_model_factory):
+        from render_worker import plan_segments
+        # Cuts on the 1/60 s timeline grid, between the 30 fps output frames
+        clips = state_from_clips([clip_model_factory(f"F{i}", start=round(i * 59.017, 3), duration=59.017, track=1)
+                                  for i in range(5)])
+        segments = plan_segments(clips, target_length=60.0, fps=30.0)
+        assert len(segments) > 2
+        frames = [d * 30 for _, d in segments]
+        assert all(abs(f - round(f)) < 1e-6 for f in frames)
+        assert all(abs(s * 30 - round(s * 30)) < 1e-6 for s, _ in segments)
+        assert sum(round(f) for f in frames) == round(5 * 59.017 * 30)
+
+    def test_windowed_build_keeps_fades_on_clip_edges(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=120, track=1, fade_out=2.0)
+        timeline_state.extend(state_from_clips([clip_a]))
+        gen = FilterGraphGenerator(clips=timeline_state, width=1920, height=1080)
+        _, first, _, _, _ = gen.build(start_time=0, duration=60, is_export=True)
+        _, last, _, _, _ = gen.build(start_time=60, duration=60, is_export=True)
+        assert "fade=t=out" not in first
+        assert "fade=t=out:st=58.000:d=2.000" in last
+
+class TestConcatCompositor:
+    """Back-to-back cuts on one track are concatenated instead of overlaid."""
+    def test_single_track_cuts_use_no_overlays(self, clip_model_factory, timeline_state):
+        clips = [clip_model_factory(f"C{i}", start=i * 2, duration=2, track=1) for i in range(300)]
+        timeline_state.extend(state_from_clips(clips))
+        gen = FilterGraphGenerator(clips=timeline_state, width=1920, height=1080)
+        _, graph, _, _, _ = gen.build(is_export=True)
+        assert "overlay" not in graph
+        assert "concat=n=300:v=1:a=0" in graph
+
+    def test_shared_source_is_split_per_piece(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1)
+        clip_pip = clip_model_factory("P", start=4, duration=2, track=0, scale_x=0.5, scale_y=0.5)
+        timeline_state.extend(state_from_clips([clip_a, clip_pip]))
+        gen = FilterGraphGenerator(clips=timeline_state, width=1920, height=1080)
+        _, graph, _, _, _ = gen.build(start_time=0, duration=10, is_export=True)
+        assert "split=3" in graph
+        assert "concat=n=3:v=1:a=0" in graph
+        assert graph.count("overlay") == 2
+
+    def test_cuts_between_frames_keep_piece_frames_exact(self, clip_model_factory, timeline_state):
+        import re
+        # Timeline positions are on a 1/60 s grid, so odd ones fall between the 30 fps output frames
+        edges = [0.0, 1.017, 2.033, 3.05, 4.067]
+        clips = [clip_model_factory(f"C{i}", start=a, duration=round(b - a, 3), track=1) for i, (a, b) in enumerate(zip(edges, edges[1:]))]
+        timeline_state.extend(state_from_clips(clips))
+        gen = FilterGraphGenerator(clips=timeline_state, width=1920, height=1080, fps=30.0)
+        pieces = gen._plan_video_pieces(timeline_state, 0.0, edges[-1])
+        assert all(abs(t * 30 - round(t * 30)) < 1e-9 for _, a, b, _ in pieces for t in (a, b))
+        _, graph, _, _, _ = gen.build(start_time=0, duration=edges[-1], is_export=True)
+        frames = [int(n) for n in re.findall(r"trim=end_frame=(\d+)", graph)]
+        assert len(frames) == 4 and sum(frames) == round(edges[-1] * 30)
+
+    def test_pieces_are_resampled_before_frame_pinning(self, clip_model_factory, timeline_state):
+        import re
+        # A 2x speed clip runs at twice its source rate; an unprobed clip (fps 0) at whatever it really has
+        fast = clip_model_factory("FAST", start=0, duration=5, track=1, speed=2.0, fps=30.0)
+        unknown = clip_model_factory("UNK", start=5, duration=5, track=1, fps=0.0)
+        timeline_state.extend(state_from_clips([fast, unknown]))
+        _, graph, _, _, _ = FilterGraphGenerator(clips=timeline_state, fps=30.0).build(start_time=0, duration=10, is_export=True)
+        pins = re.findall(r"setpts=expr=PTS-STARTPTS,fps=fps=30,tpad=stop_mode=clone:stop=1,trim=end_frame=(\d+)", graph)
+        assert pins == ['150', '150']
+
+class TestCompiledGraphCache:
+    """Unchanged timelines reuse the compiled graph instead of regenerating it."""
+    def test_identical_rebuild_hits(self, clip_model_factory, timeline_state):
+        from graph_cache import CompiledGraphCache
+        cache = CompiledGraphCache()
+        timeline_state.extend(state_from_clips([clip_model_factory("A", start=0, duration=10, track=1, source_in=30.0)]))
+        first = cache.get_or_build(FilterGraphGenerator(clips=timeline_state), start_time=2)
+        gen = FilterGraphGenerator(clips=list(reversed(timeline_state)))
+        with patch.object(gen, 'compile_timeline') as compile_timeline:
+            second = cache.get_or_build(gen, start_time=2)
+        compile_timeline.assert_not_called()
+        assert second == first
+        assert gen.input_seeks == [30.0] and gen.input_starts == [32.0]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_playhead_moves_reuse_the_compiled_timeline(self, clip_model_factory, timeline_state):
+        from graph_cache import CompiledGraphCache
+        cache = CompiledGraphCache()
+        timeline_state.extend(state_from_clips([clip_model_factory("A", start=0, duration=10, track=1)]))
+        gen = FilterGraphGenerator(clips=timeline_state)
+        with patch.object(gen, 'compile_timeline', wraps=gen.compile_timeline) as compile_timeline:
+            for t in (0, 3.2, 7.5, 3.2):
+                cache.get_or_build(gen, start_time=t)
+        assert compile_timeline.call_count == 1
+        assert (cache.hits, cache.misses) == (3, 1)
+        assert gen.input_starts == [3.2]
+
+    def test_changes_miss_and_lru_evicts(self, clip_model_factory, timeline_state):
+        from graph_cache import CompiledGraphCache
+        cache = CompiledGraphCache(max_entries=2)
+        timeline_state.extend(state_from_clips([clip_model_factory("A", start=0, duration=10, track=1)]))
+        cache.get_or_build(FilterGraphGenerator(clips=timeline_state), start_time=0)
+        cache.get_or_build(FilterGraphGenerator(clips=timeline_state, mutes={1: True}), start_time=0)
+        cache.get_or_build(FilterGraphGenerator(clips=timeline_state), start_time=0, quality='draft')
+        assert cache.misses == 3 and len(cache) == 2
+        cache.get_or_build(FilterGraphGenerator(clips=timeline_state), start_time=4)
+        assert cache.misses == 4
+
+class TestCompiledTimeline:
+    """A compiled timeline played from the middle only carries what is left after the playhead."""
+    def test_playhead_cuts_into_the_current_piece(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1)
+        clip_b = clip_model_factory("B", start=10, duration=10, track=1, source_in=0.5)
+        timeline_state.extend(state_from_clips([clip_a, clip_b]))
+        compiled = FilterGraphGenerator(clips=timeline_state).compile_timeline()
+        inputs, graph, v_map, a_map, _, starts = compiled.at(12)
+        assert "[0:" not in graph and "end_frame=300" not in graph
+        b_idx = inputs.index("/fake/path/B.mp4")
+        assert f"[{b_idx}:v]" in graph and f"[{b_idx}:a]" in graph
+        assert "trim=start=2.000" in graph and "atrim=start=2.000" in graph
+        assert "trim=end_frame=240" in graph
+        assert graph.count("[vo]") == 1 and graph.count("[ao]") == 1
+        assert compiled.seeks[b_idx] == 0.5 and starts[b_idx] == 2.5
+
+    def test_later_pieces_keep_their_compiled_bodies(self, clip_model_factory, timeline_state):
+        clips = [clip_model_factory(f"P{i}", start=i * 5, duration=5, track=1) for i in range(4)]
+        timeline_state.extend(state_from_clips(clips))
+        compiled = FilterGraphGenerator(clips=timeline_state).compile_timeline()
+        _, graph, _, _, _, _ = compiled.at(7)
+        for _, _, _, _, body in compiled.pieces[2:]:
+            assert body in graph
+        assert compiled.pieces[1][4] not in graph and compiled.pieces[0][4] not in graph
+        assert "concat=n=3:v=1:a=0" in graph
+        assert compiled.at(20)[:2] == ([], "")
+
+class TestIncrementalRecompilation:
+    """An inspector tweak on one clip only re-emits that clip's fragments."""
+    def test_single_clip_edit_reuses_other_fragments(self, clip_model_factory, timeline_state):
+        clips = [clip_model_factory(f"INC{i}", start=i * 5, duration=5, track=1) for i in range(3)]
+        timeline_state.extend(state_from_clips(clips))
+        _, before, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(is_export=True)
+        timeline_state[1] = dict(timeline_state[1], volume=50.0)
+        gen = FilterGraphGenerator(clips=timeline_state)
+        _, after, _, _, _ = gen.build(is_export=True)
+        # The edited clip's video and audio chains are rebuilt, the other two clips' come from the cache
+        assert (gen.fragment_hits, gen.fragment_misses) == (4, 2)
+        changed = [stmt for stmt in after.split(";") if stmt not in before.split(";")]
+        assert len(changed) == 1 and "volume=volume=0.500" in changed[0]
+        timeline_state[1] = dict(timeline_state[1], volume=100.0)
+        gen = FilterGraphGenerator(clips=timeline_state)
+        assert gen.build(is_export=True)[1] == before
+        assert (gen.fragment_hits, gen.fragment_misses) == (6, 0)
+
+class TestDeterministicSerialization:
+    """Identical timelines serialize to byte-identical graphs with compact pin labels."""
+    def test_identical_builds_match(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1)
+        clip_pip = clip_model_factory("P", start=2, duration=4, track=0, scale_x=0.5, scale_y=0.5)
+        timeline_state.extend(state_from_clips([clip_a, clip_pip]))
+        _, first, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(start_time=0, duration=10)
+        _, second, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(start_time=0, duration=10)
+        assert first == second
+        assert "[p0]" in first and "stream_" not in first
+
+class TestGraphOptimizer:
+    """FilterGraph.optimize strips pass-through filters and fuses linear runs."""
+    def test_identity_filters_removed(self):
+        from filter_graph import FilterGraph, FilterNode
+        graph = FilterGraph()
+        pin = graph.get_input_stream("/fake/path/A.mp4", 'v')
+        for name, params in [("split", "1"), ("scale", {'w': 1920, 'h': 1080}), ("scale", {'w': 1920, 'h': 1080}),
+                             ("setpts", {'expr': 'PTS-STARTPTS'}), ("setpts", {'expr': 'PTS-STARTPTS+2.000/TB'})]:
+            node = FilterNode(name, params)
+            node.input_pins[0] = pin
+            graph.add_node(node)
+            pin = node.output_pins[0]
+        unused = FilterNode("color", {'c': 'black'}, num_inputs=0)
+        graph.add_node(unused)
+        a_pin = graph.get_input_stream("/fake/path/A.mp4", 'a')
+        for name, params in [("volume", {'volume': '1.000'}), ("anull", None)]:
+            node = FilterNode(name, params)
+            node.input_pins[0] = a_pin
+            graph.add_node(node)
+            a_pin = node.output_pins[0]
+        final = FilterNode("null")
+        final.input_pins[0] = pin
+        final.output_pins[0] = "[vo]"
+        graph.add_node(final)
+        final_a = FilterNode("aresample", {'sample_rate': 44100})
+        final_a.input_pins[0] = a_pin
+        final_a.output_pins[0] = "[ao]"
+        graph.add_node(final_a)
+        assert graph.optimize() == 7
+        assert graph.to_string() == ("[0:v]scale=w=1920:h=1080,setpts=expr=PTS-STARTPTS+2.000/TB[vo];"
+                                     "[0:a]aresample=sample_rate=44100[ao]")
+
+    def test_debug_log_summarizes_the_graph(self, clip_model_factory, timeline_state, caplog):
+        import hashlib
+        import logging
+        clips = [clip_model_factory(f"L{i}", start=i * 2, duration=2, track=1) for i in range(50)]
+        timeline_state.extend(state_from_clips(clips))
+        with caplog.at_level(logging.DEBUG, logger="Advanced_Video_Editor"):
+            _, f_str, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(is_export=True)
+        summary = [r.getMessage() for r in caplog.records if r.getMessage().startswith("[FILTER_GRAPH]")]
+        assert summary == [f"[FILTER_GRAPH] Serialized graph: {f_str.count(';') + 1} chains, {len(f_str)} chars, "
+                           f"sha1 {hashlib.sha1(f_str.encode('utf-8')).hexdigest()[:10]}"]
+        assert all(f_str not in r.getMessage() for r in caplog.records)
+
+class TestFilterScriptFiles:
+    """Large export graphs are streamed to a script file instead of the command line."""
+    def test_large_graph_goes_to_script(self, clip_model_factory, timeline_state, tmp_path):
+        from render_worker import RenderWorker
+        clips = [clip_model_factory(f"S{i}", start=i * 2, duration=2, track=1) for i in range(200)]
+        timeline_state.extend(state_from_clips(clips))
+        gen = FilterGraphGenerator(clips=timeline_state)
+        _, f_str, _, _, _ = gen.build(is_export=True)
+        worker = RenderWorker(timeline_state, str(tmp_path / "out.mp4"), "1920x1080", {}, {}, {}, cache_dir=str(tmp_path))
+        script = worker._script_graph(gen, f_str, str(tmp_path / "graphs" / "export.ffgraph"))
+        with open(script, encoding='utf-8') as f:
+            assert f.read().replace("\n", "") == f_str
+        with patch('render_worker.BinaryManager.get_ffmpeg_version', return_value=(6, 1)):
+            assert worker._filter_args(f_str, script) == ['-filter_complex_script', script]
+        with patch('render_worker.BinaryManager.get_ffmpeg_version', return_value=(7, 1)):
+            assert worker._filter_args(f_str, script) == ['-/filter_complex', script]
+        assert worker._script_graph(gen, "short", str(tmp_path / "x.ffgraph")) is None
+
+class TestPreviewResolution:
+    """Preview graphs composite on a reduced, even-sized canvas."""
+    def test_reduced_canvas_sizes(self):
+        from playback_manager import preview_divisor, reduced_canvas
+        assert reduced_canvas(3840, 2160, preview_divisor("1/4", 3840, 2160)) == (960, 540)
+        assert reduced_canvas(1080, 1920, preview_divisor("1/4", 1080, 1920)) == (270, 480)
+        assert reduced_canvas(1920, 1080, preview_divisor("Full", 1920, 1080)) == (1920, 1080)
+        assert preview_divisor("Auto", 3840, 2160, 640, 360) == 4
+        assert preview_divisor("Auto", 3840, 2160, 1280, 720) == 2
+        assert preview_divisor("Auto", 1920, 1080, 1280, 720) == 1
+
+    def test_reduced_graph_scales_layers(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1)
+        clip_pip = clip_model_factory("P", start=0, duration=10, track=0, scale_x=0.5, scale_y=0.5, pos_x=0.25)
+        timeline_state.extend(state_from_clips([clip_a, clip_pip]))
+        _, graph, _, _, _ = FilterGraphGenerator(clips=timeline_state, width=960, height=540).build(start_time=0, duration=5)
+        assert "color=c=black:s=960x540" in graph
+        assert "scale=w=480:h=270" in graph
+        assert "(0.25*W)" in graph
+
+class TestSharedSourceBudget:
+    """Sections of one file share a decoder only while the frames it must buffer fit the memory budget."""
+    def _same_file(self, clip_model_factory, second_source_in):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1)
+        clip_b = clip_model_factory("B", start=10, duration=10, track=1, source_in=second_source_in)
+        state = state_from_clips([clip_a, clip_b])
+        for clip in state:
+            clip['path'] = "/fake/path/shared.mp4"
+        return state
+
+    def test_distant_sections_open_separate_inputs(self, clip_model_factory):
+        gen = FilterGraphGenerator(clips=self._same_file(clip_model_factory, 600.0), width=1920, height=1080)
+        inputs, graph, _, _, _ = gen.build(is_export=True)
+        assert inputs == ["/fake/path/shared.mp4", "/fake/path/shared.mp4"]
+        assert sorted(gen.input_seeks) == [0.0, 600.0]
+        assert "split" not in graph
+        assert gen.buffered_frames_estimate == 0
+
+    def test_nearby_sections_share_one_decoder(self, clip_model_factory):
+        gen = FilterGraphGenerator(clips=self._same_file(clip_model_factory, 12.0), width=1920, height=1080)
+        inputs, graph, _, _, _ = gen.build(is_export=True)
+        assert inputs == ["/fake/path/shared.mp4"]
+        assert "split=2" in graph and "asplit=2" in graph
+        assert gen.buffered_frames_estimate == 60
+
+    def test_larger_budget_merges_distant_sections(self, clip_model_factory):
+        gen = FilterGraphGenerator(clips=self._same_file(clip_model_factory, 600.0), width=1920, height=1080,
+                                   memory_budget_mb=1024 * 1024)
+        inputs, _, _, _, _ = gen.build(is_export=True)
+        assert len(inputs) == 1
+
+class TestTrackAudioBuses:
+    """Audio is mixed per track: clip count only lengthens a bus, it never widens the amix."""
+    def test_many_clips_two_tracks_mix_two_buses(self, clip_model_factory, timeline_state):
+        clips = [clip_model_factory(f"BUS{i}", start=i * 6, duration=5, track=1) for i in range(6)]
+        clips.append(clip_model_factory("MUSIC", start=0, duration=36, track=2))
+        timeline_state.extend(state_from_clips(clips))
+        gen = FilterGraphGenerator(clips=timeline_state, volumes={1: 50.0, 2: 100.0})
+        _, graph, _, _, _ = gen.build(is_export=True)
+        assert "amix=inputs=2:duration=longest:normalize=0" in graph
+        assert "adelay" not in graph
+        assert "concat=n=11:v=0:a=1" in graph
+        assert graph.count("anullsrc") == 5
+        assert graph.count("volume=volume=0.500") == 1
+
+    def test_overlapping_clips_on_one_track_get_another_bus(self, clip_model_factory, timeline_state):
+        clips = [clip_model_factory("OV1", start=0, duration=10, track=1),
+                 clip_model_factory("OV2", start=5, duration=10, track=1)]
+        timeline_state.extend(state_from_clips(clips))
+        _, graph, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(is_export=True)
+        assert "amix=inputs=2" in graph
+        assert "anullsrc=channel_layout=stereo:sample_rate=44100:d=5.000" in graph
+
+class TestNativeClipTransforms:
+    """Crop, speed and freezes are part of the graph, so preview and export render them the same way."""
+    def test_crop_runs_before_scale(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("CROP", start=0, duration=10, track=1, crop_x1=0.25, crop_x2=0.75)
+        timeline_state.extend(state_from_clips([clip_a]))
+        _, graph, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(is_export=True)
+        assert "crop=w=iw*0.5000:h=ih*1.0000:x=iw*0.2500:y=ih*0.0000" in graph
+        assert graph.index("crop=") < graph.index("scale=")
+
+    def test_speed_uses_setpts_and_chained_atempo(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("FAST", start=0, duration=5, track=1, speed=4.0)
+        timeline_state.extend(state_from_clips([clip_a]))
+        _, graph, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(is_export=True)
+        assert "trim=start=0.000:duration=20.000" in graph
+        assert "setpts=expr=(PTS-STARTPTS)/4.0000" in graph
+        assert graph.count("atempo=2.0000") == 2
+
+    def test_freezes_clone_frames_instead_of_decoding(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("FRZ", start=0, duration=10, track=1, source_in=5.0, start_freeze=2.0, end_freeze=3.0)
+        timeline_state.extend(state_from_clips([clip_a]))
+        _, graph, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(is_export=True)
+        assert "trim=start=0.000:duration=5.000" in graph
+        assert "tpad=start_mode=clone:start_duration=2.000:stop_mode=clone:stop_duration=3.000" in graph
+        assert "adelay=delays=2000|2000" in graph
+        assert "apad=whole_dur=10.000" in graph
+
+class TestFormatNormalization:
+    """Each video input is converted to the project rate and working format exactly once."""
+    # Concat pieces resample again before their frame pin; that is not a per-input conversion
+    PIN_FPS = "setpts=expr=PTS-STARTPTS,fps=fps=30,tpad"
+
+    def _input_conversions(self, graph):
+        return graph.count("fps=fps=30") - graph.count(self.PIN_FPS)
+
+    def _mixed_sources(self, clip_model_factory, tmp_dir=None):
+        clip_a = clip_model_factory("NORM_A", start=0, duration=2, track=1, fps=25.0, pix_fmt="yuv444p")
+        clip_b = clip_model_factory("NORM_B", start=0, duration=2, track=0, fps=30.0, pix_fmt="yuv420p",
+                                    scale_x=0.5, scale_y=0.5, fade_in=0.5)
+        clip_c = clip_model_factory("NORM_C", start=2, duration=2, track=0, fps=60.0, pix_fmt="yuv422p10le")
+        state = state_from_clips([clip_a, clip_b, clip_c])
+        if tmp_dir:
+            for clip in state:
+                clip['path'] = os.path.join(tmp_dir, f"{clip['uid']}.mkv")
+        return state
+
+    def test_one_conversion_per_input(self, clip_model_factory):
+        _, graph, _, _, _ = FilterGraphGenerator(clips=self._mixed_sources(clip_model_factory)).build(is_export=True)
+        assert self._input_conversions(graph) == 2
+        assert graph.count("format=pix_fmts=yuv420p") == 2
+        assert "color=c=black:s=1920x1080:d=2.000:r=30" in graph
+
+    def test_split_input_converts_before_split(self, clip_model_factory):
+        clip_a = clip_model_factory("NSPLIT", start=0, duration=10, track=1, fps=25.0, source_in=0.0)
+        clip_b = clip_model_factory("NSPLIT2", start=10, duration=10, track=1, fps=25.0, source_in=12.0)
+        state = state_from_clips([clip_a, clip_b])
+        for clip in state:
+            clip['path'] = "/fake/path/nsplit.mp4"
+        _, graph, _, _, _ = FilterGraphGenerator(clips=state).build(is_export=True)
+        assert self._input_conversions(graph) == 1
+        assert graph.index("fps=fps=30") < graph.index("split=2")
+
+    @pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not available")
+    def test_normalization_reduces_auto_scalers(self, clip_model_factory, tmp_path):
+        import re
+        import subprocess
+        sources = {"NORM_A": (25, "yuv444p"), "NORM_B": (30, "yuv420p"), "NORM_C": (60, "yuv422p10le")}
+        for uid, (rate, pix_fmt) in sources.items():
+            subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"testsrc2=s=320x240:r={rate}:d=4",
+                            "-f", "lavfi", "-i", "sine=d=4", "-pix_fmt", pix_fmt, "-c:v", "ffv1",
+                            str(tmp_path / f"{uid}.mkv")], check=True)
+
+        def auto_scalers(normalize):
+            gen = FilterGraphGenerator(clips=self._mixed_sources(clip_model_factory, str(tmp_path)),
+                                       width=320, height=240, normalize_formats=normalize)
+            inputs, graph, v_map, a_map, _ = gen.build(is_export=True)
+            cmd = ["ffmpeg", "-v", "verbose"]
+            for path, seek in zip(inputs, gen.input_seeks):
+                cmd += ["-ss", f"{seek:.3f}", "-i", path]
+            cmd += ["-filter_complex", graph, "-map", v_map, "-map", a_map, "-f", "null", "-"]
+            log = subprocess.run(cmd, capture_output=True, text=True).stderr
+            return len(set(re.findall(r"auto_scaler?_\d+", log)))
+
+        assert auto_scalers(True) <= auto_scalers(False)
+
+class TestQualityProfiles:
+    """Scaler choice comes from a named profile: fast for preview, accurate for export."""
+    def test_export_defaults_to_final_scaling(self, clip_model_factory, timeline_state):
+        timeline_state.extend(state_from_clips([clip_model_factory("QF", start=0, duration=5, track=1, width=1280, height=720)]))
+        _, graph, _, _, _ = FilterGraphGenerator(clips=timeline_state).build(is_export=True)
+        assert "scale=w=1920:h=1080:flags=lanczos+accurate_rnd+full_chroma_int:sws_dither=ed" in graph
+
+    def test_preview_skips_same_size_scale(self, clip_model_factory, timeline_state):
+        timeline_state.extend(state_from_clips([clip_model_factory("QP", start=0, duration=5, track=1)]))
+        gen = FilterGraphGenerator(clips=timeline_state)
+        _, preview, _, _, _ = gen.build(is_export=False)
+        _, final, _, _, _ = gen.build(is_export=True)
+        assert "scale=" not in preview
+        assert "scale=w=1920:h=1080" in final
+
+    def test_draft_profile_and_unknown_name(self, clip_model_factory, timeline_state):
+        timeline_state.extend(state_from_clips([clip_model_factory("QD", start=0, duration=5, track=1, scale_x=0.5, scale_y=0.5)]))
+        gen = FilterGraphGenerator(clips=timeline_state)
+        _, graph, _, _, _ = gen.build(is_export=True, quality='draft')
+        assert "scale=w=960:h=540:flags=neighbor:sws_dither=none" in graph
+        with pytest.raises(ValueError):
+            gen.build(quality='ultra')
+
+class TestProgressParsing:
+    """-progress output is parsed in blocks, even when reads split it mid-line."""
+    REPORT = ("frame=240\nfps=120.00\nbitrate=5120.0kbits/s\nout_time_us=8000000\n"
+              "out_time=00:00:08.000000\nspeed=4.00x\nprogress=continue\n")
+
+    def test_blocks_survive_split_reads(self):
+        from render_worker import ProgressParser
+        parser = ProgressParser()
+        blocks = []
+        for i in range(0, len(self.REPORT), 7):
+            blocks += parser.feed(self.REPORT[i:i + 7])
+        assert len(blocks) == 1
+        assert blocks[0]['out_time_us'] == "8000000" and blocks[0]['progress'] == "continue"
+
+    def test_stats_and_eta(self):
+        from render_worker import ProgressParser, progress_stats
+        block = ProgressParser().feed(self.REPORT)[0]
+        stats = progress_stats(block, total_duration=40.0)
+        assert stats['percent'] == 20
+        assert (stats['frame'], stats['fps'], stats['speed']) == (240, 120.0, 4.0)
+        assert stats['bitrate'] == "5120.0kbits/s"
+        assert stats['eta'] == 8.0
+        end = progress_stats({'out_time_us': 'N/A', 'progress': 'end'}, total_duration=40.0)
+        assert (end['percent'], end['eta']) == (100, 0.0)
+
+class TestRenderQueue:
+    """Export jobs run in queue order within the concurrency budget and survive a restart."""
+    class FakeWorker(QObject):
+        progress = pyqtSignal(int)
+        stats = pyqtSignal(dict)
+        finished = pyqtSignal()
+        error = pyqtSignal(str)
+
+        def __init__(self, job):
+            super().__init__()
+            self.job = job
+            self.started = False
+            self.cancelled = False
+            self.waited = None
+
+        def start(self):
+            self.started = True
+
+        def cancel(self):
+            self.cancelled = True
+
+        def wait(self, msecs=None):
+            self.waited = msecs
+            return True
+
+        def isRunning(self):
+            return self.started and self.waited is None
+
+    def _queue(self, path, workers):
+        from render_queue import RenderQueue
+
+        def factory(job):
+            workers[job.job_id] = self.FakeWorker(job)
+            return workers[job.job_id]
+        return RenderQueue(str(path), cpu_slots=2, encoder_slots=2, worker_factory=factory)
+
+    def test_budget_order_and_reorder(self, tmp_path):
+        from render_queue import RenderJob
+        workers = {}
+        queue = self._queue(tmp_path / "queue.json", workers)
+        ids = [queue.add_job(RenderJob(f"/out/deliverable_{i}.mp4", [])) for i in range(4)]
+        assert [j.status for j in queue.jobs] == ['running', 'running', 'queued', 'queued']
+        queue.move(ids[3], 0)
+        workers[ids[0]].finished.emit()
+        assert queue.job(ids[0]).status == 'done'
+        assert queue.job(ids[3]).status == 'running' and queue.job(ids[2]).status == 'queued'
+
+    def test_pause_cancel_and_restore(self, tmp_path):
+        from render_queue import RenderJob
+        workers = {}
+        path = tmp_path / "queue.json"
+        queue = self._queue(path, workers)
+        first = queue.add_job(RenderJob("/out/a.mp4", [{'uid': 'x'}], track_vols={1: 50.0}))
+        second = queue.add_job(RenderJob("/out/b.mp4", []))
+        third = queue.add_job(RenderJob("/out/c.mp4", []))
+        queue.pause(first)
+        assert workers[first].cancelled and queue.job(first).status == 'paused'
+        assert queue.job(third).status == 'running'
+        queue.cancel(second)
+        workers[second].error.emit("Export cancelled")
+        assert queue.job(second).status == 'cancelled'
+        restored = self._queue(path, {})
+        # The job that was still rendering waits for the user instead of restarting on launch
+        assert [j.status for j in restored.jobs] == ['paused', 'cancelled', 'paused']
+        assert restored.jobs[0].track_vols == {1: 50.0}
+        restored.schedule()
+        assert not restored.running_jobs()
+        assert restored.resume(third) and restored.job(third).status == 'running'
+        assert restored.job(third).error == ''
+
+    def test_shutdown_waits_for_workers(self, tmp_path):
+        from render_queue import RenderJob, SHUTDOWN_WAIT_MS
+        workers = {}
+        queue = self._queue(tmp_path / "queue.json", workers)
+        paused = queue.add_job(RenderJob("/out/a.mp4", []))
+        running = queue.add_job(RenderJob("/out/b.mp4", []))
+        queue.pause(paused)
+        queue.shutdown()
+        # Both the running worker and the one still winding down after a pause are joined before exit
+        assert workers[running].cancelled and workers[running].waited == SHUTDOWN_WAIT_MS
+        assert workers[paused].waited == SHUTDOWN_WAIT_MS
+        assert queue.job(running).status == 'paused'
+
+    def test_closed_export_dialog_lets_go_of_the_queue(self, tmp_path):
+        from export_dialog import ExportDialog
+        queue = self._queue(tmp_path / "queue.json", {})
+        for _ in range(2):
+            dlg = ExportDialog([], {}, {}, "1920x1080", {}, render_queue=queue)
+            assert queue.receivers(queue.job_changed) == 1 and queue.receivers(queue.job_stats) == 1
+            dlg.done(0)
+        assert queue.receivers(queue.job_changed) == 0 and queue.receivers(queue.job_stats) == 0
+
+    def test_closed_queue_dialog_lets_go_of_the_queue(self, tmp_path):
+        from render_queue_dialog import RenderQueueDialog
+        queue = self._queue(tmp_path / "queue.json", {})
+        for _ in range(2):
+            dlg = RenderQueueDialog(queue)
+            assert queue.receivers(queue.job_changed) == 1 and queue.receivers(queue.queue_changed) == 1
+            dlg.done(0)
+        assert queue.receivers(queue.job_changed) == 0 and queue.receivers(queue.queue_changed) == 0
+
+class TestHeadlessRender:
+    """The command-line export reads project.json without any editor UI."""
+    def _project(self, tmp_path, timeline):
+        import json
+        proj = tmp_path / "proj"
+        proj.mkdir()
+        (proj / "project.json").write_text(json.dumps({'id': 'p1', 'name': 'cli', 'timeline': timeline,
+                                                       'ui_state': {'resolution': "Portrait 1080x1920 (Mobile HD)"}}))
+        return proj
+
+    def test_load_timeline_fills_clip_defaults(self, tmp_path):
+        from headless_render import load_timeline
+        proj = self._project(tmp_path, [{'uid': 'a', 'path': '/media/a.mp4', 'start': 0, 'dur': 4, 'track': 1, 'proxy_path': '/p.mp4'}])
+        clips, ui_state = load_timeline(str(proj), str(tmp_path))
+        assert clips[0]['width'] == 1920 and clips[0]['speed'] == 1.0 and clips[0]['duration'] == 4
+        assert clips[0]['proxy_path'] == '/p.mp4'
+        assert ui_state['resolution'].startswith("Portrait")
+
+    def test_empty_or_missing_project_fails_cleanly(self, tmp_path):
+        from headless_render import main
+        proj = self._project(tmp_path, [])
+        assert main([str(proj), "--out", str(tmp_path / "o.mp4")], base_dir=str(tmp_path)) == 2
+        assert main([str(tmp_path / "missing"), "--out", str(tmp_path / "o.mp4")], base_dir=str(tmp_path)) == 2
+
+class TestSegmentRenderCache:
+    """Incremental export reuses encoded segments whose graph, sources and encoder settings are unchanged."""
+    def _keys(self, clips):
+        from segment_cache import SegmentRenderCache
+        gen = FilterGraphGenerator(clips=clips, width=1280, height=720)
+        keys = []
+        for start in (0, 10):
+            inputs, graph, _, _, _ = gen.build(start_time=start, duration=10, is_export=True)
+            keys.append(SegmentRenderCache.segment_key(graph, inputs, gen.input_seeks, 10, ['-c:v', 'libx264']))
+        return keys
+
+    def test_edit_only_invalidates_touched_segment(self, clip_model_factory):
+        a = clip_model_factory("A", start=0, duration=10, track=1)
+        b = clip_model_factory("B", start=10, duration=10, track=1)
+        before = self._keys(state_from_clips([a, b]))
+        b.volume = 50.0
+        after = self._keys(state_from_clips([a, b]))
+        assert before[0] == after[0]
+        assert before[1] != after[1]
+
+    def test_key_follows_source_file_changes(self, tmp_path):
+        from segment_cache import SegmentRenderCache
+        src = tmp_path / "a.mp4"
+        src.write_bytes(b"x" * 10)
+        key = SegmentRenderCache.segment_key("[0:v]null[vo]", [str(src)], [0.0], 5, [])
+        src.write_bytes(b"x" * 20)
+        assert SegmentRenderCache.segment_key("[0:v]null[vo]", [str(src)], [0.0], 5, []) != key
+
+    def test_lru_eviction_spares_pinned_segments(self, tmp_path):
+        from segment_cache import SegmentRenderCache
+        cache = SegmentRenderCache(str(tmp_path / "renders"), max_bytes=250)
+        for i, key in enumerate(("old", "mid", "new")):
+            frag = tmp_path / f"{key}.frag"
+            frag.write_bytes(b"x" * 100)
+            cache.put(key, str(frag))
+            os.utime(cache.path_for(key), (1000 + i, 1000 + i))
+        # All three belong to the current export, so nothing goes until it is released
+        assert cache.size() == 300
+        cache.release()
+        assert cache.get("old") is None
+        assert cache.get("new") and cache.hits == 1 and cache.misses == 1
+        assert cache.size() <= 250
+
+class TestSmartRender:
+    """Untouched single-clip stretches are stream-copied between keyframes; GOP heads and tails are re-encoded."""
+    def _clip(self, **kw):
+        clip = ClipModel(path="/media/talk.mp4", track=1, start=0.0, duration=10.0, source_in=0.5,
+                         fps=30.0, pix_fmt='yuv420p', video_codec='h264', video_profile='High', video_level=41,
+                         sar='1:1', time_base='1/15360').to_dict()
+        clip.update(kw)
+        return clip
+
+    def _eligible(self, clip):
+        from smart_render import is_passthrough
+        return is_passthrough(clip, 1920, 1080, 30.0, 'h264', 'yuv420p', ('High', 41, '1:1', '1/15360'))
+
+    def test_copies_between_keyframes(self):
+        from smart_render import plan_smart_pieces
+        clip = self._clip()
+        pieces = plan_smart_pieces([clip], 0.0, 10.0, lambda path: [0.0, 2.0, 4.0, 6.0, 8.0, 10.0, 12.0], self._eligible)
+        assert [(kind, round(t0, 3), round(length, 3)) for kind, t0, length, _, _ in pieces] == [
+            ('encode', 0.0, 1.5), ('copy', 1.5, 8.0), ('encode', 9.5, 0.5)]
+        assert pieces[1][4] == 2.0
+
+    def test_edited_or_overlapped_clips_are_encoded(self):
+        from smart_render import plan_smart_pieces
+        keyframes = lambda path: [float(k) for k in range(0, 20, 2)]
+        faded = self._clip(fade_in=1.0)
+        assert not self._eligible(faded)
+        assert not self._eligible(self._clip(video_codec='hevc'))
+        title = ClipModel(path="/media/title.png", track=0, start=0.0, duration=5.0, scale_x=0.5, scale_y=0.5).to_dict()
+        pieces = plan_smart_pieces([self._clip(), title], 0.0, 10.0, keyframes, self._eligible)
+        # Only the part after the title ends is copied
+        assert [p[0] for p in pieces] == ['encode', 'copy', 'encode']
+        assert pieces[1][1] >= 5.0
+
+    def test_audio_clips_do_not_block_copies(self):
+        from smart_render import plan_smart_pieces
+        keyframes = lambda path: [float(k) for k in range(0, 20, 2)]
+        music = ClipModel(path="/media/music.mp3", track=2, start=0.0, duration=10.0, width=0, height=0, media_type='audio').to_dict()
+        linked = self._clip(media_type='audio', width=0, height=0, track=3)
+        pieces = plan_smart_pieces([self._clip(), music, linked], 0.0, 10.0, keyframes, self._eligible)
+        # Audio comes from the separate mix, so it never occupies the picture
+        assert [p[0] for p in pieces] == ['encode', 'copy', 'encode']
+        assert pieces[1][1] < 2.0
+
+    def test_stream_parameters_must_match(self):
+        from smart_render import encoder_stream_args
+        assert self._eligible(self._clip())
+        # Splicing another profile, level, pixel shape or time base into the encoded parts breaks decoding
+        assert not self._eligible(self._clip(video_profile='Main'))
+        assert not self._eligible(self._clip(video_level=40))
+        assert not self._eligible(self._clip(sar='4:3'))
+        assert not self._eligible(self._clip(time_base='1/90000'))
+        assert not self._eligible(self._clip(video_profile='', video_level=0, sar='', time_base=''))
+        assert encoder_stream_args('libx264', ('High', 41, '1:1', '1/15360')) == ['-profile:v', 'high', '-level', '4.1']
+        assert encoder_stream_args('hevc_nvenc', ('Main 10', 120, '1:1', '1/90000')) == ['-profile:v', 'main10', '-level', '4']
+        assert encoder_stream_args('libx264', ('High 4:4:4 Predictive', 41, '1:1', '1/15360')) is None
+
+    def test_copies_snap_to_frame_grid(self):
+        from smart_render import plan_smart_pieces
+        # Keyframes a fraction of a frame off the grid still give whole-frame pieces
+        keyframes = lambda path: [0.0, 2.013, 4.0, 6.0, 8.0, 9.9071]
+        pieces = plan_smart_pieces([self._clip()], 0.0, 10.0, keyframes, self._eligible, fps=30.0)
+        assert [p[0] for p in pieces] == ['encode', 'copy', 'encode']
+        for _, t0, length, _, _ in pieces:
+            assert abs(t0 * 30 - round(t0 * 30)) < 1e-6 and abs(length * 30 - round(length * 30)) < 1e-6
+        assert round(pieces[1][1] * 30) == 45 and round(pieces[1][2] * 30) == 237
+
+class TestResumableExport:
+    """A failed fragmented export keeps its finished fragments and the next attempt only renders the rest."""
+    def test_manifest_only_trusts_intact_fragments(self, tmp_path):
+        from export_manifest import ExportManifest, job_dir_for
+        out = tmp_path / "final.mp4"
+        job_dir = job_dir_for(str(out))
+        manifest = ExportManifest(job_dir, str(out))
+        frag = os.path.join(job_dir, "k1.ts")
+        with open(frag, 'wb') as f:
+            f.write(b"x" * 64)
+        manifest.record("k1", frag)
+        assert ExportManifest(job_dir, str(out)).finished("k1") == frag
+        assert ExportManifest(job_dir, str(tmp_path / "other.mp4")).finished("k1") is None
+        with open(frag, 'wb') as f:
+            f.write(b"x" * 10)
+        assert ExportManifest(job_dir, str(out)).finished("k1") is None
+
+    def test_restart_skips_finished_fragments(self, clip_model_factory, tmp_path):
+        from binary_manager import BinaryManager
+        from render_worker import RenderWorker
+        clips = state_from_clips([clip_model_factory("A", start=0, duration=10, track=1),
+                                  clip_model_factory("B", start=10, duration=10, track=1)])
+        rendered = []
+
+        def fake_render(inputs, f_str, v_map, a_map, frag_path, duration=None, on_time=None, seeks=None, script_path=None,
+                        frames=None, fail=False):
+            if fail and rendered:
+                return False, "encoder crashed"
+            rendered.append(frag_path)
+            with open(frag_path, 'wb') as f:
+                f.write(b"ts" * 100)
+            return True, ""
+
+        def export(fail):
+            worker = RenderWorker(clips, str(tmp_path / "final.mp4"), "1920x1080", {}, {}, {},
+                                  segmented=True, segment_length=10.0, max_parallel=1)
+            errors = []
+            worker.error.connect(errors.append)
+            with patch.object(BinaryManager, 'get_best_encoder', return_value='libx264'), \
+                 patch.object(BinaryManager, 'get_ffmpeg_version', return_value=(6, 0)), \
+                 patch.object(worker, 'render_fragment', side_effect=lambda *a, **kw: fake_render(*a, fail=fail, **kw)), \
+                 patch.object(worker, '_audio_mixdown', return_value=("mix", str(tmp_path / "mix.flac"), None)), \
+                 patch.object(worker, '_concat_fragments', return_value=(True, "")):
+                worker._run_segmented(1920, 1080)
+            return errors
+
+        assert export(fail=True) == ["Fragment 1: encoder crashed"]
+        assert len(rendered) == 1 and os.path.exists(rendered[0])
+        assert export(fail=False) == []
+        # Only the missing second fragment was rendered again, and the job folder is gone after success
+        assert len(rendered) == 2 and rendered[1] != rendered[0]
+        assert not os.path.exists(os.path.dirname(rendered[0]))
+
+class TestEncoderCalibration:
+    """Calibration results pick the fastest encoder setting that meets each use's quality target."""
+    RESULTS = [
+        {'encoder': 'libx264', 'preset': 'ultrafast', 'fps': 400.0, 'bytes': 9000, 'ssim': 0.975},
+        {'encoder': 'libx264', 'preset': 'veryfast', 'fps': 250.0, 'bytes': 5000, 'ssim': 0.985},
+        {'encoder': 'libx264', 'preset': 'medium', 'fps': 90.0, 'bytes': 4000, 'ssim': 0.990},
+    ]
+
+    def test_select_setting_targets(self):
+        from binary_manager import select_setting
+        assert select_setting(self.RESULTS, min_ssim=0.98)['preset'] == 'veryfast'
+        assert select_setting(self.RESULTS, min_ssim=0.90)['preset'] == 'ultrafast'
+        assert select_setting(self.RESULTS, min_ssim=0.90, max_size_ratio=1.5)['preset'] == 'veryfast'
+        assert select_setting(self.RESULTS, min_fps=200)['preset'] == 'veryfast'
+        assert select_setting(self.RESULTS, min_ssim=0.999) is None
+        assert select_setting(self.RESULTS, encoders=('h264_nvenc',)) is None
+
+    def test_export_uses_calibrated_preset(self, monkeypatch):
+        from binary_manager import BinaryManager
+        from render_worker import RenderWorker
+        worker = RenderWorker([], "out.mp4", "1920x1080", {}, {}, {})
+        monkeypatch.setattr(BinaryManager, '_calibration', {})
+        assert worker._video_codec_args('libx264') == ['-c:v', 'libx264', '-preset', 'medium', '-crf', '18']
+        monkeypatch.setattr(BinaryManager, '_calibration', {'ffmpeg_version': [6, 0], 'results': self.RESULTS})
+        assert worker._video_codec_args('libx264') == ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18']
+        assert BinaryManager.get_encoder('export') == 'libx264'
+        # The preset only applies to the encoder it was measured on
+        assert '-preset' in worker._video_codec_args('h264_nvenc') and 'veryfast' not in worker._video_codec_args('h264_nvenc')
+
+    def test_listed_but_failing_gpu_encoder_falls_back(self, monkeypatch):
+        import subprocess
+        from binary_manager import BinaryManager
+        monkeypatch.setattr(BinaryManager, '_calibration', {})
+        monkeypatch.setattr(BinaryManager, '_cached_encoder', None)
+        # Distro builds list NVENC on machines without an NVIDIA GPU
+        monkeypatch.setattr(BinaryManager, 'available_encoders', staticmethod(lambda: {'libx264', 'h264_nvenc', 'hevc_nvenc'}))
+        failed = subprocess.CompletedProcess([], 1, b"", b"Cannot load libcuda.so.1")
+        with patch('binary_manager.subprocess.run', return_value=failed) as run:
+            assert BinaryManager.get_best_encoder() == 'libx264'
+        assert all('-frames:v' in call.args[0] for call in run.call_args_list) and run.call_count == 2
+        monkeypatch.setattr(BinaryManager, '_cached_encoder', None)
+        with patch('binary_manager.subprocess.run', return_value=subprocess.CompletedProcess([], 0, b"", b"")):
+            assert BinaryManager.get_best_encoder() == 'hevc_nvenc'
+        monkeypatch.setattr(BinaryManager, '_cached_encoder', None)
+        # A calibrated encoder already proved itself
+        monkeypatch.setattr(BinaryManager, '_calibration', {'results': [{'encoder': 'h264_nvenc', 'preset': 'p1'}]})
+        with patch('binary_manager.subprocess.run', return_value=failed):
+            assert BinaryManager.get_best_encoder() == 'h264_nvenc'
+
+class TestThreadBudget:
+    """Concurrent ffmpeg jobs split the cores instead of each sizing its thread pools for the whole machine."""
+    def test_fragments_share_and_background_is_capped(self):
+        from thread_budget import ThreadBudget
+        budget = ThreadBudget(cpu_count=16)
+        assert budget.threads_for('proxy') == 16
+        assert budget.threads_for('thumbnail') == 2
+        leases = [budget.acquire('fragment', peers=4) for _ in range(4)]
+        assert [lease.threads for lease in leases] == [4, 4, 4, 4]
+        assert budget.threads_for('proxy') == 1
+        for lease in leases:
+            lease.release()
+        assert budget.running() == 0 and budget.threads_for('proxy') == 16
+
+    def test_apply_adds_thread_flags(self):
+        from thread_budget import ThreadBudget
+        with ThreadBudget(cpu_count=8).acquire('export') as lease:
+            cmd = lease.apply(['ffmpeg', '-y', '-i', 'a.mp4', '-i', 'b.mp4', '-filter_complex', 'x', 'out.mp4'])
+        assert cmd[:5] == ['ffmpeg', '-filter_threads', '8', '-filter_complex_threads', '8']
+        assert cmd.count('-threads') == 3 and cmd[cmd.index('a.mp4') - 2:cmd.index('a.mp4')] == ['4', '-i']
+        assert cmd[-3:] == ['-threads', '8', 'out.mp4']
+
+class TestMultiTargetExport:
+    """Several deliverables share one decode and composite; each output only adds a scaler and an encoder."""
+    def test_split_scales_smaller_targets(self):
+        from render_worker import split_outputs
+        chains, outs = split_outputs("[vo]", "[ao]", (3840, 2160), [(1920, 1080), (3840, 2160), (1080, 1920)])
+        assert "[vo]split=3[mv0][mv1][mv2]" in chains and "[ao]asplit=3[ma0][ma1][ma2]" in chains
+        assert outs[1] == ("[mv1]", "[ma1]")
+        assert "[mv0]scale=1920:1080:force_original_aspect_ratio=decrease" in chains
+        assert "pad=1080:1920" in chains and outs[2][0] == "[tv2]"
+        assert split_outputs("[vo]", "[ao]", (1920, 1080), [(1920, 1080)]) == ("", [("[vo]", "[ao]")])
+
+    def test_bitrate_target_replaces_constant_quality(self, monkeypatch):
+        from binary_manager import BinaryManager
+        from render_worker import RenderWorker
+        monkeypatch.setattr(BinaryManager, '_calibration', {})
+        worker = RenderWorker([], "master.mp4", "Landscape 3840x2160 (4K)", {}, {}, {},
+                              extra_targets=[{'path': 'review.mp4', 'resolution': "Landscape 1920x1080 (HD)", 'codec': 'libx264', 'video_bitrate': '2M'}])
+        assert [t['path'] for t in worker._targets()] == ['master.mp4', 'review.mp4']
+        args = worker._target_video_args(worker._targets()[1], 'h264_nvenc')
+        assert args[:2] == ['-c:v', 'libx264'] and '-crf' not in args
+        assert args[-6:] == ['-b:v', '2M', '-maxrate', '2M', '-bufsize', '2M']
+        assert worker._target_video_args(worker._targets()[0], 'libx264') == worker._video_codec_args('libx264')
+
+class TestAudioMixdown:
+    """Exports mix the audio once; its key ignores the video half of the timeline."""
+    def _audio_key(self, clips):
+        from segment_cache import SegmentRenderCache
+        gen = FilterGraphGenerator(clips=clips, width=1280, height=720)
+        inputs, graph, v_map, a_map, _ = gen.build(0.0, 20, is_export=True, video=False)
+        assert v_map is None and a_map == "[ao]" and "[vo]" not in graph
+        return SegmentRenderCache.segment_key(graph, inputs, gen.input_seeks, 20, ['-c:a', 'flac'])
+
+    def test_video_fragments_carry_no_audio(self, clip_model_factory):
+        gen = FilterGraphGenerator(clips=state_from_clips([clip_model_factory("A", start=0, duration=10, track=1)]),
+                                   width=1280, height=720)
+        _, graph, v_map, a_map, _ = gen.build(0.0, 10, is_export=True, audio=False)
+        assert v_map == "[vo]" and a_map is None
+        assert "[ao]" not in graph and "anullsrc" not in graph and "amix" not in graph
+
+    def test_only_audio_edits_invalidate_the_mix(self, clip_model_factory):
+        a = clip_model_factory("A", start=0, duration=10, track=1)
+        b = clip_model_factory("B", start=10, duration=10, track=1)
+        before = self._audio_key(state_from_clips([a, b]))
+        a.scale_x, a.crop_x1 = 0.5, 0.2
+        assert self._audio_key(state_from_clips([a, b])) == before
+        b.volume = 50.0
+        assert self._audio_key(state_from_clips([a, b])) != before
+
+    def test_mix_renders_alongside_fragments(self, clip_model_factory, tmp_path):
+        from binary_manager import BinaryManager
+        from render_worker import RenderWorker
+        from PyQt5.QtCore import Qt
+        clips = state_from_clips([clip_model_factory("A", start=0, duration=10, track=1),
+                                  clip_model_factory("B", start=10, duration=10, track=1)])
+        worker = RenderWorker(clips, str(tmp_path / "final.mp4"), "1920x1080", {}, {}, {},
+                              segmented=True, segment_length=10.0, max_parallel=1)
+        mix_path = str(tmp_path / "mix.flac")
+        progress = []
+        worker.progress.connect(progress.append, Qt.DirectConnection)
+
+        def write(path, on_time, duration):
+            on_time(duration / 2)
+            with open(path, 'wb') as f:
+                f.write(b"x" * 100)
+            on_time(duration)
+            return True, ""
+
+        mix_job = lambda on_time=None: write(mix_path, on_time, 20.0)
+        with patch.object(BinaryManager, 'get_best_encoder', return_value='libx264'), \
+             patch.object(BinaryManager, 'get_ffmpeg_version', return_value=(6, 0)), \
+             patch.object(worker, 'render_fragment', side_effect=lambda *a, on_time=None, **kw: write(a[4], on_time, a[5])), \
+             patch.object(worker, '_audio_mixdown', return_value=("mix", mix_path, mix_job)), \
+             patch.object(worker, '_concat_fragments', return_value=(True, "")) as concat:
+            worker._run_segmented(1920, 1080)
+        assert concat.call_args[0][2] == mix_path and len(concat.call_args[0][0]) == 2
+        # The mix runs in the fragment pool and counts as a third fragment of the same length
+        assert progress == [16, 33, 50, 66, 83, 99, 100]
+
+    def test_single_pass_muxes_the_cached_mix(self, clip_model_factory, tmp_path):
+        from binary_manager import BinaryManager
+        from export_manifest import job_dir_for
+        from render_worker import RenderWorker
+        clips = state_from_clips([clip_model_factory("A", start=0, duration=10, track=1),
+                                  clip_model_factory("B", start=10, duration=10, track=1)])
+        worker = RenderWorker(clips, str(tmp_path / "final.mp4"), "1920x1080", {}, {}, {}, cache_dir=str(tmp_path / "cache"),
+                              extra_targets=[{'path': str(tmp_path / "review.mp4"), 'resolution': "1280x720"}])
+        mix_path = str(tmp_path / "mix.flac")
+        mixed = []
+
+        def mix_job(on_time=None):
+            mixed.append(True)
+            with open(mix_path, 'wb') as f:
+                f.write(b"x" * 100)
+            return True, ""
+
+        with patch.object(BinaryManager, 'get_best_encoder', return_value='libx264'), \
+             patch.object(BinaryManager, 'get_ffmpeg_version', return_value=(6, 0)), \
+             patch.object(worker, '_audio_mixdown', return_value=("mix", mix_path, mix_job)), \
+             patch('render_worker.QProcess') as process_cls:
+            process_cls.NotRunning = 0
+            process = process_cls.return_value
+            process.waitForStarted.return_value = True
+            process.state.return_value = 0
+            process.exitCode.return_value = 0
+            worker.run()
+        args = process.start.call_args[0][1]
+        graph = args[args.index('-filter_complex') + 1]
+        # The picture graph carries no audio; both targets map the mix, which is the input after the sources
+        assert mixed and "amix" not in graph and "asplit" not in graph and "[ao]" not in graph
+        # The finished mix went into the project's audio cache, where the next export finds it
+        cached = next(a for a in args if a.endswith(".flac"))
+        assert os.path.dirname(cached) == str(tmp_path / "cache" / "audio") and args[args.index(cached) - 1] == '-i'
+        mix_idx = args[:args.index(cached)].count('-i') - 1
+        assert args.count(f'{mix_idx}:a:0') == 2
+        assert not os.path.exists(job_dir_for(worker.out))
+
+class TestInputLevelSeeking:
+    """Deep source offsets are skipped by a demuxer seek rather than decoded through trim."""
+    def test_deep_source_in_seeks_input(self, clip_model_factory, timeline_state):
+        clip_a = clip_model_factory("A", start=0, duration=10, track=1, source_in=3000.0)
+        timeline_state.extend(state_from_clips([clip_a]))
+        gen = FilterGraphGenerator(clips=timeline_state, width=1920, height=1080)
+        inputs, graph, _, _, _ = gen.build(start_time=4, duration=5, is_export=True)
+        assert gen.input_seeks == [3004.0]
+        assert "trim=start=0.000" in graph
+        assert "atrim=start=0.000" in graph
 
 class TestFIFOProjectDestruction:
     """Test 26: FIFO Project Destruction."""
@@ -0,0 +1,100 @@
+import logging
+import os
+import threading
+
+# Relative claim of each kind of ffmpeg job on the cores
+KIND_WEIGHTS = {'export': 4, 'fragment': 4, 'proxy': 2, 'thumbnail': 1, 'waveform': 1}
+# Jobs that never profit from more threads than this (single-frame decodes, audio-only filters)
+KIND_MAX_THREADS = {'thumbnail': 2, 'waveform': 1}
+FOREGROUND_KINDS = ('export', 'fragment')
+# Threads a background job may use while an export is rendering
+BACKGROUND_THREADS_DURING_EXPORT = 1
+
+class ThreadLease:
+    """Threads granted to one ffmpeg process; release it (or leave the with block) when the process exits."""
+
+    def __init__(self, budget, kind, threads):
+        self.budget = budget
+        self.kind = kind
+        self.threads = threads
+
+    def apply(self, cmd, outputs=None):
+        """Returns cmd with thread limits added: filter thread counts as global options, a share of the
+        threads for each input's decoder and for each output's encoder. outputs lists the output paths;
+        by default the last element of cmd is the only output."""
+        outputs = outputs or [cmd[-1]]
+        inputs = max(1, cmd.count('-i'))
+        decoder = ['-threads', str(max(1, self.threads // inputs))]
+        encoder = ['-threads', str(max(1, self.threads // len(outputs)))]
+        out = [cmd[0], '-filter_threads', str(self.threads)]
+        if any(arg in cmd for arg in ('-filter_complex', '-filter_complex_script', '-/filter_complex')):
+            out.extend(['-filter_complex_threads', str(self.threads)])
+        prev = None
+        for arg in cmd[1:]:
+            if arg == '-i':
+                out.extend(decoder)
+            elif arg in outputs and prev != '-i':
+                out.extend(encoder)
+            out.append(arg)
+            prev = arg
+        return out
+
+    def release(self):
+        self.budget.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class ThreadBudget:
+    """Hands out ffmpeg thread counts so concurrent jobs share os.cpu_count() instead of each assuming
+    the whole machine. A job's share follows its kind's weight against the jobs already running;
+    exports are only weighed against other exports, and background jobs are squeezed to
+    BACKGROUND_THREADS_DURING_EXPORT while one runs. Shares are fixed when a job starts."""
+
+    def __init__(self, cpu_count=None):
+        self.cpu_count = cpu_count or os.cpu_count() or 2
+        self.logger = logging.getLogger("Advanced_Video_Editor")
+        self._active = []
+        self._lock = threading.Lock()
+
+    def threads_for(self, kind, peers=1):
+        with self._lock:
+            return self._threads_for(kind, peers)
+
+    def _threads_for(self, kind, peers=1):
+        weight = KIND_WEIGHTS.get(kind, 1)
+        foreground_busy = any(lease.kind in FOREGROUND_KINDS for lease in self._active)
+        competing = [lease for lease in self._active if kind not in FOREGROUND_KINDS or lease.kind in FOREGROUND_KINDS]
+        same = sum(weight for lease in competing if lease.kind == kind)
+        others = sum(KIND_WEIGHTS.get(lease.kind, 1) for lease in competing if lease.kind != kind)
+        # Running peers already count in same; the ones still to start are reserved through peers
+        total_weight = max(weight * peers, weight + same) + others
+        threads = max(1, int(self.cpu_count * weight / total_weight))
+        threads = min(threads, KIND_MAX_THREADS.get(kind, self.cpu_count))
+        if kind not in FOREGROUND_KINDS and foreground_busy:
+            threads = min(threads, BACKGROUND_THREADS_DURING_EXPORT)
+        return threads
+
+    def acquire(self, kind, peers=1):
+        """peers is the number of jobs of this kind about to start together (the fragments of one export),
+        so the first of them does not claim the cores the others are about to need."""
+        with self._lock:
+            lease = ThreadLease(self, kind, self._threads_for(kind, peers))
+            self._active.append(lease)
+        self.logger.debug(f"[THREADS] {kind}: {lease.threads} of {self.cpu_count} threads ({len(self._active)} jobs running)")
+        return lease
+
+    def release(self, lease):
+        with self._lock:
+            if lease in self._active:
+                self._active.remove(lease)
+
+    def running(self, kind=None):
+        with self._lock:
+            return sum(1 for lease in self._active if kind is None or lease.kind == kind)
+
+# Shared by every worker in the process
+budget = ThreadBudget()
@@ -5,6 +5,7 @@ import logging
 import queue
 import shutil
 from PyQt5.QtCore import QThread, pyqtSignal
+from thread_budget import budget
 
 class ThumbnailWorker(QThread):
     thumbnail_generated = pyqtSignal(str, str, str)
@@ -118,7 +119,8 @@ class ThumbnailWorker(QThread):
         try:
             bin_full = shutil.which(cmd[0]) or cmd[0]
             cmd[0] = bin_full
-            res = subprocess.run(cmd, capture_output=True, text=True, startupinfo=startup_info, check=True, encoding='utf-8')
+            with budget.acquire('thumbnail') as lease:
+                res = subprocess.run(lease.apply(cmd), capture_output=True, text=True, startupinfo=startup_info, check=True, encoding='utf-8')
             return True, ""
         except subprocess.CalledProcessError as e:
             return False, e.stderr
@@ -137,6 +139,7 @@ class ProxyWorker(QThread):
         self.logger = logging.getLogger("Advanced_Video_Editor")
         self.hwaccel_args = []
         self.codec = 'libx264'
+        self.preset_args = []
         self.checked_hwaccel = False
 
     def add_task(self, path, uid):
@@ -153,11 +156,12 @@ class ProxyWorker(QThread):
         self.checked_hwaccel = True
         try:
             from binary_manager import BinaryManager
-            gpu_codec = BinaryManager.get_best_encoder()
+            setting = BinaryManager.get_encoder_setting('proxy', self.logger)
+            gpu_codec = setting['encoder'] if setting else BinaryManager.get_best_encoder()
             if gpu_codec in ['h264_nvenc', 'hevc_nvenc', 'av1_nvenc']:
                 self.logger.info("[PROXY-GPU] 40-Series Detected. Using HEVC_NVENC for high-speed proxies.")
                 self.hwaccel_args = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
-                self.codec = 'hevc_nvenc' 
+                self.codec = gpu_codec if setting else 'hevc_nvenc' 
             elif gpu_codec == 'h264_qsv':
                 self.logger.info("[PROXY-GPU] Using Intel QuickSync.")
                 self.hwaccel_args = ['-hwaccel', 'qsv']
@@ -169,9 +173,13 @@ class ProxyWorker(QThread):
             else:
                 self.hwaccel_args = []
                 self.codec = 'libx264'
+            self.preset_args = BinaryManager.preset_args(setting, self.codec)
+            if self.preset_args:
+                self.logger.info(f"[PROXY] Calibrated setting: {self.codec} {' '.join(self.preset_args)}")
         except Exception:
             self.hwaccel_args = []
             self.codec = 'libx264'
+            self.preset_args = []
         return self.hwaccel_args, self.codec
 
     def run(self):
@@ -212,9 +220,11 @@ class ProxyWorker(QThread):
             cmd.extend(['-vf', 'scale=-2:540'])
         cmd.extend(['-c:v', codec])
         if 'nvenc' in codec:
-            cmd.extend(['-preset', 'p1', '-cq', '30', '-b:v', '0'])
+            cmd.extend((self.preset_args or ['-preset', 'p1']) + ['-cq', '30', '-b:v', '0'])
         elif codec == 'libx264':
-            cmd.extend(['-preset', 'ultrafast', '-crf', '28'])
+            cmd.extend((self.preset_args or ['-preset', 'ultrafast']) + ['-crf', '28'])
+        else:
+            cmd.extend(self.preset_args)
         cmd.extend(['-c:a', 'aac', '-b:a', '96k', '-ac', '2'])
         cmd.append(out_path)
         si = subprocess.STARTUPINFO()
@@ -223,7 +233,8 @@ class ProxyWorker(QThread):
             self.logger.info(f"[PROXY] Generating: {out_path}")
             bin_full = shutil.which(cmd[0]) or cmd[0]
             cmd[0] = bin_full
-            subprocess.run(cmd, startupinfo=si, check=True)
+            with budget.acquire('proxy') as lease:
+                subprocess.run(lease.apply(cmd), startupinfo=si, check=True)
             self.proxy_finished.emit(uid, out_path)
         except subprocess.CalledProcessError as e:
             self.logger.error(f"[PROXY] GPU generation failed: {e}, falling back to CPU...")
@@ -231,7 +242,8 @@ class ProxyWorker(QThread):
                            '-vf', 'scale=-2:540', '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '28',
                            '-c:a', 'aac', '-b:a', '96k', '-ac', '2', out_path]
             try:
-                subprocess.run(cmd_fallback, startupinfo=si, check=True)
+                with budget.acquire('proxy') as lease:
+                    subprocess.run(lease.apply(cmd_fallback), startupinfo=si, check=True)
                 self.proxy_finished.emit(uid, out_path)
             except subprocess.CalledProcessError as e2:
                 self.logger.error(f"[PROXY] CPU fallback also failed: {e2}")